@@ -0,0 +1,176 @@
+"""Scraping of post pages and pages of their authors by asyncio tasks,
+number of simultaneous requests is limited.
+Pages are processed in the pool of processes, if it is given, so event
+loop only waits for responses. Author cache is read and written down
+in the separate thread, so the lock of its file does not block the loop."""
+import asyncio
+import logging
+
+from typing import Callable, List, Union
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import aiohttp
+
+from author_cache import AuthorCache
+from http_sessions import RETRIES, BACKOFF, RETRY_STATUSES, retry_delay
+from reddit_pages import USER_AGENT, get_user_link, make_post_record, \
+    parse_post_page, parse_user_page
+
+
+class AsyncScraper:
+    """Post pages and author pages of many posts are requested
+    at the same time through one HTTP session.
+    Scraper is used as async context manager:
+
+        async with AsyncScraper(20) as scraper:
+            all_posts_data = await scraper.scrape(urls)
+    """
+
+    def __init__(self, concurrency: int = 20, timeout: float = 15,
+                 executor: Executor = None, retries: int = RETRIES,
+                 backoff: float = BACKOFF, author_cache: AuthorCache = None):
+        """"concurrency" - maximum number of simultaneous requests,
+        the same number of connections is kept open
+        "timeout" - seconds to wait for the whole response
+        "executor" - pool of processes to process pages, pages
+        are processed in the event loop if it is "None"
+        "retries" - number of repeats of the failed request
+        "backoff" - delay before the first repeat in seconds, it is
+        doubled for every next repeat
+        "author_cache" - cache of user data, user page is requested
+        only if user is not found in it
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.executor = executor
+        self.retries = retries
+        self.backoff = backoff
+        self.author_cache = author_cache
+        # Requests of user pages in progress by user name
+        self._user_requests = {}
+        self._session = None
+        self._semaphore = None
+        self._cache_executor = None
+
+    async def start(self) -> None:
+        """Open HTTP session in the running event loop"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            headers={"User-Agent": USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.concurrency))
+        if self.author_cache is not None:
+            self._cache_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="author_cache")
+
+    async def close(self) -> None:
+        """Close HTTP session and its connections and stop the thread
+        of the author cache"""
+        await self._session.close()
+        if self._cache_executor is not None:
+            self._cache_executor.shutdown()
+            self._cache_executor = None
+
+    async def __aenter__(self) -> 'AsyncScraper':
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        await self.close()
+
+    async def fetch_page(self, url: str, parse: Callable[[str], dict]):
+        """Make GET request and get data from page HTML, page
+        is processed after the request slot is released
+        "parse" - function which gets data from page HTML
+        Return result of "parse".
+        """
+        src = await self.get_text(url)
+        if self.executor is None:
+            return parse(src)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, parse, src)
+
+    async def get_text(self, url: str) -> str:
+        """Make GET request and repeat it after connection errors
+        and responses with statuses from "RETRY_STATUSES"
+        Return text of the response.
+        Raise exception of the last attempt.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._session.get(url) as response:
+                        if (response.status not in RETRY_STATUSES
+                                or attempt == self.retries):
+                            return await response.text()
+                        retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                retry_after = None
+            # Request slot is free during delay
+            await asyncio.sleep(retry_delay(attempt, self.backoff,
+                                            retry_after))
+            attempt += 1
+
+    async def get_data_from_post_and_user_page(self,
+                                               url: str) -> Union[dict,
+                                                                  list]:
+        """Get data of the post and its author
+        Return all data in dict format.
+        Return empty list if data is not found, as the function
+        "get_data_from_post_and_user_page" of "benchmark".
+        """
+        try:
+            post_data = await self.fetch_page(url, parse_post_page)
+            user_data = await self.get_user_data(url,
+                                                 post_data["user_name"])
+            return make_post_record(url, post_data, user_data)
+        except Exception as ex:
+            logging.error(f"{url}: {ex!r}")
+            return []
+
+    async def get_user_data(self, post_url: str, user_name: str) -> dict:
+        """Get user data from cache or from user page, page is requested
+        once for simultaneous posts of the same user
+        "post_url" - url of the post of the user
+        "user_name" - name of the user
+        """
+        request = self._user_requests.get(user_name)
+        if request is not None:
+            return await request
+        if self.author_cache is not None:
+            user_data = await self.call_cache(self.author_cache.get,
+                                              user_name)
+            if user_data is not None:
+                return user_data
+            # Page may be requested by other task while cache is read
+            request = self._user_requests.get(user_name)
+            if request is not None:
+                return await request
+        request = asyncio.ensure_future(self.fetch_page(
+            get_user_link(post_url, user_name), parse_user_page))
+        self._user_requests[user_name] = request
+        try:
+            user_data = await request
+        finally:
+            del self._user_requests[user_name]
+        if self.author_cache is not None:
+            await self.call_cache(self.author_cache.set, user_name,
+                                  user_data)
+        return user_data
+
+    async def call_cache(self, method: Callable, *args):
+        """Call method of the author cache in the thread of the cache
+        Return result of the method.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._cache_executor, method, *args)
+
+    async def scrape(self, urls: List[str]) -> List[Union[dict, list]]:
+        """Get data of all posts at the same time
+        Return data of posts in the order of "urls".
+        """
+        return await asyncio.gather(
+            *(self.get_data_from_post_and_user_page(url) for url in urls))
@@ -0,0 +1,153 @@
+"""Cache of user data by user name in SQLite file, it is shared
+by processes of the scraper and kept between runs"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from typing import Union
+
+# Default file of the cache in the current directory
+CACHE_FILE = "authors_cache.sqlite3"
+# Default seconds to keep user data
+CACHE_TTL = 24 * 3600
+CACHE_SIZE = 100000
+# Seconds to wait while another process writes down to the file
+LOCK_TIMEOUT = 30
+# Maximum number of inserts of the process between checks of the size
+# of the cache, size is not counted on every insert
+EVICTION_INTERVAL = 1000
+
+
+class AuthorCache:
+    """Cache which evicts least recently used users when it is full
+    and expires user data "ttl" seconds after fetch.
+    Every process opens its own connection to the file, hit and miss
+    counters are counted by the process. Connection is shared by threads
+    of the process under the lock.
+    Size is checked every "max_size / 10" inserts of the process (not
+    more than EVICTION_INTERVAL), so cache can exceed "max_size" until
+    the next check."""
+
+    def __init__(self, path: str = CACHE_FILE, ttl: float = CACHE_TTL,
+                 max_size: int = CACHE_SIZE):
+        """"path" - file of the cache
+        "ttl" - seconds to keep user data, 0 disables cache
+        "max_size" - maximum number of users
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.eviction_interval = max(min(EVICTION_INTERVAL,
+                                         max_size // 10), 1)
+        self._inserts = 0
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Return "True" if cache keeps user data"""
+        return self.ttl > 0 and self.max_size > 0
+
+    def connection(self) -> sqlite3.Connection:
+        """Get connection of the current process, it is opened
+        on the first call in every process"""
+        if self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS authors ("
+                               "user_name TEXT PRIMARY KEY, "
+                               "data TEXT NOT NULL, "
+                               "fetched_at REAL NOT NULL, "
+                               "used_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS authors_used_at "
+                               "ON authors (used_at)")
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, user_name: str) -> Union[dict, None]:
+        """Get user data by user name
+        Return "None" if there is no user or user data is expired.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            connection = self.connection()
+            row = connection.execute("SELECT data FROM authors "
+                                     "WHERE user_name = ? AND fetched_at > ?",
+                                     (user_name, now - self.ttl)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute("UPDATE authors SET used_at = ? "
+                               "WHERE user_name = ?", (now, user_name))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, user_name: str, user_data: dict) -> None:
+        """Save user data fetched now and evict least recently used
+        and expired users if cache is full, size of the cache is checked
+        every "eviction_interval" inserts"""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            connection = self.connection()
+            connection.execute("INSERT OR REPLACE INTO authors "
+                               "VALUES (?, ?, ?, ?)",
+                               (user_name, json.dumps(user_data), now, now))
+            self._inserts += 1
+            if self._inserts < self.eviction_interval:
+                return
+            self._inserts = 0
+            size = self.count_users()
+            if size > self.max_size:
+                expired = connection.execute(
+                    "DELETE FROM authors WHERE fetched_at <= ?",
+                    (now - self.ttl,)).rowcount
+                evicted = connection.execute(
+                    "DELETE FROM authors WHERE user_name IN ("
+                    "SELECT user_name FROM authors ORDER BY used_at "
+                    "LIMIT ?)",
+                    (max(size - expired - self.max_size, 0),)).rowcount
+                self.evictions += expired + evicted
+
+    def size(self) -> int:
+        """Return number of users in the cache including expired ones"""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            return self.count_users()
+
+    def count_users(self) -> int:
+        """Return number of users in the file, lock must be acquired"""
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM authors").fetchone()[0]
+
+    def statistics(self) -> dict:
+        """Return size, limits and hit and miss counters of the cache"""
+        requests = self.hits + self.misses
+        return {"size": self.size(),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0.0}
+
+    def close(self) -> None:
+        """Close connection of the current process"""
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pid = None
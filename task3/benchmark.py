@@ -0,0 +1,948 @@
+"""
+Benchmarks for RESTful server and data base.
+Run RESTful server before "server" and "ingest" benchmarks,
+run MongoDB Server before "indexes" and "workers" benchmarks and data
+base servers before "databases" benchmark. "scraper" benchmark runs
+local imitation of the site, "parse" benchmark uses its pages
+or pages saved from the site. "harvest" benchmark opens the listing
+of the imitation of the site in Chrome. "pipeline" benchmark runs
+the imitation of the site and RESTful server with SQLite data base.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import argparse
+import functools
+import itertools
+import threading
+import tempfile
+import subprocess
+import http.client
+import multiprocessing
+
+from typing import List
+from urllib.parse import urlsplit, urljoin
+
+import asyncio
+
+import http_sessions
+
+import serialization
+import mock_site
+import reddit_pages
+
+from bs4 import BeautifulSoup
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.webdriver import WebDriver
+from async_scraper import AsyncScraper
+from author_cache import AuthorCache
+from link_harvester import LinkHarvester
+from main_multiprocessing import make_request_selenium, post_records
+from pipeline import ScrapePipeline
+from db_connectors.mongo import MongodbService
+from db_connectors.sql import SqlService
+from data_description import PostDataDB, UserDataDB, INDEXES, TABLES, \
+    POST_COUNT, convert_to_db_type
+
+
+def make_post_records(count: int, users_number: int = 100) -> List[dict]:
+    """Generate "count" records with all data of post and its author"""
+    return [{"_id": uuid.uuid4().hex,
+             "post_url": f"https://www.reddit.com/r/test/comments/{number}",
+             "user_name": f"user_{number % users_number}",
+             "user_karma": str(1000 + number % users_number),
+             "user_cake_day": "2015-06-01",
+             "post_karma": str(700 + number % users_number),
+             "comment_karma": str(300 + number % users_number),
+             "post_date": f"2021-10-{1 + number % 28:02d}",
+             "number_of_comments": str(number % 500),
+             "number_of_votes": str(number % 5000),
+             "post_category": f"category_{number % 20}"}
+            for number in range(count)]
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Return value below which "percent" of sorted "values" fall"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return sorted(values)[index]
+
+
+def print_latency_report(title: str, latencies: List[float],
+                         elapsed: float) -> None:
+    """Print requests per second and latency percentiles in milliseconds"""
+    print(f"{title}: {len(latencies)} requests in {elapsed:.2f} s, "
+          f"{len(latencies) / elapsed:.1f} req/s, "
+          f"p50 {percentile(latencies, 50) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+def run_client(url: str, method: str, requests_number: int,
+               latencies: List[float], errors: List[int]) -> None:
+    """Send requests one after another through single keep-alive
+    connection and save latency of each request"""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    for _ in range(requests_number):
+        start = time.perf_counter()
+        try:
+            connection.request(method, path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname,
+                                                    parts.port)
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def benchmark_server(args: argparse.Namespace) -> None:
+    """Send requests from parallel clients and print req/s and latency"""
+    latencies = []
+    errors = []
+    clients = [threading.Thread(target=run_client,
+                                args=(args.url, args.method, args.requests,
+                                      latencies, errors))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    print_latency_report(f"{args.method} {args.url}, "
+                         f"{args.clients} clients", latencies, elapsed)
+    if errors:
+        print(f"errors: {len(errors)}")
+
+
+def run_client_process(url: str, method: str,
+                       requests_number: int) -> tuple:
+    """Send requests from client process
+    Return tuple of latencies and errors.
+    """
+    latencies = []
+    errors = []
+    run_client(url, method, requests_number, latencies, errors)
+    return latencies, errors
+
+
+def wait_for_server(url: str, timeout: float) -> None:
+    """Wait until server answers requests
+    Raise "TimeoutError" if server does not answer in "timeout" seconds.
+    """
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while True:
+        connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        try:
+            connection.request("GET", "/metrics")
+            connection.getresponse().read()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"server {url} does not answer")
+            time.sleep(0.2)
+        finally:
+            connection.close()
+
+
+def benchmark_workers(args: argparse.Namespace) -> None:
+    """Start server with different numbers of worker processes and print
+    req/s and latency under parallel client processes"""
+    parts = urlsplit(args.url)
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "server.py")
+    records = make_post_records(args.records)
+    for workers in args.workers:
+        server = subprocess.Popen([sys.executable, server_path,
+                                   "--host", parts.hostname,
+                                   "--port", str(parts.port),
+                                   "--database", args.database,
+                                   "--workers", str(workers)])
+        try:
+            wait_for_server(args.url, 30)
+            if records:
+                connection = http.client.HTTPConnection(parts.hostname,
+                                                        parts.port)
+                connection.request("POST", "/posts/bulk",
+                                   json.dumps(records).encode('utf-8'))
+                connection.getresponse().read()
+                connection.close()
+                # Posts are written down once
+                records = []
+            # Client processes are started before measurement
+            with multiprocessing.Pool(args.clients) as pool:
+                start = time.perf_counter()
+                results = pool.starmap(run_client_process,
+                                       [(args.url, "GET", args.requests)]
+                                       * args.clients)
+                elapsed = time.perf_counter() - start
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        latencies = [latency for client_latencies, _ in results
+                     for latency in client_latencies]
+        errors = sum(len(client_errors) for _, client_errors in results)
+        print_latency_report(f"{workers} workers, {args.clients} clients",
+                             latencies, elapsed)
+        if errors:
+            print(f"errors: {errors}")
+
+
+def benchmark_ingest(args: argparse.Namespace) -> None:
+    """Write down records through bulk endpoint with different batch
+    sizes and print records per second"""
+    parts = urlsplit(args.url)
+    for batch_size in args.batch_sizes:
+        records = make_post_records(args.records)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        start = time.perf_counter()
+        for position in range(0, len(records), batch_size):
+            batch = records[position:position + batch_size]
+            if batch_size == 1:
+                connection.request("POST", "/posts/",
+                                   json.dumps(batch[0]).encode('utf-8'))
+            else:
+                connection.request("POST", parts.path,
+                                   json.dumps(batch).encode('utf-8'))
+            connection.getresponse().read()
+        elapsed = time.perf_counter() - start
+        connection.close()
+        print(f"batch size {batch_size}: {len(records)} records "
+              f"in {elapsed:.2f} s, {len(records) / elapsed:.1f} records/s")
+
+
+def benchmark_indexes(args: argparse.Namespace) -> None:
+    """Fill temporary data base with growing number of posts and print
+    latency of the server lookups for every size"""
+    connector = MongodbService(args.db_host, args.db_port)
+    connector.drop_db(args.db_name)
+    db = connector.create_db(args.db_name)
+    posts = connector.create_collection(db, 'posts')
+    users = connector.create_collection(db, 'users')
+    if not args.without_indexes:
+        connector.ensure_indexes(db, INDEXES)
+    try:
+        users_number = max(1, max(args.sizes) // 10)
+        users_ids = []
+        for position in range(0, users_number, args.batch):
+            batch = [{"user_name": f"user_{number}"} for number in
+                     range(position, min(position + args.batch, users_number))]
+            users_ids += users.insert_many(batch).inserted_ids
+
+        posts_number = 0
+        for size in sorted(args.sizes):
+            while posts_number < size:
+                batch_size = min(args.batch, size - posts_number)
+                posts.insert_many(
+                    [{"_id": uuid.uuid4().hex,
+                      "user_id": random.choice(users_ids)}
+                     for _ in range(batch_size)])
+                posts_number += batch_size
+            for title, collection_name, make_filter in (
+                    ("users by user_name", users,
+                     lambda: {"user_name":
+                              f"user_{random.randrange(users_number)}"}),
+                    ("posts by user_id", posts,
+                     lambda: {"user_id": random.choice(users_ids)})):
+                latencies = []
+                start = time.perf_counter()
+                for _ in range(args.lookups):
+                    search_filter = make_filter()
+                    lookup_start = time.perf_counter()
+                    connector.find_one(collection_name, search_filter)
+                    latencies.append(time.perf_counter() - lookup_start)
+                print_latency_report(f"{posts_number} posts, {title}",
+                                     latencies, time.perf_counter() - start)
+    finally:
+        connector.drop_db(args.db_name)
+
+
+def make_connector(database: str, args: argparse.Namespace):
+    """Return connector to data base by name: "mongodb", "sqlite"
+    or "postgresql" """
+    if database == "mongodb":
+        return MongodbService(args.db_host, args.mongodb_port)
+    return SqlService(args.db_host, args.postgresql_port, database, TABLES)
+
+
+def time_operation(title: str, operation, arguments: list) -> None:
+    """Call operation with every item of arguments one after another
+    and print latency report"""
+    latencies = []
+    start = time.perf_counter()
+    for argument in arguments:
+        call_start = time.perf_counter()
+        operation(argument)
+        latencies.append(time.perf_counter() - call_start)
+    print_latency_report(title, latencies, time.perf_counter() - start)
+
+
+def benchmark_databases(args: argparse.Namespace) -> None:
+    """Run the same workload of the server on every data base: bulk
+    insert, lookups by id, pages of joined posts and deletes"""
+    records = make_post_records(args.records, max(1, args.records // 10))
+    for record in records:
+        for field, value in record.items():
+            record[field] = convert_to_db_type(field, value)
+    for database in args.databases:
+        connector = make_connector(database, args)
+        connector.drop_db(args.db_name)
+        db = connector.create_db(args.db_name)
+        posts = connector.create_collection(db, 'posts')
+        users = connector.create_collection(db, 'users')
+        connector.ensure_indexes(db, INDEXES)
+        try:
+            start = time.perf_counter()
+            for position in range(0, len(records), args.batch):
+                batch = records[position:position + args.batch]
+                users_data = {}
+                post_counts = {}
+                for record in batch:
+                    users_data.setdefault(record["user_name"], {
+                        field: record[field] for field in UserDataDB.__slots__})
+                    post_counts[record["user_name"]] = post_counts.get(
+                        record["user_name"], 0) + 1
+                connector.upsert_many(users, "user_name",
+                                      list(users_data.values()),
+                                      [{POST_COUNT: count}
+                                       for count in post_counts.values()])
+                users_ids = {user["user_name"]: user["_id"] for user in
+                             connector.find_many(users,
+                                                 {"user_name":
+                                                      {"$in": list(users_data)}},
+                                                 {"user_name": True})}
+                connector.insert_many(posts, [
+                    dict({field: record[field]
+                          for field in PostDataDB.__slots__},
+                         user_id=users_ids[record["user_name"]])
+                    for record in batch])
+            elapsed = time.perf_counter() - start
+            print(f"{database}: {len(records)} records inserted in "
+                  f"{elapsed:.2f} s, {len(records) / elapsed:.1f} records/s")
+
+            unique_ids = [random.choice(records)["_id"]
+                          for _ in range(args.lookups)]
+            time_operation(f"{database}: post by _id",
+                           lambda unique_id: connector.find_one(
+                               posts, {"_id": unique_id}), unique_ids)
+            page_parameters = {"limit": 100,
+                               "sort": [("number_of_votes", -1)],
+                               "foreign_fields": UserDataDB.__slots__,
+                               "hidden_fields": [POST_COUNT]}
+            time_operation(f"{database}: page of 100 joined posts by votes",
+                           lambda _: list(connector.find_all_joined(
+                               posts, users, "user_id", **page_parameters)),
+                           range(args.pages))
+            time_operation(f"{database}: page of 100 joined posts "
+                           f"of category",
+                           lambda category: list(connector.find_all_joined(
+                               posts, users, "user_id",
+                               [("post_category", "eq", category)],
+                               limit=100, foreign_fields=UserDataDB.__slots__,
+                               hidden_fields=[POST_COUNT])),
+                           [f"category_{number % 20}"
+                            for number in range(args.pages)])
+            time_operation(f"{database}: delete post by _id",
+                           lambda unique_id: connector.find_one_and_delete(
+                               posts, {"_id": unique_id}),
+                           list(dict.fromkeys(unique_ids)))
+        finally:
+            connector.drop_db(args.db_name)
+
+
+def benchmark_encoding(args: argparse.Namespace) -> None:
+    """Encode and compress list of posts with every json encoder
+    and content coding and print body size and CPU time"""
+    records = make_post_records(args.records)
+    encoders = [("json indent=4", lambda data: json.dumps(
+                    data, indent=4).encode('utf-8')),
+                ("json compact", lambda data: json.dumps(
+                    data, separators=(",", ":"),
+                    ensure_ascii=False).encode('utf-8'))]
+    if serialization.orjson is not None:
+        encoders.append(("orjson", serialization.orjson.dumps))
+    for title, encoder in encoders:
+        for encoding in [None] + serialization.ENCODINGS:
+            start = time.process_time()
+            for _ in range(args.repeats):
+                body = encoder(records)
+                if encoding:
+                    body = serialization.compress(body, encoding)
+            cpu_time = (time.process_time() - start) / args.repeats
+            print(f"{title}, {encoding or 'identity'}: {len(body)} bytes, "
+                  f"{cpu_time * 1000:.2f} ms CPU")
+
+
+def make_request(url: str) -> str:
+    """Make GET request through keep-alive session of the process
+    Return page HTML.
+    """
+    headers = {"User-Agent": reddit_pages.USER_AGENT}
+    return http_sessions.get_session(headers).get(url, timeout=15).text
+
+
+def get_data_from_post_and_user_page(url: str):
+    """Get data of the post and its author by blocking requests
+    as "main_multiprocessing" did before asyncio scraper
+    Return all data in dict format.
+    Return empty list if data is not found.
+    """
+    try:
+        post_data = reddit_pages.parse_post_page(make_request(url))
+        user_data = reddit_pages.parse_user_page(make_request(
+            reddit_pages.get_user_link(url, post_data["user_name"])))
+        return reddit_pages.make_post_record(url, post_data, user_data)
+    except Exception:
+        return []
+
+
+def scrape_with_pool(urls: List[str]) -> list:
+    """Get data of posts by processes as "main_multiprocessing" did
+    before asyncio scraper"""
+    with multiprocessing.Pool(multiprocessing.cpu_count()) as process:
+        return process.map(get_data_from_post_and_user_page, urls)
+
+
+async def scrape_with_asyncio(urls: List[str], concurrency: int,
+                              author_cache: AuthorCache = None) -> list:
+    """Get data of posts by asyncio scraper"""
+    async with AsyncScraper(concurrency,
+                            author_cache=author_cache) as scraper:
+        return await scraper.scrape(urls)
+
+
+def benchmark_scraper(args: argparse.Namespace) -> None:
+    """Scrape local imitation of the site by process pool and by asyncio
+    scraper and print posts per second
+    The last asyncio scraper runs twice more with empty and filled
+    cache of user data.
+    """
+    site_url = f"http://127.0.0.1:{args.port}"
+    site = multiprocessing.Process(target=mock_site.run_mock_site,
+                                   args=("127.0.0.1", args.port, args.delay,
+                                         args.page_size),
+                                   daemon=True)
+    site.start()
+    try:
+        wait_for_server(site_url, 30)
+        urls = [f"{site_url}{mock_site.make_post_path(number)}"
+                for number in range(args.posts)]
+        scrapers = [(f"process pool of {multiprocessing.cpu_count()}",
+                     lambda: scrape_with_pool(urls))]
+        scrapers += [(f"asyncio, concurrency {concurrency}",
+                      lambda concurrency=concurrency: asyncio.run(
+                          scrape_with_asyncio(urls, concurrency)))
+                     for concurrency in args.concurrency]
+        cache_directory = tempfile.TemporaryDirectory()
+        author_cache = AuthorCache(os.path.join(cache_directory.name,
+                                                "authors.sqlite3"))
+        scrapers += [(f"asyncio, concurrency {args.concurrency[-1]}, "
+                      f"{state} author cache",
+                      lambda: asyncio.run(scrape_with_asyncio(
+                          urls, args.concurrency[-1], author_cache)))
+                     for state in ("empty", "filled")]
+        for title, scrape in scrapers:
+            start = time.perf_counter()
+            posts_data = scrape()
+            elapsed = time.perf_counter() - start
+            scraped = sum(1 for post_data in posts_data if post_data)
+            print(f"{title}: {scraped} of {len(urls)} posts "
+                  f"in {elapsed:.2f} s, {scraped / elapsed:.1f} posts/s")
+        statistics = author_cache.statistics()
+        print(f"author cache: {statistics['hits']} hits, "
+              f"{statistics['misses']} misses, "
+              f"hit rate {statistics['hit_rate']:.2f}")
+        author_cache.close()
+        cache_directory.cleanup()
+    finally:
+        site.terminate()
+
+
+def load_pages(args: argparse.Namespace) -> List[tuple]:
+    """Read pages saved from the site to files "post_*.html"
+    and "user_*.html" or make pages of the imitation of the site
+    Return list of tuples of page kind ("post" or "user") and HTML.
+    """
+    if args.pages_dir:
+        pages = []
+        for file_name in sorted(os.listdir(args.pages_dir)):
+            kind = file_name.split("_", 1)[0]
+            if kind in ("post", "user") and file_name.endswith(".html"):
+                with open(os.path.join(args.pages_dir, file_name),
+                          encoding='utf-8') as file:
+                    pages.append((kind, file.read()))
+        return pages
+    filler = mock_site.make_filler(args.page_size)
+    return ([("post", mock_site.make_post_page(number, filler).decode())
+             for number in range(args.pages)]
+            + [("user", mock_site.make_user_page(f"user_{number}",
+                                                 filler).decode())
+               for number in range(args.pages)])
+
+
+def benchmark_parse(args: argparse.Namespace) -> None:
+    """Get data from pages by BeautifulSoup and by regular expressions
+    and print CPU time per page, pages which are not processed
+    by regular expressions are processed by BeautifulSoup in both cases"""
+    pages = load_pages(args)
+    parsers = {"post": (reddit_pages.get_post_data_from_page,
+                        reddit_pages.parse_post_page),
+               "user": (reddit_pages.get_user_data_from_page,
+                        reddit_pages.parse_user_page)}
+    for kind, (parse_tree, extract) in parsers.items():
+        sources = [src for page_kind, src in pages if page_kind == kind]
+        if not sources:
+            continue
+        start = time.process_time()
+        tree_data = [parse_tree(BeautifulSoup(src, "lxml"))
+                     for src in sources]
+        tree_time = (time.process_time() - start) / len(sources)
+        start = time.process_time()
+        extracted_data = [extract(src) for src in sources]
+        extract_time = (time.process_time() - start) / len(sources)
+        size = sum(len(src) for src in sources) / len(sources)
+        print(f"{kind} pages: {len(sources)} of {size / 1024:.0f} KB, "
+              f"BeautifulSoup {tree_time * 1000:.2f} ms, "
+              f"regular expressions {extract_time * 1000:.3f} ms per page, "
+              f"{tree_time / max(extract_time, 1e-9):.0f} times faster")
+        if extracted_data != tree_data:
+            print(f"{kind} pages: data differs")
+
+
+def harvest_from_page_source(driver: WebDriver, number: int,
+                              scrolls: int) -> List[str]:
+    """Get links to posts as "main_multiprocessing" did before
+    "LinkHarvester": scroll with fixed delays, parse the whole page
+    after every round and check urls against the list of found ones
+    "scrolls" - number of scrolls in the round
+    """
+    posts_urls = []
+    element = driver.find_element(By.TAG_NAME, "body")
+    while len(posts_urls) < number:
+        for scroll in range(1, scrolls):
+            element.send_keys(Keys.PAGE_DOWN)
+            time.sleep(0.5)
+        soup = BeautifulSoup(driver.page_source, "lxml")
+        page_urls = [urljoin(driver.current_url, item.get("href"))
+                     for item in soup.find_all(
+                         "a", class_=mock_site.POST_LINK_CLASS)]
+        new_posts_urls = [url for url in page_urls if url not in posts_urls]
+        if not new_posts_urls:
+            break
+        posts_urls += new_posts_urls
+    return posts_urls
+
+
+def benchmark_harvest(args: argparse.Namespace) -> None:
+    """Get links to posts from the listing of local imitation of the site
+    with growing page and print time of every way"""
+    site_url = f"http://127.0.0.1:{args.port}"
+    site = multiprocessing.Process(target=mock_site.run_mock_site,
+                                   args=("127.0.0.1", args.port, args.delay,
+                                         0),
+                                   daemon=True)
+    site.start()
+    try:
+        wait_for_server(site_url, 30)
+        ways = [("page source", lambda driver: harvest_from_page_source(
+                    driver, args.links, args.scrolls)),
+                ("link harvester", lambda driver: LinkHarvester(
+                    driver, mock_site.POST_LINK_CLASS).get_new_links(
+                    args.links))]
+        for title, harvest in ways:
+            driver = make_request_selenium(f"{site_url}/top/")
+            try:
+                start = time.perf_counter()
+                posts_urls = harvest(driver)
+                elapsed = time.perf_counter() - start
+            finally:
+                driver.quit()
+            print(f"{title}: {len(posts_urls)} links "
+                  f"({len(set(posts_urls))} unique) in {elapsed:.2f} s")
+    finally:
+        site.terminate()
+
+
+def make_links_source(site_url: str) -> callable:
+    """Return function which returns urls of the next "number" posts
+    of the imitation of the site as the listing does"""
+    numbers = itertools.count()
+
+    def get_links(number: int) -> List[str]:
+        return [f"{site_url}{mock_site.make_post_path(next(numbers))}"
+                for _ in range(number)]
+    return get_links
+
+
+async def scrape_in_rounds(get_links: callable, posts_number: int,
+                           round_size: int, concurrency: int,
+                           author_cache: AuthorCache, api_session,
+                           api_url: str) -> int:
+    """Scrape and write down posts as "main_multiprocessing" did before
+    the pipeline: all posts of the round are scraped and then written
+    one by one
+    Return number of written posts.
+    """
+    written = 0
+    async with AsyncScraper(concurrency,
+                            author_cache=author_cache) as scraper:
+        while written < posts_number:
+            all_posts_data = await scraper.scrape(get_links(round_size))
+            for post_data in all_posts_data:
+                if post_data and written < posts_number:
+                    response = api_session.post(
+                        f"{api_url}/posts/",
+                        data=json.dumps(post_data).encode('utf-8'),
+                        timeout=15)
+                    written += response.status_code == 201
+    return written
+
+
+async def scrape_with_pipeline(get_links: callable, posts_number: int,
+                               concurrency: int, batch_size: int,
+                               author_cache: AuthorCache, api_session,
+                               api_url: str) -> int:
+    """Scrape and write down posts by the pipeline as "main_multiprocessing"
+    Return number of written posts.
+    """
+    async with AsyncScraper(concurrency,
+                            author_cache=author_cache) as scraper:
+        pipeline = ScrapePipeline(get_links, scraper,
+                                  functools.partial(post_records, api_session,
+                                                    api_url=api_url),
+                                  posts_number, 2 * concurrency, batch_size)
+        return await pipeline.run()
+
+
+async def scrape_only(get_links: callable, posts_number: int,
+                      concurrency: int, author_cache: AuthorCache) -> int:
+    """Scrape posts without write
+    Return number of scraped posts.
+    """
+    async with AsyncScraper(concurrency,
+                            author_cache=author_cache) as scraper:
+        all_posts_data = await scraper.scrape(get_links(posts_number))
+    return sum(1 for post_data in all_posts_data if post_data)
+
+
+def write_only(posts_number: int, batch_size: int, api_session,
+               api_url: str) -> int:
+    """Write down generated posts in batches without scraping
+    Return number of written posts.
+    """
+    records = make_post_records(posts_number)
+    statuses = []
+    for position in range(0, len(records), batch_size):
+        statuses += post_records(api_session,
+                                 records[position:position + batch_size],
+                                 api_url)
+    return sum(1 for status in statuses if status["status"] == 201)
+
+
+def benchmark_pipeline(args: argparse.Namespace) -> None:
+    """Scrape local imitation of the site and write down posts
+    to RESTful server with SQLite data base, print time of every stage
+    alone, of rounds as before the pipeline and of the pipeline
+    Every way has its own empty cache of user data.
+    """
+    site_url = f"http://127.0.0.1:{args.port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "server.py")
+    site = multiprocessing.Process(target=mock_site.run_mock_site,
+                                   args=("127.0.0.1", args.port, args.delay,
+                                         args.page_size),
+                                   daemon=True)
+    site.start()
+    # Data base and log of the server and caches of user data
+    # are in the temporary directory
+    server_directory = tempfile.TemporaryDirectory()
+    server = subprocess.Popen([sys.executable, server_path,
+                               "--host", "127.0.0.1",
+                               "--port", str(args.api_port),
+                               "--database", "sqlite"],
+                              cwd=server_directory.name)
+    api_session = http_sessions.make_session()
+    try:
+        wait_for_server(site_url, 30)
+        wait_for_server(api_url, 30)
+        ways = [("scrape only", lambda get_links, cache: asyncio.run(
+                    scrape_only(get_links, args.posts, args.concurrency,
+                                cache))),
+                ("write only", lambda get_links, cache: write_only(
+                    args.posts, args.batch_size, api_session, api_url)),
+                (f"rounds of {args.round_size}",
+                 lambda get_links, cache: asyncio.run(scrape_in_rounds(
+                     get_links, args.posts, args.round_size,
+                     args.concurrency, cache, api_session, api_url))),
+                ("pipeline", lambda get_links, cache: asyncio.run(
+                    scrape_with_pipeline(get_links, args.posts,
+                                         args.concurrency, args.batch_size,
+                                         cache, api_session, api_url)))]
+        for number, (title, run) in enumerate(ways):
+            author_cache = AuthorCache(os.path.join(
+                server_directory.name, f"authors_{number}.sqlite3"))
+            start = time.perf_counter()
+            posts = run(make_links_source(site_url), author_cache)
+            elapsed = time.perf_counter() - start
+            author_cache.close()
+            print(f"{title}: {posts} of {args.posts} posts "
+                  f"in {elapsed:.2f} s, {posts / elapsed:.1f} posts/s")
+    finally:
+        api_session.close()
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        server_directory.cleanup()
+        site.terminate()
+
+
+parser = argparse.ArgumentParser(description='Benchmarks for RESTful server '
+                                             'and data base')
+subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+server_parser = subparsers.add_parser('server',
+                                      help='Requests per second and latency '
+                                           'under parallel clients')
+server_parser.add_argument('--url', type=str,
+                           default='http://127.0.0.1:8087/posts/',
+                           help='Requested url')
+server_parser.add_argument('--method', type=str,
+                           default='GET',
+                           help='Request method')
+server_parser.add_argument('--clients', type=int,
+                           default=32,
+                           help='Number of parallel keep-alive clients, '
+                                'default is more than the default number '
+                                'of threads of the server')
+server_parser.add_argument('--requests', type=int,
+                           default=200,
+                           help='Number of requests of each client')
+server_parser.set_defaults(run=benchmark_server)
+
+workers_parser = subparsers.add_parser('workers',
+                                       help='Requests per second of server '
+                                            'with different numbers '
+                                            'of worker processes')
+workers_parser.add_argument('--workers', type=int, nargs='+',
+                            default=[1, 2, 4],
+                            help='Numbers of worker processes to compare')
+workers_parser.add_argument('--url', type=str,
+                            default='http://127.0.0.1:8088/posts/?limit=20',
+                            help='Requested url, server is started on its '
+                                 'port')
+workers_parser.add_argument('--database', type=str,
+                            choices=['mongodb', 'sqlite', 'postgresql'],
+                            default='mongodb',
+                            help='Data base of the server')
+workers_parser.add_argument('--clients', type=int,
+                            default=16,
+                            help='Number of parallel client processes')
+workers_parser.add_argument('--requests', type=int,
+                            default=500,
+                            help='Number of requests of each client')
+workers_parser.add_argument('--records', type=int,
+                            default=100,
+                            help='Number of posts written down before '
+                                 'measurement')
+workers_parser.set_defaults(run=benchmark_workers)
+
+ingest_parser = subparsers.add_parser('ingest',
+                                      help='Records per second written down '
+                                           'with different batch sizes')
+ingest_parser.add_argument('--url', type=str,
+                           default='http://127.0.0.1:8087/posts/bulk',
+                           help='Url of the bulk endpoint')
+ingest_parser.add_argument('--records', type=int,
+                           default=2000,
+                           help='Number of records for each batch size')
+ingest_parser.add_argument('--batch_sizes', type=int, nargs='+',
+                           default=[1, 10, 100, 1000],
+                           help='Batch sizes, 1 uses single POST request')
+ingest_parser.set_defaults(run=benchmark_ingest)
+
+indexes_parser = subparsers.add_parser('indexes',
+                                       help='Latency of the server lookups '
+                                            'for growing number of posts')
+indexes_parser.add_argument('--db_host', type=str,
+                            default='localhost',
+                            help='Host of MongoDB Server')
+indexes_parser.add_argument('--db_port', type=int,
+                            default=27017,
+                            help='Port of MongoDB Server')
+indexes_parser.add_argument('--db_name', type=str,
+                            default='benchmark_posts_data',
+                            help='Name of temporary data base, '
+                                 'it is deleted after benchmark')
+indexes_parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[10000, 100000, 1000000],
+                            help='Numbers of posts to measure lookups at')
+indexes_parser.add_argument('--lookups', type=int,
+                            default=1000,
+                            help='Number of lookups of each kind')
+indexes_parser.add_argument('--batch', type=int,
+                            default=10000,
+                            help='Number of documents in insert batch')
+indexes_parser.add_argument('--without_indexes', action='store_true',
+                            help='Measure lookups without indexes')
+indexes_parser.set_defaults(run=benchmark_indexes)
+
+databases_parser = subparsers.add_parser('databases',
+                                         help='The same workload on MongoDB '
+                                              'and SQL data bases')
+databases_parser.add_argument('--databases', type=str, nargs='+',
+                              choices=['mongodb', 'sqlite', 'postgresql'],
+                              default=['mongodb', 'sqlite'],
+                              help='Data bases to compare')
+databases_parser.add_argument('--db_host', type=str,
+                              default='localhost',
+                              help='Host of MongoDB and PostgreSQL servers')
+databases_parser.add_argument('--mongodb_port', type=int,
+                              default=27017,
+                              help='Port of MongoDB Server')
+databases_parser.add_argument('--postgresql_port', type=int,
+                              default=5432,
+                              help='Port of PostgreSQL server')
+databases_parser.add_argument('--db_name', type=str,
+                              default='benchmark_posts_data',
+                              help='Name of temporary data base, it is '
+                                   'deleted after benchmark (PostgreSQL '
+                                   'data base must exist, its tables '
+                                   'are deleted)')
+databases_parser.add_argument('--records', type=int,
+                              default=100000,
+                              help='Number of posts')
+databases_parser.add_argument('--batch', type=int,
+                              default=1000,
+                              help='Number of posts in insert batch')
+databases_parser.add_argument('--lookups', type=int,
+                              default=1000,
+                              help='Number of lookups and deletes by _id')
+databases_parser.add_argument('--pages', type=int,
+                              default=100,
+                              help='Number of pages of each kind')
+databases_parser.set_defaults(run=benchmark_databases)
+
+encoding_parser = subparsers.add_parser('encoding',
+                                        help='Response body size and CPU time '
+                                             'of json encoders and content '
+                                             'codings')
+encoding_parser.add_argument('--records', type=int,
+                             default=5000,
+                             help='Number of posts in response')
+encoding_parser.add_argument('--repeats', type=int,
+                             default=10,
+                             help='Number of encodings to average CPU time')
+encoding_parser.set_defaults(run=benchmark_encoding)
+
+scraper_parser = subparsers.add_parser('scraper',
+                                       help='Posts per second of process '
+                                            'pool and asyncio scraper '
+                                            'on local imitation of the site')
+scraper_parser.add_argument('--posts', type=int,
+                            default=100,
+                            help='Number of posts to scrape')
+scraper_parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[10, 50],
+                            help='Maximum numbers of simultaneous requests '
+                                 'of asyncio scraper')
+scraper_parser.add_argument('--port', type=int,
+                            default=8089,
+                            help='Port of the imitation of the site')
+scraper_parser.add_argument('--delay', type=float,
+                            default=mock_site.MockSiteHandler.delay,
+                            help='Seconds the site waits before every '
+                                 'response')
+scraper_parser.add_argument('--page_size', type=int,
+                            default=100 * 1024,
+                            help='Size of post and user pages in bytes')
+scraper_parser.set_defaults(run=benchmark_scraper)
+
+parse_parser = subparsers.add_parser('parse',
+                                     help='CPU time of getting data from '
+                                          'post and user pages')
+parse_parser.add_argument('--pages_dir', type=str,
+                          help='Directory with pages saved from the site '
+                               'to files "post_*.html" and "user_*.html", '
+                               'pages of the imitation of the site are used '
+                               'by default')
+parse_parser.add_argument('--pages', type=int,
+                          default=50,
+                          help='Number of post and user pages of the '
+                               'imitation of the site')
+parse_parser.add_argument('--page_size', type=int,
+                          default=500 * 1024,
+                          help='Size of pages of the imitation of the site '
+                               'in bytes')
+parse_parser.set_defaults(run=benchmark_parse)
+
+harvest_parser = subparsers.add_parser('harvest',
+                                       help='Time of getting links from '
+                                            'the listing of local imitation '
+                                            'of the site in Chrome')
+harvest_parser.add_argument('--links', type=int,
+                            default=200,
+                            help='Number of links to get')
+harvest_parser.add_argument('--scrolls', type=int,
+                            default=20,
+                            help='Number of scrolls in the round of the '
+                                 'previous way')
+harvest_parser.add_argument('--port', type=int,
+                            default=8089,
+                            help='Port of the imitation of the site')
+harvest_parser.add_argument('--delay', type=float,
+                            default=mock_site.MockSiteHandler.delay,
+                            help='Seconds the site waits before every '
+                                 'response')
+harvest_parser.set_defaults(run=benchmark_harvest)
+
+pipeline_parser = subparsers.add_parser('pipeline',
+                                        help='Time of scraping and writing '
+                                             'down posts by rounds and by '
+                                             'the pipeline')
+pipeline_parser.add_argument('--posts', type=int,
+                             default=200,
+                             help='Number of posts to write down')
+pipeline_parser.add_argument('--concurrency', type=int,
+                             default=20,
+                             help='Maximum number of simultaneous requests '
+                                  'to the site')
+pipeline_parser.add_argument('--round_size', type=int,
+                             default=25,
+                             help='Number of links in the round of the '
+                                  'previous way')
+pipeline_parser.add_argument('--batch_size', type=int,
+                             default=100,
+                             help='Maximum number of posts written down '
+                                  'by one request')
+pipeline_parser.add_argument('--port', type=int,
+                             default=8089,
+                             help='Port of the imitation of the site')
+pipeline_parser.add_argument('--api_port', type=int,
+                             default=8088,
+                             help='Port of RESTful server')
+pipeline_parser.add_argument('--delay', type=float,
+                             default=mock_site.MockSiteHandler.delay,
+                             help='Seconds the site waits before every '
+                                  'response')
+pipeline_parser.add_argument('--page_size', type=int,
+                             default=100 * 1024,
+                             help='Size of post and user pages in bytes')
+pipeline_parser.set_defaults(run=benchmark_pipeline)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    args.run(args)
@@ -0,0 +1,123 @@
+"""Size-bounded in-process cache with time to live of entries"""
+import time
+import threading
+
+from collections import OrderedDict
+from typing import Hashable, Union
+
+# Number of invalidation marks, keys and tags with the same hash share
+# the mark
+MARKS_NUMBER = 1024
+
+
+class LRUCache:
+    """Cache which evicts least recently used entry when it is full
+    and expires entries after "ttl" seconds.
+    Every entry can be marked with tag to invalidate all entries
+    with the same tag at once.
+    Value read from data base before invalidation of its key or tag
+    is not saved, so data changed during the read is not cached."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        # Number of invalidations and number of the last invalidation
+        # of keys and tags by their mark
+        self._invalidations = 0
+        self._marks = [0] * MARKS_NUMBER
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Union[dict, None]:
+        """Get copy of the value by key
+        Return "None" if there is no entry or entry is expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def read_token(self) -> int:
+        """Get token before reading value from data base, it is passed
+        to "set" with the value"""
+        with self._lock:
+            return self._invalidations
+
+    def set(self, key: Hashable, value: dict, tag: Hashable = None,
+            token: int = None) -> None:
+        """Save copy of the value by key
+        "tag" - mark to invalidate entry with others by "invalidate_tag"
+        "token" - token got by "read_token" before reading the value,
+        value is not saved if key or tag was invalidated after it
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if token is not None and (
+                    self._marks[self._mark(key)] > token
+                    or (tag is not None
+                        and self._marks[self._mark(tag)] > token)):
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, dict(value),
+                                  tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove entry by key"""
+        with self._lock:
+            self._invalidate(key)
+            self._remove(key)
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        """Remove all entries marked with tag"""
+        with self._lock:
+            self._invalidate(tag)
+            for key in self._tags.pop(tag, set()):
+                self._entries.pop(key, None)
+
+    def statistics(self) -> dict:
+        """Return size, limits and hit and miss counters of the cache"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {"size": len(self._entries),
+                    "max_size": self.max_size,
+                    "ttl": self.ttl,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "hit_rate": self.hits / requests if requests else 0.0}
+
+    @staticmethod
+    def _mark(key: Hashable) -> int:
+        """Return index of invalidation mark of key or tag"""
+        return hash(key) % MARKS_NUMBER
+
+    def _invalidate(self, key: Hashable) -> None:
+        """Count invalidation of key or tag, lock must be acquired"""
+        self._invalidations += 1
+        self._marks[self._mark(key)] = self._invalidations
+
+    def _remove(self, key: Hashable) -> None:
+        """Remove entry and its tag mark, lock must be acquired"""
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[2] is not None:
+            keys = self._tags.get(entry[2])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[entry[2]]
@@ -0,0 +1,92 @@
+"""State of the crawl in SQLite file: every written post with its unique
+id on RESTful server, fingerprint of its score and number of comments
+on the listing and time of the last fetch. State is kept between runs,
+so interrupted crawl is resumed and unchanged posts are not requested
+again."""
+import time
+import hashlib
+import sqlite3
+import threading
+
+from typing import Union
+
+# Default file of the state in the current directory
+STATE_FILE = "crawl_state.sqlite3"
+# Seconds to wait while another process writes down to the file
+LOCK_TIMEOUT = 30
+
+
+def make_fingerprint(listing_text: str) -> Union[str, None]:
+    """Get fingerprint of score and number of comments of the post
+    "listing_text" - text of score and comments on the listing
+    Return "None" if text is empty, so post is always fetched.
+    """
+    if not listing_text:
+        return None
+    return hashlib.sha1(listing_text.encode('utf-8')).hexdigest()
+
+
+class CrawlState:
+    """Written posts by post url. State is used by the event loop
+    and by the thread which writes down posts, so one connection
+    is shared under the lock."""
+
+    def __init__(self, path: str = STATE_FILE):
+        """"path" - file of the state"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def connection(self) -> sqlite3.Connection:
+        """Get connection, it is opened on the first call"""
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS posts ("
+                               "post_url TEXT PRIMARY KEY, "
+                               "post_id TEXT NOT NULL, "
+                               "fingerprint TEXT, "
+                               "fetched_at REAL NOT NULL)")
+            self._connection = connection
+        return self._connection
+
+    def get(self, post_url: str) -> Union[tuple, None]:
+        """Get written post by url
+        Return tuple of unique id and fingerprint.
+        Return "None" if post was not written.
+        """
+        with self._lock:
+            return self.connection().execute(
+                "SELECT post_id, fingerprint FROM posts WHERE post_url = ?",
+                (post_url,)).fetchone()
+
+    def set(self, post_url: str, post_id: str,
+            fingerprint: Union[str, None]) -> None:
+        """Save post written now
+        "post_id" - unique id of the post on RESTful server
+        "fingerprint" - fingerprint of the post on the listing
+        """
+        with self._lock:
+            self.connection().execute(
+                "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?)",
+                (post_url, post_id, fingerprint, time.time()))
+
+    def clear(self) -> None:
+        """Forget all posts before the new crawl"""
+        with self._lock:
+            self.connection().execute("DELETE FROM posts")
+
+    def size(self) -> int:
+        """Return number of written posts"""
+        with self._lock:
+            return self.connection().execute(
+                "SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def close(self) -> None:
+        """Close connection"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
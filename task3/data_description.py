@@ -1,5 +1,8 @@
 """Description of post and user arguments
 required to write to the database"""
+import datetime
+
+from typing import Union
 
 
 class PostDataDB:
@@ -26,3 +29,73 @@ class UserDataDB:
 class AllData:
     """All arguments required to write to the database"""
     __slots__ = PostDataDB.__slots__ + UserDataDB.__slots__
+
+
+# Types of arguments in the database, other arguments are strings
+FIELD_TYPES = {"number_of_comments": int,
+               "number_of_votes": int,
+               "post_date": datetime.datetime,
+               "user_karma": int,
+               "post_karma": int,
+               "comment_karma": int,
+               "user_cake_day": datetime.datetime
+               }
+
+# Format of dates in requests and responses
+DATE_FORMAT = '%Y-%m-%d'
+
+# Number of posts of the user kept in "users" documents, user is deleted
+# with the last post. It is a service field, not a part of user data.
+POST_COUNT = "post_count"
+
+# Columns and their types of tables of relational data base by table
+# name, other collections are stored as json documents
+TABLES = {"posts": {field: FIELD_TYPES.get(field, str) for field
+                    in PostDataDB.__slots__ + ("user_id",)},
+          "users": dict({field: FIELD_TYPES.get(field, str) for field
+                         in ("_id",) + UserDataDB.__slots__},
+                        **{POST_COUNT: int})}
+
+
+def convert_to_db_type(attribute: str,
+                       value) -> Union[str, int, datetime.datetime]:
+    """Convert value of the argument to its type in the database
+    "attribute" - name of the argument
+    "value" - value of the argument from request or database
+    Numbers are accepted as int or str, dates as datetime or
+    str in DATE_FORMAT.
+    Return converted value.
+    Raise "ValueError" if value can not be converted.
+    """
+    field_type = FIELD_TYPES.get(attribute, str)
+    if field_type is int:
+        if isinstance(value, bool) or not isinstance(value, (int, float,
+                                                             str)):
+            raise ValueError(f"{attribute} must be integer")
+        if isinstance(value, float):
+            if not value.is_integer():
+                raise ValueError(f"{attribute} must be integer")
+            return int(value)
+        return int(value)
+    if field_type is datetime.datetime:
+        if isinstance(value, datetime.datetime):
+            return value
+        if not isinstance(value, str):
+            raise ValueError(f"{attribute} must be date")
+        return datetime.datetime.strptime(value, DATE_FORMAT)
+    return str(value)
+
+
+# Indexes for every query of the server by collection name:
+# "keys" - list of (field, direction) pairs, "unique" - unique index
+INDEXES = {"users": [{"keys": [("user_name", 1)], "unique": True}],
+           "posts": [{"keys": [("user_id", 1)], "unique": False},
+                     {"keys": [("number_of_votes", -1), ("_id", 1)],
+                      "unique": False},
+                     {"keys": [("post_date", 1), ("_id", 1)],
+                      "unique": False},
+                     {"keys": [("post_category", 1), ("post_date", 1)],
+                      "unique": False}],
+           "author_stats": [{"keys": [("posts", -1), ("votes", -1)],
+                             "unique": False}]
+           }
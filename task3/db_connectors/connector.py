@@ -1,7 +1,69 @@
 """Abstract class for methods description
 of connectors to database"""
 
+import time
+import functools
+
 from abc import ABC, abstractmethod
+from typing import List
+
+from metrics import Counter, Histogram
+
+
+class DuplicateDataError(Exception):
+    """Data with the same unique key already exists"""
+
+
+class NotExecutedError(Exception):
+    """Operation of ordered bulk write was not executed because
+    of error of previous operation"""
+
+
+class Operation:
+    """Write operation of bulk write"""
+    __slots__ = ("kind", "search_filter", "data", "upsert")
+
+    KINDS = ("insert", "update", "increment", "delete")
+
+    def __init__(self, kind: str, search_filter: dict = None,
+                 data: dict = None, upsert: bool = False):
+        """"kind" - "insert", "update" (set fields), "increment"
+        (add amounts to fields) or "delete"
+        "search_filter" - filter to find single document, not used
+        by "insert"
+        "data" - document to insert, new values or amounts by field name
+        "upsert" - insert document if it was not found by "update"
+        or "increment"
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"unknown operation: {kind}")
+        self.kind = kind
+        self.search_filter = search_filter or {}
+        self.data = data or {}
+        self.upsert = upsert
+
+
+def timed_by(call_duration: Histogram, call_errors: Counter):
+    """Make decorator which records duration of the call of connector
+    method by collection name and method name, the first argument
+    of the method is the collection
+    "call_duration" - histogram with ("collection", "operation") labels
+    "call_errors" - counter with ("collection", "operation") labels
+    """
+    def timed(method):
+        @functools.wraps(method)
+        def wrapper(self, collection_name, *args, **kwargs):
+            start = time.perf_counter()
+            labels = (getattr(collection_name, "name", ""), method.__name__)
+            try:
+                return method(self, collection_name, *args, **kwargs)
+            except Exception:
+                call_errors.inc(*labels)
+                raise
+            finally:
+                call_duration.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return timed
 
 
 class Connector(ABC):
@@ -15,6 +77,16 @@ class Connector(ABC):
         """Insert data"""
         pass
 
+    @abstractmethod
+    def insert_many(self, *args, **kwargs):
+        """Insert many data at once"""
+        pass
+
+    @abstractmethod
+    def bulk_write(self, *args, **kwargs):
+        """Execute many write operations at once"""
+        pass
+
     @abstractmethod
     def delete_one(self, *args, **kwargs):
         """Delete data"""
@@ -30,7 +102,30 @@ class Connector(ABC):
         """Get all data"""
         pass
 
+    @abstractmethod
+    def find_all_joined(self, *args, **kwargs):
+        """Get all data joined with data it refers to"""
+        pass
+
+    @abstractmethod
+    def find_many(self, *args, **kwargs):
+        """Get many data by filter"""
+        pass
+
     @abstractmethod
     def find_one(self, *args, **kwargs):
         """Get single data"""
         pass
+
+    @staticmethod
+    def make_filter(conditions: List[tuple]) -> dict:
+        """Make filter from conditions
+
+        "conditions" - list of (field, operator, value), operator is one
+        of "eq", "gt", "gte", "lt", "lte"
+        Return filter in dict format.
+        """
+        search_filter = {}
+        for field, operator, value in conditions:
+            search_filter.setdefault(field, {})[f"${operator}"] = value
+        return search_filter
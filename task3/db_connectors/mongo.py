@@ -1,7 +1,26 @@
-from pymongo import MongoClient, database, collection
-from typing import List, Union
+from bson.objectid import ObjectId
+from pymongo import MongoClient, ReturnDocument, InsertOne, UpdateOne, \
+    DeleteOne, database, collection
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import Dict, Iterable, Iterator, List, Union
 
-from db_connectors.connector import Connector
+from db_connectors.connector import Connector, DuplicateDataError, \
+    NotExecutedError, Operation, timed_by
+from metrics import REGISTRY
+
+# Error code of the MongoDB server for unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+CALL_DURATION = REGISTRY.histogram("mongodb_call_duration_seconds",
+                                   "Duration of MongoDB calls",
+                                   ("collection", "operation"))
+CALL_ERRORS = REGISTRY.counter("mongodb_call_errors_total",
+                               "MongoDB calls finished with exception",
+                               ("collection", "operation"))
+
+
+# Records duration of the call by collection name and method name
+timed = timed_by(CALL_DURATION, CALL_ERRORS)
 
 
 class MongodbService(Connector):
@@ -25,6 +44,48 @@ class MongodbService(Connector):
         """
         self._client.drop_database(db_name)
 
+    def ensure_indexes(self, db_name: database.Database,
+                       indexes: Dict[str, List[dict]]) -> List[str]:
+        """Create indexes which are not in collections yet
+
+        "db_name" - pymongo.database.Database class instance
+        "indexes" - index descriptions by collection name, every
+        description has "keys" - list of (field, direction) pairs
+        and "unique" - unique index flag
+        Return names of indexes.
+        """
+        names = []
+        for collection_name, descriptions in indexes.items():
+            for description in descriptions:
+                names.append(db_name[collection_name].create_index(
+                    description["keys"],
+                    unique=description.get("unique", False)))
+        return names
+
+    @staticmethod
+    def list_indexes(collection_name: collection.Collection) -> List[dict]:
+        """Get indexes of collection
+
+        "collection_name" - pymongo.collection.Collection class instance
+        Return list of index descriptions in dict format.
+        """
+        return [dict(index) for index in collection_name.list_indexes()]
+
+    @staticmethod
+    def explain(collection_name: collection.Collection,
+                search_filter: dict, sort: list = None) -> dict:
+        """Get query plan chosen by data base for filter
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find documents in the collection
+        "sort" - list of (field, direction) pairs to sort documents
+        Return winning plan in dict format.
+        """
+        cursor = collection_name.find(search_filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor.explain()["queryPlanner"]["winningPlan"]
+
     @staticmethod
     def create_collection(db_name: database.Database,
                           collection_name: str) -> collection.Collection:
@@ -36,15 +97,162 @@ class MongodbService(Connector):
         """
         return db_name[collection_name]
 
+    @timed
     def insert_one(self, collection_name: collection.Collection,
                    data: dict) -> None:
         """Insert document into collection
 
         "collection_name" - pymongo.collection.Collection class instance
         "data" - data to insert into collection
+        Raise "DuplicateDataError" if document with the same unique key
+        exists.
         """
-        collection_name.insert_one(data)
+        try:
+            collection_name.insert_one(data)
+        except DuplicateKeyError as ex:
+            raise DuplicateDataError(str(ex))
+
+    @timed
+    def find_one_and_upsert(self, collection_name: collection.Collection,
+                            search_filter: dict, data: dict,
+                            increments: dict = None) -> tuple:
+        """Get single document from collection by filter or insert it
+        if it was not found in single request
 
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find document in the collection
+        "data" - data to insert into collection
+        "increments" - amounts to add to the fields of found or inserted
+        document by field name
+        Return tuple of document in dict format before increment and flag
+        "document was inserted", document is always found or inserted.
+        """
+        document_id = ObjectId()
+        update = {'$setOnInsert': dict(data, _id=document_id)}
+        if increments:
+            update['$inc'] = increments
+        while True:
+            try:
+                document = collection_name.find_one_and_update(
+                    search_filter, update,
+                    upsert=True, return_document=ReturnDocument.BEFORE)
+            except DuplicateKeyError:
+                # Concurrent request has inserted the document first,
+                # it is found by the next attempt or inserted again
+                # if it was deleted meanwhile
+                continue
+            if document is None:
+                return dict(data, _id=document_id), True
+            return document, False
+
+    @timed
+    def insert_many(self, collection_name: collection.Collection,
+                    documents: List[dict]) -> Dict[int, Exception]:
+        """Insert documents into collection in single unordered bulk write
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "documents" - data to insert into collection
+        Return errors of not inserted documents by index of the document,
+        "DuplicateDataError" if document with the same unique key exists.
+        """
+        if not documents:
+            return {}
+        try:
+            collection_name.insert_many(documents, ordered=False)
+        except BulkWriteError as ex:
+            return self.write_errors(ex)
+        return {}
+
+    @staticmethod
+    def write_errors(bulk_write_error: BulkWriteError) -> Dict[int,
+                                                               Exception]:
+        """Get errors of operations of bulk write by index
+        of the operation, "DuplicateDataError" if document with the same
+        unique key exists"""
+        errors = {}
+        for write_error in bulk_write_error.details.get("writeErrors", []):
+            if write_error.get("code") == DUPLICATE_KEY_ERROR:
+                error = DuplicateDataError(write_error.get("errmsg"))
+            else:
+                error = Exception(write_error.get("errmsg"))
+            errors[write_error["index"]] = error
+        return errors
+
+    @timed
+    def bulk_write(self, collection_name: collection.Collection,
+                   operations: List[Operation],
+                   ordered: bool = True) -> Dict[int, Exception]:
+        """Execute write operations in single bulk write
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "operations" - list of Operation class instances
+        "ordered" - execute operations one after another and stop
+        at the first error, in any order and all of them otherwise
+        Return errors of failed operations by index of the operation,
+        "DuplicateDataError" if document with the same unique key
+        exists, "NotExecutedError" for operations after the first error
+        of ordered bulk write.
+        """
+        if not operations:
+            return {}
+        try:
+            collection_name.bulk_write([self.make_request(operation)
+                                        for operation in operations],
+                                       ordered=ordered)
+        except BulkWriteError as ex:
+            errors = self.write_errors(ex)
+            if ordered and errors:
+                failed = min(errors)
+                for index in range(failed + 1, len(operations)):
+                    errors[index] = NotExecutedError(
+                        f"operation {failed} failed")
+            return errors
+        return {}
+
+    @classmethod
+    def make_request(cls, operation: Operation):
+        """Return pymongo request of bulk write for operation"""
+        if operation.kind == "insert":
+            return InsertOne(operation.data)
+        if operation.kind == "update":
+            return UpdateOne(operation.search_filter,
+                             {'$set': operation.data},
+                             upsert=operation.upsert)
+        if operation.kind == "increment":
+            return UpdateOne(operation.search_filter,
+                             cls.make_increment(operation.data),
+                             upsert=operation.upsert)
+        return DeleteOne(operation.search_filter)
+
+    @timed
+    def upsert_many(self, collection_name: collection.Collection,
+                    key_field: str, documents: List[dict],
+                    increments: List[dict] = None) -> List[int]:
+        """Insert documents which are not in collection yet
+        in single ordered bulk write, existing documents are not changed
+        except incremented fields
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "key_field" - field to find existing document in the collection
+        "documents" - data to insert into collection
+        "increments" - amounts to add to the fields of every found
+        or inserted document, in the same order as documents
+        Return indexes of inserted documents.
+        """
+        if not documents:
+            return []
+        increments = increments or [None] * len(documents)
+        requests = []
+        for document, amounts in zip(documents, increments):
+            update = {'$setOnInsert': document}
+            if amounts:
+                update['$inc'] = amounts
+            requests.append(UpdateOne({key_field: document[key_field]},
+                                      update, upsert=True))
+        result = collection_name.bulk_write(requests, ordered=True)
+        return sorted(result.upserted_ids)
+
+    @timed
     def delete_one(self, collection_name: collection.Collection,
                    search_filter: dict) -> None:
         """Delete document from collection by filter
@@ -54,16 +262,145 @@ class MongodbService(Connector):
         """
         collection_name.delete_one(search_filter)
 
+    @timed
+    def delete_many(self, collection_name: collection.Collection,
+                    search_filter: dict) -> int:
+        """Delete all documents from collection by filter
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find documents in the collection
+        Return number of deleted documents.
+        """
+        return collection_name.delete_many(search_filter).deleted_count
+
+    @timed
+    def find_one_and_delete(self, collection_name: collection.Collection,
+                            search_filter: dict) -> Union[dict, None]:
+        """Delete single document from collection by filter
+        in single request
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find document in the collection
+        Return deleted document in dict format.
+        Return "None" if document was not found.
+        """
+        return collection_name.find_one_and_delete(search_filter)
+
+    @timed
     def update_one(self, collection_name: collection.Collection,
-                   search_filter: dict, new_values: dict) -> None:
+                   search_filter: dict, new_values: dict,
+                   upsert: bool = False) -> None:
         """Update document fields in collection by filter
 
         "collection_name" - pymongo.collection.Collection class instance
         "search_filter" - filter to find document in the collection
         "new_values" - data to update in document
+        "upsert" - insert document if it was not found
+        """
+        collection_name.update_one(search_filter, {'$set': new_values},
+                                   upsert=upsert)
+
+    @timed
+    def update_many(self, collection_name: collection.Collection,
+                    search_filter: dict, new_values: dict) -> None:
+        """Update fields of all documents in collection by filter
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find documents in the collection
+        "new_values" - data to update in documents
+        """
+        collection_name.update_many(search_filter, {'$set': new_values})
+
+    @timed
+    def update_each(self, collection_name: collection.Collection,
+                    updates: List[tuple]) -> None:
+        """Update fields of many documents in single unordered bulk write
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "updates" - list of (filter, new values) pairs
+        """
+        if not updates:
+            return
+        collection_name.bulk_write([UpdateOne(search_filter,
+                                              {'$set': new_values})
+                                    for search_filter, new_values in updates],
+                                   ordered=False)
+
+    @timed
+    def increment_one(self, collection_name: collection.Collection,
+                      search_filter: dict, increments: dict,
+                      new_values: dict = None, upsert: bool = True) -> None:
+        """Increment document fields in collection by filter
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find document in the collection
+        "increments" - amounts to add to the fields by field name
+        "new_values" - data to update in document
+        "upsert" - insert document if it was not found
+        """
+        collection_name.update_one(search_filter,
+                                   self.make_increment(increments,
+                                                       new_values),
+                                   upsert=upsert)
+
+    @timed
+    def find_one_and_increment(self, collection_name: collection.Collection,
+                               search_filter: dict,
+                               increments: dict) -> Union[dict, None]:
+        """Increment fields of single document in collection by filter
+        in single request, document is not inserted if it was not found
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find document in the collection
+        "increments" - amounts to add to the fields by field name
+        Return document after increment in dict format.
+        Return "None" if document was not found.
+        """
+        return collection_name.find_one_and_update(
+            search_filter, {'$inc': increments},
+            return_document=ReturnDocument.AFTER)
+
+    @timed
+    def increment_each(self, collection_name: collection.Collection,
+                       increments: List[tuple], upsert: bool = True) -> None:
+        """Increment fields of many documents in single unordered bulk
+        write
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "increments" - list of (filter, increments, new values)
+        "upsert" - insert documents which were not found
         """
-        collection_name.update_one(search_filter, {'$set': new_values})
+        if not increments:
+            return
+        collection_name.bulk_write(
+            [UpdateOne(search_filter, self.make_increment(amounts,
+                                                          new_values),
+                       upsert=upsert)
+             for search_filter, amounts, new_values in increments],
+            ordered=False)
 
+    @staticmethod
+    def make_increment(increments: dict, new_values: dict = None) -> dict:
+        """Make update which increments and sets fields
+        Return update in dict format.
+        """
+        update = {'$inc': increments}
+        if new_values:
+            update['$set'] = new_values
+        return update
+
+    @timed
+    def aggregate(self, collection_name: collection.Collection,
+                  pipeline: List[dict]) -> List[dict]:
+        """Run aggregation pipeline on collection
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "pipeline" - list of aggregation stages
+        Return list of result documents in dict format.
+        """
+        return list(collection_name.aggregate(pipeline))
+
+    @timed
     def find_all(self, collection_name: collection.Collection) -> List[dict]:
         """Get all documents from collection
 
@@ -72,6 +409,104 @@ class MongodbService(Connector):
         """
         return list(collection_name.find())
 
+    @timed
+    def find_all_joined(self, collection_name: collection.Collection,
+                        foreign_collection: collection.Collection,
+                        local_field: str, conditions: List[tuple] = None,
+                        limit: int = 0, sort: List[tuple] = None,
+                        fields: List[str] = None,
+                        foreign_fields: Iterable[str] = (),
+                        hidden_fields: Iterable[str] = ()) -> Iterator[dict]:
+        """Get documents from collection joined with documents
+        of other collection in single aggregation
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "foreign_collection" - pymongo.collection.Collection class instance
+        with documents to join
+        "local_field" - field with "_id" of the document to join
+        "conditions" - list of (field, operator, value) to find documents,
+        operator is one of "eq", "gt", "gte", "lt", "lte"
+        "limit" - maximum number of documents, 0 - without limit
+        "sort" - list of (field, direction) pairs, documents are sorted
+        by "_id" after them
+        "fields" - fields of the result documents, "_id" is always
+        included, all fields if it is not passed
+        "foreign_fields" - fields of the joined documents, conditions and
+        sort by them are applied after join
+        "hidden_fields" - fields of the joined documents which are never
+        included in the result documents
+        Return cursor over documents from collection in dict format, where
+        "local_field" is replaced by fields of the joined document
+        (except "_id"). Documents without joined document are skipped.
+        """
+        foreign_fields = set(foreign_fields)
+        conditions = conditions or []
+        sort = [(field, direction) for field, direction in sort or []
+                if field != "_id"] + [("_id", 1)]
+        local_conditions = [condition for condition in conditions
+                            if condition[0] not in foreign_fields]
+        foreign_conditions = [condition for condition in conditions
+                              if condition[0] in foreign_fields]
+        sort_after_join = any(field in foreign_fields for field, _ in sort)
+        page = [{"$sort": dict(sort)}]
+        if limit:
+            page.append({"$limit": limit})
+
+        # Filter, sort and limit are applied before join if possible,
+        # so only documents of the page are joined
+        pipeline = [{"$match": self.make_filter(local_conditions)}]
+        if not sort_after_join:
+            pipeline += page
+        if (fields is None or foreign_fields & set(fields)
+                or foreign_conditions or sort_after_join):
+            pipeline += [
+                {"$lookup": {"from": foreign_collection.name,
+                             "localField": local_field,
+                             "foreignField": "_id",
+                             "as": local_field}},
+                {"$unwind": f"${local_field}"},
+                {"$project": dict.fromkeys(
+                    [f"{local_field}.{field}"
+                     for field in ("_id", *hidden_fields)], False)},
+                {"$replaceRoot": {"newRoot": {"$mergeObjects": [
+                    "$$ROOT", f"${local_field}"]}}},
+            ]
+        if foreign_conditions:
+            pipeline.append({"$match": self.make_filter(foreign_conditions)})
+        if sort_after_join:
+            pipeline += page
+        if fields is None:
+            pipeline.append({"$project": {local_field: False}})
+        else:
+            pipeline.append({"$project": dict.fromkeys(
+                ["_id"] + [field for field in fields if field != local_field],
+                True)})
+        return collection_name.aggregate(pipeline)
+
+    @timed
+    def find_many(self, collection_name: collection.Collection,
+                  search_filter: dict, *args, limit: int = 0,
+                  sort: list = None) -> List[dict]:
+        """Get documents from collection by filter
+
+        "collection_name" - pymongo.collection.Collection class instance
+        "search_filter" - filter to find documents in the collection
+        "*args" - additional parameters for output from documents
+        "limit" - maximum number of documents, 0 - all documents
+        "sort" - list of (field, direction) pairs, documents are sorted
+        by "_id" if only limit is passed
+        Return list of documents from collection in dict format.
+        """
+        cursor = collection_name.find(search_filter, *args)
+        if sort:
+            cursor = cursor.sort(sort)
+        elif limit:
+            cursor = cursor.sort("_id", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    @timed
     def find_one(self, collection_name: collection.Collection,
                  search_filter: dict, *args) -> Union[dict, str, None]:
         """Get single document from collection by filter
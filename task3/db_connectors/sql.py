@@ -0,0 +1,1150 @@
+"""Connector to relational data base: SQLite or PostgreSQL.
+Posts and users are stored in tables with column per field, other
+collections (for example counters) are stored as json documents
+in "documents" table. Filters are written as for MongoDB, subset
+of operators is supported."""
+import os
+import json
+import queue
+import itertools
+import sqlite3
+import datetime
+import threading
+import contextlib
+
+from bson.objectid import ObjectId
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+from db_connectors.connector import Connector, DuplicateDataError, \
+    NotExecutedError, Operation, timed_by
+from metrics import REGISTRY
+
+DIALECTS = ("sqlite", "postgresql")
+
+# Table with documents of collections which are not described by tables
+DOCUMENTS_TABLE = "documents"
+
+# Comparison operators of filters
+OPERATORS = {"$eq": "=", "$ne": "<>", "$gt": ">", "$gte": ">=",
+             "$lt": "<", "$lte": "<="}
+
+# Maximum number of parameters of single statement, multi-row inserts
+# are split by it (SQLite 3.32+ limit, PostgreSQL limit is greater)
+MAX_PARAMETERS = 32766
+
+# Number of rows read from data base by one query of iterators
+FETCH_SIZE = 1000
+
+CALL_DURATION = REGISTRY.histogram("sql_call_duration_seconds",
+                                   "Duration of SQL data base calls",
+                                   ("collection", "operation"))
+CALL_ERRORS = REGISTRY.counter("sql_call_errors_total",
+                               "SQL data base calls finished with exception",
+                               ("collection", "operation"))
+
+# Records duration of the call by collection name and method name
+timed = timed_by(CALL_DURATION, CALL_ERRORS)
+
+
+def quoted(columns: Iterable[str]) -> str:
+    """Return comma separated list of quoted column names"""
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+class Table:
+    """Table of relational data base, it is passed to connector methods
+    in place of the collection"""
+
+    def __init__(self, name: str, columns: Union[Dict[str, type], None]):
+        """"name" - table or collection name
+        "columns" - types of columns by column name, "None" for collection
+        stored as json documents
+        """
+        self.name = name
+        self.columns = columns
+
+
+class ConnectionPool:
+    """Fixed number of connections shared by threads, connections
+    are opened on demand"""
+
+    def __init__(self, connect: Callable, size: int):
+        self._connect = connect
+        self._connections = queue.LifoQueue()
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Get connection for single transaction, it is committed
+        on exit and rolled back on exception"""
+        with self._semaphore:
+            try:
+                connection = self._connections.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            try:
+                yield connection
+                connection.commit()
+            except BaseException:
+                try:
+                    connection.rollback()
+                except Exception:
+                    # Broken connection is not returned to the pool
+                    connection.close()
+                    connection = None
+                raise
+            finally:
+                if connection is not None:
+                    self._connections.put(connection)
+
+    def close(self) -> None:
+        """Close connections which are not in use"""
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class SqlService(Connector):
+
+    def __init__(self, hostname, port, dialect: str = "sqlite",
+                 tables: Dict[str, Dict[str, type]] = None,
+                 pool_size: int = 8):
+        """"hostname", "port" - PostgreSQL server address, not used
+        by SQLite
+        "dialect" - "sqlite" or "postgresql"
+        "tables" - types of columns by column name by table name,
+        every table has "_id" primary key
+        "pool_size" - maximum number of open connections
+        """
+        super(SqlService, self).__init__(hostname, port)
+        if dialect not in DIALECTS:
+            raise ValueError(f"unknown dialect: {dialect}")
+        if dialect == "postgresql" and psycopg2 is None:
+            raise ImportError("psycopg2 is required for PostgreSQL")
+        self._dialect = dialect
+        self._tables = tables or {}
+        self._pool_size = pool_size
+        self._pool = None
+        self._placeholder = "?" if dialect == "sqlite" else "%s"
+        self._integrity_error = (sqlite3.IntegrityError
+                                 if dialect == "sqlite"
+                                 else psycopg2.IntegrityError)
+
+    def create_db(self, db_name: str) -> str:
+        """Open connections to data base and create tables
+        which are not in data base yet
+
+        "db_name" - database name, SQLite data base is the file
+        "db_name.sqlite3", PostgreSQL data base must exist
+        Return database name.
+        """
+        if self._pool is not None:
+            self._pool.close()
+        if self._dialect == "sqlite":
+            def connect():
+                connection = sqlite3.connect(f"{db_name}.sqlite3",
+                                             timeout=30,
+                                             check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                return connection
+        else:
+            def connect():
+                return psycopg2.connect(host=self._hostname, port=self._port,
+                                        dbname=db_name)
+        self._pool = ConnectionPool(connect, self._pool_size)
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            for name, columns in self._tables.items():
+                definitions = [f'"{field}" {self.column_type(field_type)}'
+                               + (" PRIMARY KEY" if field == "_id" else "")
+                               for field, field_type in columns.items()]
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" '
+                               f'({", ".join(definitions)})')
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS "{DOCUMENTS_TABLE}" '
+                           f'("collection" TEXT, "_id" TEXT, "data" TEXT, '
+                           f'PRIMARY KEY ("collection", "_id"))')
+        return db_name
+
+    def drop_db(self, db_name: str) -> None:
+        """Delete SQLite data base file or all tables of PostgreSQL
+        data base
+
+        "db_name" - database name
+        """
+        if self._dialect == "sqlite":
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(f"{db_name}.sqlite3{suffix}")
+            return
+        if self._pool is None:
+            self.create_db(db_name)
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            for name in list(self._tables) + [DOCUMENTS_TABLE]:
+                cursor.execute(f'DROP TABLE IF EXISTS "{name}"')
+
+    @staticmethod
+    def column_type(field_type: type) -> str:
+        """Return SQL type of column for python type of field"""
+        if field_type is int:
+            return "BIGINT"
+        if field_type is datetime.datetime:
+            return "TIMESTAMP"
+        return "TEXT"
+
+    def ensure_indexes(self, db_name: str,
+                       indexes: Dict[str, List[dict]]) -> List[str]:
+        """Create indexes which are not in tables yet, indexes
+        of collections stored as json documents are skipped
+
+        "db_name" - database name
+        "indexes" - index descriptions by table name, every
+        description has "keys" - list of (field, direction) pairs
+        and "unique" - unique index flag
+        Return names of indexes.
+        """
+        names = []
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            for table_name, descriptions in indexes.items():
+                if table_name not in self._tables:
+                    continue
+                table = Table(table_name, self._tables[table_name])
+                for description in descriptions:
+                    keys = description["keys"]
+                    name = "_".join([table_name] + [
+                        f"{field}_{direction}" for field, direction in keys])
+                    columns = ", ".join(
+                        f'"{self.column(table, field)}"'
+                        f'{" DESC" if direction < 0 else ""}'
+                        for field, direction in keys)
+                    unique = "UNIQUE " if description.get("unique") else ""
+                    cursor.execute(f'CREATE {unique}INDEX IF NOT EXISTS '
+                                   f'"{name}" ON "{table_name}" ({columns})')
+                    names.append(name)
+        return names
+
+    def list_indexes(self, collection_name: Table) -> List[dict]:
+        """Get indexes of table
+
+        "collection_name" - Table class instance
+        Return list of index descriptions with "name", "key"
+        - list of (field, direction) pairs and "unique" flag.
+        """
+        indexes = []
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            if self._dialect == "sqlite":
+                cursor.execute(f'PRAGMA index_list("{collection_name.name}")')
+                for _, name, unique, *_ in cursor.fetchall():
+                    cursor.execute(f'PRAGMA index_xinfo("{name}")')
+                    key = [(column, -1 if descending else 1)
+                           for _, _, column, descending, _, is_key
+                           in cursor.fetchall() if is_key]
+                    indexes.append({"name": name, "key": key,
+                                    "unique": bool(unique)})
+            else:
+                cursor.execute("SELECT indexname, indexdef FROM pg_indexes "
+                               "WHERE tablename = %s",
+                               (collection_name.name,))
+                for name, definition in cursor.fetchall():
+                    columns = definition[definition.rindex("(") + 1:
+                                         definition.rindex(")")]
+                    key = []
+                    for column in columns.split(","):
+                        column, _, direction = column.strip().partition(" ")
+                        key.append((column.strip('"'),
+                                    -1 if direction == "DESC" else 1))
+                    indexes.append({"name": name, "key": key,
+                                    "unique": "UNIQUE" in definition})
+        return indexes
+
+    def explain(self, collection_name: Table, search_filter: dict,
+                sort: List[tuple] = None) -> dict:
+        """Get query plan of the search in table
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find rows in the table
+        "sort" - list of (field, direction) pairs
+        Return query plan in dict format, every stage has "stage",
+        "indexName" if index is used and "inputStage" if it has input.
+        """
+        query, parameters = self.select_query(collection_name,
+                                              search_filter, sort=sort)
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            if self._dialect == "sqlite":
+                cursor.execute(f"EXPLAIN QUERY PLAN {query}", parameters)
+                plan = {}
+                for *_, detail in reversed(cursor.fetchall()):
+                    plan = {"stage": detail, "inputStage": plan}
+                return plan
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", parameters)
+            return self.make_plan(cursor.fetchone()[0][0]["Plan"])
+
+    @staticmethod
+    def make_plan(node: dict) -> dict:
+        """Convert PostgreSQL plan node to query plan of "explain" """
+        plan = {"stage": node["Node Type"]}
+        if node.get("Index Name"):
+            plan["indexName"] = node["Index Name"]
+        if node.get("Plans"):
+            plan["inputStage"] = SqlService.make_plan(node["Plans"][0])
+        return plan
+
+    def create_collection(self, db_name: str, collection_name: str) -> Table:
+        """Get table of data base, collections without table
+        are stored as json documents
+
+        "db_name" - database name
+        "collection_name" - collection name
+        Return Table class instance
+        """
+        return Table(collection_name, self._tables.get(collection_name))
+
+    def column(self, collection_name: Table, field: str) -> str:
+        """Return column name of field
+        Raise "ValueError" if table has no column for the field.
+        """
+        if field not in collection_name.columns:
+            raise ValueError(f"unknown field: {field}")
+        return field
+
+    def to_db(self, value):
+        """Convert value of field to value of column"""
+        if isinstance(value, ObjectId):
+            return str(value)
+        if isinstance(value, datetime.datetime) and self._dialect == "sqlite":
+            return value.isoformat(sep=" ")
+        return value
+
+    def from_db(self, field_type: type, value):
+        """Convert value of column to value of field"""
+        if field_type is datetime.datetime and isinstance(value, str):
+            return datetime.datetime.fromisoformat(value)
+        return value
+
+    def make_document(self, types: Dict[str, type], columns: List[str],
+                      row: tuple) -> dict:
+        """Make document from row, NULL columns are skipped
+        "types" - types of columns by column name
+        "columns" - column names of the row
+        """
+        return {column: self.from_db(types[column], value)
+                for column, value in zip(columns, row) if value is not None}
+
+    def make_where(self, search_filter: dict,
+                   resolve: Callable[[str], str]) -> Tuple[str, list]:
+        """Make condition of WHERE clause from filter
+
+        "search_filter" - filter with fields, "$and", "$or" and operators
+        "$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$exists"
+        "resolve" - function which returns column expression of field
+        Return tuple of condition and its parameters.
+        Raise "ValueError" for other operators.
+        """
+        parts = []
+        parameters = []
+        for field, condition in search_filter.items():
+            if field in ("$and", "$or"):
+                subparts = []
+                for subfilter in condition:
+                    subpart, subparameters = self.make_where(subfilter,
+                                                             resolve)
+                    subparts.append(f"({subpart})")
+                    parameters += subparameters
+                separator = " AND " if field == "$and" else " OR "
+                parts.append(f"({separator.join(subparts)})" if subparts
+                             else "1 = 1" if field == "$and" else "1 = 0")
+                continue
+            column = resolve(field)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, value in condition.items():
+                if operator == "$in":
+                    if value:
+                        placeholders = ", ".join([self._placeholder]
+                                                 * len(value))
+                        parts.append(f"{column} IN ({placeholders})")
+                        parameters += [self.to_db(item) for item in value]
+                    else:
+                        parts.append("1 = 0")
+                elif operator == "$exists":
+                    parts.append(f"{column} IS "
+                                 f"{'NOT ' if value else ''}NULL")
+                elif operator in OPERATORS:
+                    if value is None:
+                        parts.append(f"{column} IS "
+                                     f"{'NOT ' if operator == '$ne' else ''}"
+                                     f"NULL")
+                    else:
+                        parts.append(f"{column} {OPERATORS[operator]} "
+                                     f"{self._placeholder}")
+                        parameters.append(self.to_db(value))
+                else:
+                    raise ValueError(f"operator {operator} "
+                                     f"is not supported")
+        return " AND ".join(parts) or "1 = 1", parameters
+
+    def projection_columns(self, collection_name: Table,
+                           args: tuple) -> List[str]:
+        """Get columns of the result rows
+        "args" - additional parameters for output, the first one is
+        projection as for MongoDB
+        """
+        columns = list(collection_name.columns)
+        projection = args[0] if args and args[0] else {}
+        included = [field for field, flag in projection.items() if flag]
+        if included:
+            prefix = ["_id"] if projection.get("_id", True) else []
+            return prefix + [column for column in columns
+                             if column in included and column != "_id"]
+        return [column for column in columns if projection.get(column, True)]
+
+    def select_query(self, collection_name: Table, search_filter: dict,
+                     columns: List[str] = None, limit: int = 0,
+                     sort: List[tuple] = None) -> Tuple[str, list]:
+        """Make SELECT statement
+        Return tuple of statement and its parameters.
+        """
+        columns = columns or list(collection_name.columns)
+        where, parameters = self.make_where(
+            search_filter,
+            lambda field: f'"{self.column(collection_name, field)}"')
+        query = (f'SELECT {quoted(columns)} '
+                 f'FROM "{collection_name.name}" WHERE {where}')
+        if sort:
+            query += " ORDER BY " + ", ".join(
+                f'"{self.column(collection_name, field)}"'
+                f'{" DESC" if direction < 0 else ""}'
+                for field, direction in sort)
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return query, parameters
+
+    def single_row(self, collection_name: Table,
+                   search_filter: dict) -> Tuple[str, list]:
+        """Make condition which matches the first row found by filter
+        Return tuple of condition and its parameters.
+        """
+        query, parameters = self.select_query(collection_name, search_filter,
+                                              ["_id"], limit=1)
+        return f'"_id" IN ({query})', parameters
+
+    def insert_row(self, cursor, collection_name: Table, data: dict,
+                   on_conflict: str = "") -> Union[tuple, None]:
+        """Insert single row and return its "_id" if it was inserted"""
+        columns = [self.column(collection_name, field) for field in data]
+        placeholders = ", ".join([self._placeholder] * len(columns))
+        cursor.execute(f'INSERT INTO "{collection_name.name}" '
+                       f'({quoted(columns)}) '
+                       f'VALUES ({placeholders}) {on_conflict} '
+                       f'RETURNING "_id"',
+                       [self.to_db(value) for value in data.values()])
+        return cursor.fetchone()
+
+    def insert_rows(self, cursor, collection_name: Table,
+                    rows: List[dict], returned: str) -> set:
+        """Insert rows by multi-row statements, rows with existing
+        unique key are skipped
+        "returned" - column returned for every inserted row
+        Return set of returned column values.
+        """
+        columns = list(collection_name.columns)
+        rows_number = max(1, MAX_PARAMETERS // len(columns))
+        row_placeholders = "(" + ", ".join([self._placeholder]
+                                           * len(columns)) + ")"
+        inserted = set()
+        for start in range(0, len(rows), rows_number):
+            batch = rows[start:start + rows_number]
+            parameters = [self.to_db(row.get(column)) for row in batch
+                          for column in columns]
+            cursor.execute(
+                f'INSERT INTO "{collection_name.name}" '
+                f'({quoted(columns)}) '
+                f'VALUES {", ".join([row_placeholders] * len(batch))} '
+                f'ON CONFLICT DO NOTHING RETURNING "{returned}"', parameters)
+            inserted.update(row[0] for row in cursor.fetchall())
+        return inserted
+
+    def update_rows(self, cursor, collection_name: Table,
+                    search_filter: dict, increments: dict = None,
+                    new_values: dict = None, single: bool = True,
+                    returning: bool = False) -> Union[list, int]:
+        """Increment and set columns of rows found by filter
+        "single" - update only the first row
+        "returning" - return updated rows
+        Return list of updated rows if "returning" is set.
+        Return number of updated rows otherwise.
+        """
+        assignments = []
+        parameters = []
+        for field, amount in (increments or {}).items():
+            column = self.column(collection_name, field)
+            assignments.append(f'"{column}" = COALESCE("{column}", 0) '
+                               f'+ {self._placeholder}')
+            parameters.append(amount)
+        for field, value in (new_values or {}).items():
+            assignments.append(f'"{self.column(collection_name, field)}" '
+                               f'= {self._placeholder}')
+            parameters.append(self.to_db(value))
+        if not assignments:
+            return [] if returning else 0
+        if single:
+            where, where_parameters = self.single_row(collection_name,
+                                                      search_filter)
+        else:
+            where, where_parameters = self.make_where(
+                search_filter,
+                lambda field: f'"{self.column(collection_name, field)}"')
+        query = (f'UPDATE "{collection_name.name}" '
+                 f'SET {", ".join(assignments)} WHERE {where}')
+        if returning:
+            query += f" RETURNING {quoted(collection_name.columns)}"
+        cursor.execute(query, parameters + where_parameters)
+        return cursor.fetchall() if returning else cursor.rowcount
+
+    @staticmethod
+    def equality_fields(search_filter: dict) -> dict:
+        """Get fields of the document inserted by upsert from filter"""
+        return {field: value for field, value in search_filter.items()
+                if not field.startswith("$") and not isinstance(value, dict)}
+
+    def increment_row(self, cursor, collection_name: Table,
+                      search_filter: dict, increments: dict,
+                      new_values: dict = None,
+                      upsert: bool = True) -> Union[dict, None]:
+        """Increment and set columns of the first row found by filter,
+        row is inserted if it was not found and "upsert" is set
+        Return row after update in dict format.
+        """
+        if collection_name.columns is None:
+            def change(document):
+                for field, amount in increments.items():
+                    document[field] = document.get(field, 0) + amount
+                document.update(new_values or {})
+            return self.update_document(cursor, collection_name,
+                                        search_filter, change, upsert)
+        rows = self.update_rows(cursor, collection_name, search_filter,
+                                increments, new_values, returning=True)
+        if rows:
+            return self.make_document(collection_name.columns,
+                                      list(collection_name.columns), rows[0])
+        if not upsert:
+            return None
+        document = dict(self.equality_fields(search_filter), **increments,
+                        **(new_values or {}))
+        document.setdefault("_id", str(ObjectId()))
+        self.insert_row(cursor, collection_name, document)
+        return document
+
+    def update_document(self, cursor, collection_name: Table,
+                        search_filter: dict, change: Callable[[dict], None],
+                        upsert: bool) -> Union[dict, None]:
+        """Change json document found by "_id" under lock of the row
+        "change" - function which changes document in place
+        Return document after change in dict format.
+        """
+        document_id = self.document_id(search_filter)
+        if (self._dialect == "sqlite"
+                and not cursor.connection.in_transaction):
+            # Write lock is taken before reading the document
+            cursor.execute("BEGIN IMMEDIATE")
+        if upsert:
+            cursor.execute(f'INSERT INTO "{DOCUMENTS_TABLE}" '
+                           f'VALUES ({self._placeholder}, {self._placeholder},'
+                           f' {self._placeholder}) ON CONFLICT DO NOTHING',
+                           (collection_name.name, document_id, "{}"))
+        cursor.execute(f'SELECT "data" FROM "{DOCUMENTS_TABLE}" '
+                       f'WHERE "collection" = {self._placeholder} '
+                       f'AND "_id" = {self._placeholder}'
+                       + (" FOR UPDATE" if self._dialect == "postgresql"
+                          else ""),
+                       (collection_name.name, document_id))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        document = json.loads(row[0])
+        change(document)
+        cursor.execute(f'UPDATE "{DOCUMENTS_TABLE}" '
+                       f'SET "data" = {self._placeholder} '
+                       f'WHERE "collection" = {self._placeholder} '
+                       f'AND "_id" = {self._placeholder}',
+                       (json.dumps(document), collection_name.name,
+                        document_id))
+        return dict(document, _id=document_id)
+
+    @staticmethod
+    def document_id(search_filter: dict) -> str:
+        """Get "_id" of json document from filter
+        Raise "ValueError" for other filters.
+        """
+        if list(search_filter) != ["_id"] or isinstance(search_filter["_id"],
+                                                        dict):
+            raise ValueError("documents are found only by _id")
+        return str(search_filter["_id"])
+
+    @timed
+    def insert_one(self, collection_name: Table, data: dict) -> None:
+        """Insert row into table
+
+        "collection_name" - Table class instance
+        "data" - data to insert into table, "_id" is added if it
+        is not passed
+        Raise "DuplicateDataError" if row with the same unique key exists.
+        """
+        try:
+            with self._pool.connection() as connection:
+                self.insert_document(connection.cursor(), collection_name,
+                                     data)
+        except self._integrity_error as ex:
+            raise DuplicateDataError(str(ex))
+
+    def insert_document(self, cursor, collection_name: Table,
+                        data: dict) -> None:
+        """Insert row or json document, "_id" is added to data
+        if it is not passed"""
+        data.setdefault("_id", str(ObjectId()))
+        if collection_name.columns is None:
+            document = dict(data)
+            cursor.execute(f'INSERT INTO "{DOCUMENTS_TABLE}" VALUES '
+                           f'({self._placeholder}, {self._placeholder}, '
+                           f'{self._placeholder})',
+                           (collection_name.name, str(document.pop("_id")),
+                            json.dumps(document)))
+        else:
+            self.insert_row(cursor, collection_name, data)
+
+    @timed
+    def bulk_write(self, collection_name: Table, operations: List[Operation],
+                   ordered: bool = True) -> Dict[int, Exception]:
+        """Execute write operations in single transaction, failed
+        operation is rolled back to its savepoint
+
+        "collection_name" - Table class instance
+        "operations" - list of Operation class instances
+        "ordered" - stop at the first error, execute all operations
+        otherwise
+        Return errors of failed operations by index of the operation,
+        "DuplicateDataError" if row with the same unique key exists,
+        "NotExecutedError" for operations after the first error
+        of ordered bulk write.
+        """
+        errors = {}
+        if not operations:
+            return errors
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            for index, operation in enumerate(operations):
+                if ordered and errors:
+                    errors[index] = NotExecutedError(
+                        f"operation {min(errors)} failed")
+                    continue
+                cursor.execute("SAVEPOINT operation")
+                try:
+                    self.write_operation(cursor, collection_name, operation)
+                except Exception as ex:
+                    cursor.execute("ROLLBACK TO SAVEPOINT operation")
+                    errors[index] = (DuplicateDataError(str(ex))
+                                     if isinstance(ex, self._integrity_error)
+                                     else ex)
+                cursor.execute("RELEASE SAVEPOINT operation")
+        return errors
+
+    def write_operation(self, cursor, collection_name: Table,
+                        operation: Operation) -> None:
+        """Execute single write operation of bulk write"""
+        if operation.kind == "insert":
+            self.insert_document(cursor, collection_name, operation.data)
+        elif operation.kind == "update":
+            self.increment_row(cursor, collection_name,
+                               operation.search_filter, {}, operation.data,
+                               operation.upsert)
+        elif operation.kind == "increment":
+            self.increment_row(cursor, collection_name,
+                               operation.search_filter, operation.data,
+                               upsert=operation.upsert)
+        else:
+            self.delete_row(cursor, collection_name, operation.search_filter)
+
+    @timed
+    def find_one_and_upsert(self, collection_name: Table,
+                            search_filter: dict, data: dict,
+                            increments: dict = None) -> tuple:
+        """Get single row from table by filter or insert it
+        if it was not found in single transaction, table must have
+        unique index on the fields of the filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find row in the table
+        "data" - data to insert into table
+        "increments" - amounts to add to the columns of found or inserted
+        row by field name
+        Return tuple of row in dict format before increment and flag
+        "row was inserted", row is always found or inserted.
+        """
+        document_id = str(ObjectId())
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            while True:
+                if self.insert_row(cursor, collection_name,
+                                   dict(data, _id=document_id,
+                                        **(increments or {})),
+                                   "ON CONFLICT DO NOTHING"):
+                    return dict(data, _id=document_id), True
+                if increments:
+                    document = self.increment_row(cursor, collection_name,
+                                                  search_filter, increments,
+                                                  upsert=False)
+                else:
+                    query, parameters = self.select_query(
+                        collection_name, search_filter, limit=1)
+                    cursor.execute(query, parameters)
+                    row = cursor.fetchone()
+                    document = row and self.make_document(
+                        collection_name.columns,
+                        list(collection_name.columns), row)
+                # Conflicting row is inserted again if it was deleted
+                # by concurrent request after the conflict
+                if document is not None:
+                    for field, amount in (increments or {}).items():
+                        document[field] = document.get(field, 0) - amount
+                    return document, False
+
+    @timed
+    def insert_many(self, collection_name: Table,
+                    documents: List[dict]) -> Dict[int, Exception]:
+        """Insert rows into table by multi-row statements in single
+        transaction, rows with existing unique key are skipped
+
+        "collection_name" - Table class instance
+        "documents" - data to insert into table, "_id" is added if it
+        is not passed
+        Return errors of not inserted rows by index of the row,
+        "DuplicateDataError" if row with the same unique key exists.
+        """
+        if not documents:
+            return {}
+        for document in documents:
+            document.setdefault("_id", str(ObjectId()))
+        try:
+            with self._pool.connection() as connection:
+                inserted = self.insert_rows(connection.cursor(),
+                                            collection_name, documents,
+                                            "_id")
+        except Exception as ex:
+            return {index: Exception(str(ex))
+                    for index in range(len(documents))}
+        errors = {}
+        for index, document in enumerate(documents):
+            document_id = self.to_db(document["_id"])
+            if document_id in inserted:
+                # The next row with the same "_id" is duplicate
+                inserted.discard(document_id)
+            else:
+                errors[index] = DuplicateDataError(
+                    f"duplicate key _id: {document_id}")
+        return errors
+
+    @timed
+    def upsert_many(self, collection_name: Table, key_field: str,
+                    documents: List[dict],
+                    increments: List[dict] = None) -> List[int]:
+        """Insert rows which are not in table yet by multi-row statements
+        in single transaction, existing rows are not changed except
+        incremented columns, table must have unique index on "key_field"
+
+        "collection_name" - Table class instance
+        "key_field" - field to find existing row in the table
+        "documents" - data to insert into table
+        "increments" - amounts to add to the columns of every found
+        or inserted row, in the same order as documents
+        Return indexes of inserted rows.
+        """
+        if not documents:
+            return []
+        increments = increments or [None] * len(documents)
+        rows = [dict(document, _id=str(ObjectId()), **(amounts or {}))
+                for document, amounts in zip(documents, increments)]
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            inserted_keys = self.insert_rows(cursor, collection_name, rows,
+                                             key_field)
+            inserted = []
+            for index, (document, amounts) in enumerate(zip(documents,
+                                                            increments)):
+                if document[key_field] in inserted_keys:
+                    inserted_keys.discard(document[key_field])
+                    inserted.append(index)
+                elif amounts:
+                    self.update_rows(cursor, collection_name,
+                                     {key_field: document[key_field]},
+                                     amounts)
+        return inserted
+
+    @timed
+    def delete_one(self, collection_name: Table,
+                   search_filter: dict) -> None:
+        """Delete row from table by filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find row in the table
+        """
+        with self._pool.connection() as connection:
+            self.delete_row(connection.cursor(), collection_name,
+                            search_filter)
+
+    def delete_row(self, cursor, collection_name: Table,
+                   search_filter: dict) -> None:
+        """Delete the first row or json document found by filter"""
+        if collection_name.columns is None:
+            cursor.execute(f'DELETE FROM "{DOCUMENTS_TABLE}" '
+                           f'WHERE "collection" = {self._placeholder} '
+                           f'AND "_id" = {self._placeholder}',
+                           (collection_name.name,
+                            self.document_id(search_filter)))
+            return
+        where, parameters = self.single_row(collection_name, search_filter)
+        cursor.execute(f'DELETE FROM "{collection_name.name}" '
+                       f'WHERE {where}', parameters)
+
+    @timed
+    def delete_many(self, collection_name: Table,
+                    search_filter: dict) -> int:
+        """Delete all rows from table by filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find rows in the table
+        Return number of deleted rows.
+        """
+        where, parameters = self.make_where(
+            search_filter,
+            lambda field: f'"{self.column(collection_name, field)}"')
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f'DELETE FROM "{collection_name.name}" '
+                           f'WHERE {where}', parameters)
+            return cursor.rowcount
+
+    @timed
+    def find_one_and_delete(self, collection_name: Table,
+                            search_filter: dict) -> Union[dict, None]:
+        """Delete single row from table by filter in single statement
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find row in the table
+        Return deleted row in dict format.
+        Return "None" if row was not found.
+        """
+        columns = list(collection_name.columns)
+        where, parameters = self.single_row(collection_name, search_filter)
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f'DELETE FROM "{collection_name.name}" '
+                           f'WHERE {where} RETURNING {quoted(columns)}',
+                           parameters)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return self.make_document(collection_name.columns, columns, row)
+
+    @timed
+    def update_one(self, collection_name: Table, search_filter: dict,
+                   new_values: dict, upsert: bool = False) -> None:
+        """Update row columns in table by filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find row in the table
+        "new_values" - data to update in row
+        "upsert" - insert row if it was not found
+        """
+        with self._pool.connection() as connection:
+            self.increment_row(connection.cursor(), collection_name,
+                               search_filter, {}, new_values, upsert)
+
+    @timed
+    def update_many(self, collection_name: Table, search_filter: dict,
+                    new_values: dict) -> None:
+        """Update columns of all rows in table by filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find rows in the table
+        "new_values" - data to update in rows
+        """
+        with self._pool.connection() as connection:
+            self.update_rows(connection.cursor(), collection_name,
+                             search_filter, new_values=new_values,
+                             single=False)
+
+    @timed
+    def update_each(self, collection_name: Table,
+                    updates: List[tuple]) -> None:
+        """Update columns of many rows in single transaction
+
+        "collection_name" - Table class instance
+        "updates" - list of (filter, new values) pairs
+        """
+        if not updates:
+            return
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            for search_filter, new_values in updates:
+                self.update_rows(cursor, collection_name, search_filter,
+                                 new_values=new_values)
+
+    @timed
+    def increment_one(self, collection_name: Table, search_filter: dict,
+                      increments: dict, new_values: dict = None,
+                      upsert: bool = True) -> None:
+        """Increment row columns in table by filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find row in the table
+        "increments" - amounts to add to the columns by field name
+        "new_values" - data to update in row
+        "upsert" - insert row if it was not found
+        """
+        with self._pool.connection() as connection:
+            self.increment_row(connection.cursor(), collection_name,
+                               search_filter, increments, new_values, upsert)
+
+    @timed
+    def find_one_and_increment(self, collection_name: Table,
+                               search_filter: dict,
+                               increments: dict) -> Union[dict, None]:
+        """Increment columns of single row in table by filter
+        in single statement, row is not inserted if it was not found
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find row in the table
+        "increments" - amounts to add to the columns by field name
+        Return row after increment in dict format.
+        Return "None" if row was not found.
+        """
+        with self._pool.connection() as connection:
+            return self.increment_row(connection.cursor(), collection_name,
+                                      search_filter, increments,
+                                      upsert=False)
+
+    @timed
+    def increment_each(self, collection_name: Table,
+                       increments: List[tuple], upsert: bool = True) -> None:
+        """Increment columns of many rows in single transaction
+
+        "collection_name" - Table class instance
+        "increments" - list of (filter, increments, new values)
+        "upsert" - insert rows which were not found
+        """
+        if not increments:
+            return
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            for search_filter, amounts, new_values in increments:
+                self.increment_row(cursor, collection_name, search_filter,
+                                   amounts, new_values, upsert)
+
+    @timed
+    def find_all(self, collection_name: Table) -> List[dict]:
+        """Get all rows from table
+
+        "collection_name" - Table class instance
+        Return list of rows from table in dict format.
+        """
+        return self.find_many(collection_name, {})
+
+    @timed
+    def find_all_joined(self, collection_name: Table,
+                        foreign_collection: Table,
+                        local_field: str, conditions: List[tuple] = None,
+                        limit: int = 0, sort: List[tuple] = None,
+                        fields: List[str] = None,
+                        foreign_fields: Iterable[str] = (),
+                        hidden_fields: Iterable[str] = ()) -> Iterator[dict]:
+        """Get rows from table joined with rows of other table
+        by SELECT with JOIN for every page of rows
+
+        "collection_name" - Table class instance
+        "foreign_collection" - Table class instance with rows to join
+        "local_field" - column with "_id" of the row to join
+        "conditions" - list of (field, operator, value) to find rows,
+        operator is one of "eq", "gt", "gte", "lt", "lte"
+        "limit" - maximum number of rows, 0 - without limit
+        "sort" - list of (field, direction) pairs, rows are sorted
+        by "_id" after them
+        "fields" - fields of the result rows, "_id" is always
+        included, all fields if it is not passed
+        "foreign_fields" - fields of the joined rows, the other fields
+        are taken from the table if it has both
+        "hidden_fields" - fields of the joined rows which are never
+        included in the result rows
+        Return iterator over rows in dict format, where "local_field"
+        is replaced by fields of the joined row (except "_id"). Rows
+        without joined row are skipped. Query is run before return.
+        """
+        local_types = collection_name.columns
+        foreign_types = foreign_collection.columns
+        foreign_fields = set(foreign_fields) & set(foreign_types)
+
+        def resolve(field: str) -> str:
+            if field in foreign_fields or field not in local_types:
+                return f'f."{self.column(foreign_collection, field)}"'
+            return f'l."{field}"'
+
+        if fields is None:
+            columns = ([field for field in local_types if field != local_field]
+                       + [field for field in foreign_types
+                          if field != "_id" and field not in hidden_fields])
+        else:
+            columns = ["_id"] + [field for field in fields
+                                 if field not in ("_id", local_field)]
+        local_column = self.column(collection_name, local_field)
+        where, parameters = self.make_where(
+            self.make_filter(conditions or []), resolve)
+        sort = [(field, direction) for field, direction in sort or []
+                if field != "_id"] + [("_id", 1)]
+        # Sort key of the row is selected after its columns
+        select = ", ".join(resolve(field) for field
+                           in columns + [field for field, _ in sort])
+        order = ", ".join(f'{resolve(field)}'
+                          f'{" DESC" if direction < 0 else ""}'
+                          for field, direction in sort)
+
+        def make_query(key: Union[list, None], size: int) -> tuple:
+            page_where, page_parameters = where, list(parameters)
+            if key is not None:
+                after, after_parameters = self.keyset_where(sort, key,
+                                                            resolve)
+                page_where = f"({where}) AND ({after})"
+                page_parameters += after_parameters
+            return (f'SELECT {select} '
+                    f'FROM "{collection_name.name}" AS l '
+                    f'JOIN "{foreign_collection.name}" AS f '
+                    f'ON f."_id" = l."{local_column}" '
+                    f'WHERE {page_where} ORDER BY {order} '
+                    f'LIMIT {int(size)}', page_parameters)
+
+        types = dict(foreign_types, **local_types)
+        rows = self.iterate_rows(make_query, len(sort), types, columns,
+                                 limit)
+        # The first row is read here, so errors of the query are raised
+        # by this call
+        first_row = next(rows, None)
+        return itertools.chain([] if first_row is None else [first_row],
+                               rows)
+
+    def keyset_where(self, sort: List[tuple], key: list,
+                     resolve: Callable[[str], str]) -> Tuple[str, list]:
+        """Make condition of rows which follow the row with sort key
+        in the sort order, sort fields must not be NULL
+        "sort" - list of (field, direction) pairs, the last field
+        is unique
+        "key" - values of the sort fields of the row
+        "resolve" - function which returns column expression of field
+        Return tuple of condition and its parameters.
+        """
+        parts = []
+        parameters = []
+        for index, (field, direction) in enumerate(sort):
+            terms = [f"{resolve(equal_field)} = {self._placeholder}"
+                     for equal_field, _ in sort[:index]]
+            terms.append(f"{resolve(field)} {'>' if direction > 0 else '<'} "
+                         f"{self._placeholder}")
+            parts.append(f"({' AND '.join(terms)})")
+            parameters += key[:index + 1]
+        return " OR ".join(parts), parameters
+
+    def iterate_rows(self, make_query: Callable[[Union[list, None], int],
+                                                tuple],
+                     key_length: int, types: Dict[str, type],
+                     columns: List[str], limit: int = 0) -> Iterator[dict]:
+        """Run query page by page and yield result rows in dict format,
+        connection is taken from the pool for every page only, so slow
+        reader of the rows does not keep it
+        "make_query" - function which returns query and its parameters
+        by sort key of the last row of the previous page ("None"
+        for the first page) and number of rows of the page
+        "key_length" - number of the last columns of the row with its
+        sort key
+        "limit" - maximum number of rows, 0 - all rows
+        """
+        key = None
+        remaining = limit
+        while True:
+            size = min(FETCH_SIZE, remaining) if limit else FETCH_SIZE
+            query, parameters = make_query(key, size)
+            with self._pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(query, parameters)
+                rows = cursor.fetchall()
+            for row in rows:
+                yield self.make_document(types, columns, row)
+            remaining -= len(rows)
+            if len(rows) < size or (limit and not remaining):
+                return
+            key = list(rows[-1][-key_length:])
+
+    @timed
+    def find_many(self, collection_name: Table, search_filter: dict,
+                  *args, limit: int = 0, sort: list = None) -> List[dict]:
+        """Get rows from table by filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find rows in the table
+        "*args" - projection of the rows as for MongoDB
+        "limit" - maximum number of rows, 0 - all rows
+        "sort" - list of (field, direction) pairs, rows are sorted
+        by "_id" if only limit is passed
+        Return list of rows from table in dict format.
+        """
+        columns = self.projection_columns(collection_name, args)
+        if not sort and limit:
+            sort = [("_id", 1)]
+        query, parameters = self.select_query(collection_name, search_filter,
+                                              columns, limit, sort)
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query, parameters)
+            return [self.make_document(collection_name.columns, columns, row)
+                    for row in cursor.fetchall()]
+
+    @timed
+    def find_one(self, collection_name: Table, search_filter: dict,
+                 *args) -> Union[dict, str, None]:
+        """Get single row from table by filter
+
+        "collection_name" - Table class instance
+        "search_filter" - filter to find row in the table
+        "*args" - projection of the row as for MongoDB
+        Return row from table by filter in dict format if it was found.
+        Return "None" if row was not found.
+        Return str "No connection" if there is no connection
+        to database server.
+        """
+        try:
+            if collection_name.columns is None:
+                document_id = self.document_id(search_filter)
+                with self._pool.connection() as connection:
+                    cursor = connection.cursor()
+                    cursor.execute(f'SELECT "data" FROM "{DOCUMENTS_TABLE}" '
+                                   f'WHERE "collection" = {self._placeholder} '
+                                   f'AND "_id" = {self._placeholder}',
+                                   (collection_name.name, document_id))
+                    row = cursor.fetchone()
+                return (dict(json.loads(row[0]), _id=document_id)
+                        if row else None)
+            documents = self.find_many(collection_name, search_filter, *args,
+                                       limit=1)
+            return documents[0] if documents else None
+        except Exception:
+            return "No connection"
@@ -0,0 +1,134 @@
+"""Buffer of write operations which are written down in batches when
+buffer is full or the oldest operation waits too long"""
+import time
+import threading
+
+from concurrent.futures import Future
+from functools import partial
+from typing import Callable, Dict, List
+
+from db_connectors.connector import Connector, Operation
+
+
+class BufferedWriter:
+    """Operations accumulated and written down by "write_batch" function
+    in the background thread.
+    Every added operation gets a future which is resolved after flush:
+    with "None" if operation succeeded or with its exception."""
+
+    def __init__(self, write_batch: Callable[[list], Dict[int, Exception]],
+                 max_size: int = 1000, max_delay: float = 1.0):
+        """"write_batch" - function which writes down list of operations
+        and returns errors of failed operations by position
+        "max_size" - number of operations which causes flush, it is
+        the maximum number of operations written at once
+        "max_delay" - seconds the oldest operation waits for flush
+        """
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._write_batch = write_batch
+        # Operations with their futures and time they were added
+        self._pending = []
+        self._closed = False
+        self._condition = threading.Condition()
+        # Only one flush at a time, so operations are written in order
+        self._flush_lock = threading.Lock()
+        self._timer = threading.Thread(target=self._flush_in_background,
+                                       daemon=True)
+        self._timer.start()
+
+    @classmethod
+    def for_collection(cls, connector: Connector, collection_name,
+                       max_size: int = 1000, max_delay: float = 1.0,
+                       ordered: bool = False) -> "BufferedWriter":
+        """Make writer of Operation class instances of single collection
+        executed by "bulk_write" of the connector
+        "connector" - Connector class instance
+        "collection_name" - collection passed to "bulk_write"
+        "max_size" - number of operations which causes flush
+        "max_delay" - seconds the oldest operation waits for flush
+        "ordered" - execute operations of flush one after another
+        and stop at the first error
+        """
+        return cls(partial(connector.bulk_write, collection_name,
+                           ordered=ordered),
+                   max_size, max_delay)
+
+    def add(self, operation) -> Future:
+        """Add operation to buffer without waiting for flush
+        Return future of the operation result.
+        Raise "RuntimeError" if writer is closed.
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            self._pending.append((operation, future, time.monotonic()))
+            if len(self._pending) in (1, self.max_size):
+                self._condition.notify()
+        return future
+
+    def add_many(self, operations: List[Operation]) -> List[Future]:
+        """Add operations to buffer
+        Return futures of the operation results in the same order.
+        """
+        return [self.add(operation) for operation in operations]
+
+    def flush(self) -> int:
+        """Write down the oldest buffered operations, not more than
+        "max_size" of them
+        Return number of written operations.
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch = self._pending[:self.max_size]
+                del self._pending[:self.max_size]
+            if not batch:
+                return 0
+            try:
+                errors = self._write_batch([operation
+                                            for operation, _, _ in batch])
+            except Exception as ex:
+                errors = dict.fromkeys(range(len(batch)), ex)
+            for index, (_, future, _) in enumerate(batch):
+                if index in errors:
+                    future.set_exception(errors[index])
+                else:
+                    future.set_result(None)
+            return len(batch)
+
+    def __len__(self) -> int:
+        """Return number of buffered operations"""
+        with self._condition:
+            return len(self._pending)
+
+    def close(self) -> None:
+        """Stop accepting operations and wait until all buffered
+        operations are written down"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._timer.join()
+        while self.flush():
+            pass
+
+    def _flush_delay(self):
+        """Return seconds until the next flush, "0" if buffer must be
+        flushed now, "None" if buffer is empty"""
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.max_size:
+            return 0
+        return max(self._pending[0][2] + self.max_delay - time.monotonic(),
+                   0)
+
+    def _flush_in_background(self) -> None:
+        """Flush buffer when it is full or the oldest operation waits
+        "max_delay" seconds, it runs in the background thread"""
+        while True:
+            with self._condition:
+                while not self._closed and self._flush_delay() != 0:
+                    self._condition.wait(self._flush_delay())
+                if self._closed:
+                    return
+            self.flush()
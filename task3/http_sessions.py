@@ -0,0 +1,86 @@
+"""HTTP sessions which keep connections open between requests
+and repeat failed requests with exponential backoff"""
+import os
+
+from typing import Union
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default number of connections kept open to every host
+POOL_SIZE = 10
+# Default number of repeats of the failed request
+RETRIES = 3
+# Default delay before the first repeat in seconds, it is doubled
+# for every next repeat
+BACKOFF = 0.5
+MAX_BACKOFF = 60
+# Responses with these statuses are repeated, "Retry-After" header
+# of the response is respected
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST requests are repeated too: posts are written down with unique id,
+# so the post written by the failed attempt is rejected by the repeated
+# request as existing one, callers check it with "is_retried"
+RETRY_METHODS = frozenset(["GET", "HEAD", "POST", "PUT", "DELETE"])
+
+# Session of the process by process id, forked process makes its own
+_sessions = {}
+
+
+def make_session(pool_size: int = POOL_SIZE, retries: int = RETRIES,
+                 backoff: float = BACKOFF,
+                 headers: dict = None) -> requests.Session:
+    """Make session with pool of keep-alive connections
+    "pool_size" - number of connections kept open to every host
+    "retries" - number of repeats of the failed request
+    "backoff" - delay before the first repeat in seconds
+    "headers" - headers of every request
+    Return "requests.Session" class instance.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff,
+                  status_forcelist=RETRY_STATUSES,
+                  allowed_methods=RETRY_METHODS,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def is_retried(response: requests.Response) -> bool:
+    """Check if the response is the answer to the repeated request
+    "response" - response of the session made by "make_session"
+    Return "True" if previous attempts of the request failed.
+    """
+    retries = getattr(response.raw, "retries", None)
+    return bool(retries is not None and retries.history)
+
+
+def get_session(headers: dict = None) -> requests.Session:
+    """Get session of the current process with default settings,
+    it is made on the first call in every process
+    "headers" - headers of every request of the new session
+    """
+    pid = os.getpid()
+    if pid not in _sessions:
+        _sessions[pid] = make_session(headers=headers)
+    return _sessions[pid]
+
+
+def retry_delay(attempt: int, backoff: float,
+                retry_after: Union[str, None] = None) -> float:
+    """Get delay before repeat of the failed request
+    "attempt" - number of the failed attempt starting from 0
+    "backoff" - delay before the first repeat in seconds
+    "retry_after" - value of "Retry-After" header of the response
+    Return delay in seconds.
+    """
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_BACKOFF)
+    return min(backoff * 2 ** attempt, MAX_BACKOFF)
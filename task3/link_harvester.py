@@ -0,0 +1,114 @@
+"""Incremental harvesting of post links from the listing page opened
+in the browser: script in the page marks links already taken, so every
+round returns only links added by the last scroll and page HTML is not
+transferred and parsed again."""
+import logging
+
+from typing import List
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+# Class of links to posts on the listing page
+POST_LINK_CLASS = "SQnoC3ObvgnGjWt90zD9Z _2INHSNB8V5eaWp4P0rY_mE"
+# Card of the post on the listing and its score and comments
+POST_CARD_SELECTOR = '[data-testid="post-container"]'
+POST_LISTING_SELECTORS = ("._1rZYMD_4xY3gRcSS3p8ODO",
+                          '[data-click-id="comments"]')
+# Attribute set by the script on links already taken
+HARVESTED_ATTRIBUTE = "data-harvested"
+
+# Mark new links and return their absolute urls in the page order
+# with text of score and comments of their posts
+HARVEST_SCRIPT = """
+const links = document.querySelectorAll(arguments[0]);
+const items = [];
+for (const link of links) {
+    link.setAttribute(arguments[1], "");
+    const card = link.closest(arguments[2]);
+    const texts = arguments[3].map(selector => {
+        const element = card && card.querySelector(selector);
+        return element ? element.textContent.trim() : "";
+    });
+    items.push([link.href, texts.every(text => text) ? texts.join("|") : ""]);
+}
+return items;
+"""
+COUNT_SCRIPT = "return document.querySelectorAll(arguments[0]).length;"
+SCROLL_SCRIPT = "window.scrollTo(0, document.body.scrollHeight);"
+
+
+class LinkHarvester:
+    """Links of the listing page are taken as the page grows:
+
+        harvester = LinkHarvester(driver)
+        posts_urls = harvester.get_new_links(100)
+
+    Every url is returned once, even if the page renders its link
+    again without the mark. Text of score and comments of the post
+    on the listing is kept in "listing" by url.
+    """
+
+    def __init__(self, driver: WebDriver, link_class: str = POST_LINK_CLASS,
+                 timeout: float = 15, poll_frequency: float = 0.1):
+        """"driver" - browser with the listing page
+        "link_class" - classes of links to posts separated by spaces
+        "timeout" - seconds to wait for new links after scroll
+        "poll_frequency" - seconds between checks of new links
+        """
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.selector = (f"a.{'.'.join(link_class.split())}"
+                         f":not([{HARVESTED_ATTRIBUTE}])")
+        # Frontier of all urls returned by the harvester
+        self.seen = set()
+        # Text of score and comments by url, it is empty if they are
+        # not found
+        self.listing = {}
+
+    def count_new_links(self) -> int:
+        """Return number of links which are not taken yet"""
+        return self.driver.execute_script(COUNT_SCRIPT, self.selector)
+
+    def harvest(self) -> List[str]:
+        """Take links which are not taken yet
+        Return urls which were not returned before in the page order.
+        """
+        new_urls = []
+        for url, listing_text in self.driver.execute_script(
+                HARVEST_SCRIPT, self.selector, HARVESTED_ATTRIBUTE,
+                POST_CARD_SELECTOR, list(POST_LISTING_SELECTORS)):
+            self.listing[url] = listing_text
+            if url not in self.seen:
+                self.seen.add(url)
+                new_urls.append(url)
+        return new_urls
+
+    def scroll(self) -> bool:
+        """Scroll to the end of the page and wait for new links
+        Return "False" if no links are added for "timeout" seconds.
+        """
+        self.driver.execute_script(SCROLL_SCRIPT)
+        try:
+            WebDriverWait(self.driver, self.timeout,
+                          self.poll_frequency).until(
+                lambda driver: self.count_new_links() > 0)
+            return True
+        except TimeoutException:
+            return False
+
+    def get_new_links(self, number: int) -> List[str]:
+        """Take links on the page and scroll until "number" new urls
+        are found or the page stops growing
+        Return new urls, there may be more or less than "number".
+        """
+        new_urls = self.harvest()
+        while len(new_urls) < number:
+            if not self.scroll():
+                logging.info(f"no new links on the page in {self.timeout} s, "
+                             f"{len(self.seen)} links are found")
+                break
+            new_urls.extend(self.harvest())
+        return new_urls
@@ -6,26 +6,34 @@ Write down data into data base through RESTful API
 import sys
 import os.path
 import glob
-import uuid
 import logging
-import requests
-import bs4
 import json
-import time
+import asyncio
 import datetime
-import multiprocessing
 import argparse
+import functools
+
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as ec
 
+import http_sessions
+
+from async_scraper import AsyncScraper
+from author_cache import AuthorCache, CACHE_FILE, CACHE_TTL, CACHE_SIZE
+from crawl_state import CrawlState, STATE_FILE, make_fingerprint
+from data_description import PostDataDB
 from db_connectors.mongo import MongodbService
+from link_harvester import LinkHarvester
+from pipeline import ScrapePipeline
+from reddit_pages import USER_AGENT
 
 logging.basicConfig(handlers=[logging.FileHandler(filename='app.log',
                                                   mode='w', encoding='utf-8')],
@@ -40,14 +48,53 @@ parser.add_argument('--posts_number', type=int,
 parser.add_argument('--file_name', type=str,
                     default=datetime.datetime.now().strftime('%Y%m%d%H%M'),
                     help='Name of the output file')
-args = parser.parse_args()
+parser.add_argument('--concurrency', type=int,
+                    default=20,
+                    help='Maximum number of simultaneous requests to site '
+                         'and number of posts scraped at the same time')
+parser.add_argument('--batch_size', type=int,
+                    default=100,
+                    help='Maximum number of posts written down by one '
+                         'request to RESTful server')
+parser.add_argument('--api_pool_size', type=int,
+                    default=http_sessions.POOL_SIZE,
+                    help='Number of connections kept open to RESTful server '
+                         'and number of changed posts updated at the same '
+                         'time')
+parser.add_argument('--retries', type=int,
+                    default=http_sessions.RETRIES,
+                    help='Number of repeats of failed request to site '
+                         'or RESTful server')
+parser.add_argument('--backoff', type=float,
+                    default=http_sessions.BACKOFF,
+                    help='Seconds before the first repeat of failed '
+                         'request, delay is doubled for every next repeat')
+parser.add_argument('--crawl_state', type=str,
+                    default=STATE_FILE,
+                    help='File of written posts kept between runs')
+crawl_mode = parser.add_mutually_exclusive_group()
+crawl_mode.add_argument('--resume', action='store_true',
+                        help='Continue the previous crawl, written posts '
+                             'are skipped and counted')
+crawl_mode.add_argument('--refresh', action='store_true',
+                        help='Update data base: new posts are written, '
+                             'written posts are requested again only '
+                             'if their score or number of comments '
+                             'on the listing are changed')
+parser.add_argument('--author_cache', type=str,
+                    default=CACHE_FILE,
+                    help='File of cache of user data shared by processes '
+                         'and runs')
+parser.add_argument('--author_ttl', type=float,
+                    default=CACHE_TTL,
+                    help='Seconds to keep user data in cache, 0 disables '
+                         'cache')
+parser.add_argument('--author_cache_size', type=int,
+                    default=CACHE_SIZE,
+                    help='Maximum number of users in cache')
 
-COUNT_POSTS = args.posts_number
 MAX_WAIT = 15
-GOOD_SCROLL_COUNT = 20
-USER_AGENT = ("Mozilla/5.0 (Windows NT 6.3; Win64; x64)"
-              "AppleWebKit/537.36 (KHTML, like Gecko)"
-              "Chrome/92.0.4515.159 Safari/537.36")
+API_URL = "http://localhost:8087"
 
 
 def search_and_del_file_in_current_directory(search_mask: str):
@@ -58,65 +105,124 @@ def search_and_del_file_in_current_directory(search_mask: str):
             os.remove(file_name)
 
 
-def get_data_from_post_and_user_page(url: str):
-    """Get data from page and return file with data"""
-    post_url = url
-    unique_id = uuid.uuid1().hex
-
-    soup = make_request_beautifulsoup(url)
-
-    try:
-        data_from_json = get_data_from_response(soup)
-        user_id = list(data_from_json["posts"]["models"].keys())[0]
-        user_name = str(data_from_json["posts"]["models"]
-                        [f'{user_id}']['author'])
-        number_of_votes = str(data_from_json["posts"]["models"]
-                              [f'{user_id}']['score'])
-        number_of_comments = str(data_from_json["posts"]["models"]
-                                 [f'{user_id}']['numComments'])
-
-        # post creation date from json comes as 1634227843000
-        unix_post_date = str(data_from_json["posts"]["models"]
-                             [f'{user_id}']['created'])[:-3]
-        post_date = convert_unix_time(int(unix_post_date))
-
-        user_link = "https://www.reddit.com/user/" + f"{user_name}"
-
-        post_category = soup.find("span",
-                                  class_="_19bCWnxeTjqzBElWZfIlJb"
-                                  ).text.split("/")[1]
-
-        soup = make_request_beautifulsoup(user_link)
-
-        data_from_json = get_data_from_response(soup)
-        user_id = list(data_from_json["profiles"]["about"].keys())[0]
-        user_karma = str(data_from_json["profiles"]["about"]
-                         [f'{user_id}']['karma']['total'])
-        post_karma = str(data_from_json["profiles"]["about"]
-                         [f'{user_id}']['karma']['fromPosts'])
-        comment_karma = str(data_from_json["profiles"]["about"]
-                            [f'{user_id}']['karma']['fromComments'])
-        unix_user_cake_day = str(data_from_json["subreddits"]["about"]
-                                 [f'{user_id}']['created'])
-        user_cake_day = convert_unix_time(int(unix_user_cake_day))
-
-        all_data = {"_id": unique_id,
-                    "post_url": post_url,
-                    "user_name": user_name,
-                    "user_karma": user_karma,
-                    "user_cake_day": user_cake_day,
-                    "post_karma": post_karma,
-                    "comment_karma": comment_karma,
-                    "post_date": post_date,
-                    "number_of_comments": number_of_comments,
-                    "number_of_votes": number_of_votes,
-                    "post_category": post_category
-                    }
-        return all_data
-    except Exception as ex:
-        logging.error(ex)
-        all_data = []
-        return all_data
+def post_records(session: requests.Session, records: List[dict],
+                 api_url: str = API_URL) -> List[dict]:
+    """Write down records through RESTful API in one request
+    "session" - session with connections to RESTful server
+    "records" - all data of posts
+    "api_url" - address of RESTful server
+    Return status of every record in the same order, record rejected
+    as existing one by the repeated request is written.
+    Raise "requests.HTTPError" if request is not accepted.
+    """
+    json_data = json.dumps(records, ensure_ascii=False).encode('utf8')
+    response = session.post(api_url + "/posts/bulk", data=json_data,
+                            timeout=MAX_WAIT)
+    response.raise_for_status()
+    statuses = response.json()
+    if http_sessions.is_retried(response):
+        # Records have unique ids of this client, so they were written
+        # down by the failed attempt
+        for status in statuses:
+            if status.get("status") == 409:
+                status["status"] = 201
+                status.pop("error", None)
+    return statuses
+
+
+def put_record(session: requests.Session, post_id: str, record: dict,
+               api_url: str = API_URL) -> int:
+    """Write down new data of the written post through RESTful API
+    "post_id" - unique id of the post on RESTful server
+    "record" - all data of the post
+    Return status of the response.
+    """
+    post_data = {attribute: record[attribute]
+                 for attribute in PostDataDB.__slots__ if attribute != "_id"}
+    json_data = json.dumps(post_data, ensure_ascii=False).encode('utf8')
+    response = session.put(f"{api_url}/posts/{post_id}", data=json_data,
+                           timeout=MAX_WAIT)
+    return response.status_code
+
+
+def put_records(session: requests.Session, updates: List[tuple],
+                api_url: str = API_URL,
+                workers: int = http_sessions.POOL_SIZE) -> List[int]:
+    """Write down new data of written posts through RESTful API,
+    requests are sent at the same time through connections of the session
+    "updates" - list of tuples of unique id and all data of the post
+    "workers" - maximum number of simultaneous requests, it should not
+    be more than the number of connections of the session
+    Return status of every response in the same order.
+    """
+    if len(updates) < 2 or workers < 2:
+        return [put_record(session, post_id, record, api_url)
+                for post_id, record in updates]
+    with ThreadPoolExecutor(min(workers, len(updates))) as executor:
+        return list(executor.map(
+            lambda update: put_record(session, *update, api_url), updates))
+
+
+def write_records(session: requests.Session, crawl_state: CrawlState,
+                  listing: dict, records: List[dict],
+                  api_url: str = API_URL,
+                  workers: int = http_sessions.POOL_SIZE) -> List[dict]:
+    """Write down new posts in one request and update posts written
+    by previous runs by simultaneous requests, written posts are saved
+    in the crawl state
+    "listing" - text of score and comments on the listing by post url
+    "workers" - maximum number of simultaneous updates
+    Return status of every record in the same order.
+    Raise "requests.HTTPError" if request is not accepted.
+    """
+    statuses = {}
+    new_records = []
+    updates = []
+    for index, record in enumerate(records):
+        saved = crawl_state.get(record["post_url"])
+        if saved is None:
+            new_records.append((index, record))
+        else:
+            updates.append((index, saved[0], record))
+    update_statuses = put_records(session, [(post_id, record)
+                                            for _, post_id, record
+                                            in updates],
+                                  api_url, workers)
+    for (index, post_id, record), status in zip(updates, update_statuses):
+        if status != 404:
+            statuses[index] = {"_id": post_id, "status": status}
+        else:
+            # Post is deleted from data base, it is written again
+            # with the same unique id
+            new_records.append((index, dict(record, _id=post_id)))
+    if new_records:
+        new_statuses = post_records(session, [record for _, record
+                                              in new_records], api_url)
+        for (index, _), status in zip(new_records, new_statuses):
+            statuses[index] = status
+    for index, record in enumerate(records):
+        if statuses[index].get("status") in (200, 201):
+            crawl_state.set(record["post_url"], statuses[index]["_id"],
+                            make_fingerprint(listing.get(record["post_url"],
+                                                         "")))
+    return [statuses[index] for index in range(len(records))]
+
+
+def is_post_written(crawl_state: CrawlState, listing: dict,
+                    check_listing: bool, post_url: str) -> bool:
+    """Check if the post was written by previous runs
+    "listing" - text of score and comments on the listing by post url
+    "check_listing" - post is also compared with its score and comments
+    on the listing
+    Return "True" if post is written and it is not changed.
+    """
+    saved = crawl_state.get(post_url)
+    if saved is None:
+        return False
+    if not check_listing:
+        return True
+    fingerprint = make_fingerprint(listing.get(post_url, ""))
+    return fingerprint is not None and fingerprint == saved[1]
 
 
 def make_request_selenium(url: str):
@@ -155,142 +261,68 @@ def make_request_selenium(url: str):
         sys.exit()
 
 
-def make_scroll_on_page(driver: WebDriver, scrolls: int):
-    """Make scroll on page
-
-    Find element 'body' on page and make scroll.
-    Script stops if element is not found
-    """
-    try:
-        element = driver.find_element(By.TAG_NAME, "body")
-
-        for scroll in range(1, scrolls):
-            element.send_keys(Keys.PAGE_DOWN)
-            time.sleep(0.5)
-    except Exception as ex:
-        logging.error(ex)
-        driver.close()
-        driver.quit()
-        sys.exit()
-
-
-def make_request_beautifulsoup(url: str):
-    """Make GET request and return processed HTML
-
-    Make GET request by link using 'BeautifulSoup'.
-    Write page HTML in file, read file.
-    Return page HTML processed with library "lxml"
-    """
-    try:
-        headers = {"User-Agent": f"{USER_AGENT}"}
-        req = requests.get(url, headers=headers, timeout=MAX_WAIT)
-        src = req.text
-        soup = BeautifulSoup(src, "lxml")
-        return soup
-    except Exception as ex:
-        logging.error(ex)
-
-
-def search_post_href_in_page_html(driver: WebDriver):
-    """Find posts links and return list of them
-
-    Process HTML from 'selenium' with library 'lxml'
-    Find all elements 'a' by 'class name' and get attribute 'href' from them.
-    Add post_url in list.
-    Return posts urls list
-    Script stops if list is empty
-    """
-    try:
-        soup = BeautifulSoup(driver.page_source, "lxml")
-        all_post_href = soup.find_all("a",
-                                      class_=("SQnoC3ObvgnGjWt90zD9Z "
-                                              "_2INHSNB8V5eaWp4P0rY_mE"))
-        posts_urls = []
-        for item in all_post_href:
-            post_url = "https://www.reddit.com" + item.get("href")
-            posts_urls.append(post_url)
-
-        if posts_urls:
-            return posts_urls
-        else:
-            raise Exception
-    except Exception as ex:
-        logging.error(ex)
-        driver.close()
-        driver.quit()
-        sys.exit()
-
-
-def get_post_urls_from_main_page(driver: WebDriver, scroll_number: int):
-    """Get data from page and return posts links"""
-    make_scroll_on_page(driver, scroll_number)
-    posts_urls = search_post_href_in_page_html(driver)
-    return posts_urls
-
-
-def get_data_from_response(soup: bs4.BeautifulSoup):
-    """Get 'JSON' from HTML and return 'dict' data"""
-    get_json_from_response = soup.find(
-        "script", id="data").text[:-1].split('= ', maxsplit=1)[1]
-    data_from_json = json.loads(get_json_from_response)
-    return data_from_json
-
-
-def convert_unix_time(unix_post_date: int):
-    """Convert unix time and return readable date"""
-    post_date = datetime.datetime.utcfromtimestamp(
-        unix_post_date).strftime('%Y-%m-%d')
-    return post_date
-
-
 if __name__ == '__main__':
-    try:
-        db_name = 'posts_data'
-        connector = MongodbService("localhost", 27017)
-        connector.drop_db(db_name)
-    except Exception as server_ex:
-        logging.error(server_ex)
-        sys.exit()
+    args = parser.parse_args()
+    COUNT_POSTS = args.posts_number
+    crawl_state = CrawlState(args.crawl_state)
+    if args.resume or args.refresh:
+        logging.info(f"{crawl_state.size()} posts are written "
+                     f"by previous runs")
+    else:
+        # New crawl starts with empty data base
+        try:
+            db_name = 'posts_data'
+            connector = MongodbService("localhost", 27017)
+            connector.drop_db(db_name)
+        except Exception as server_ex:
+            logging.error(server_ex)
+            sys.exit()
+        search_and_del_file_in_current_directory('reddit*')
+        crawl_state.clear()
     site_url = "https://www.reddit.com/top/?t=month"
-    count_records = 0
-    posts_urls_done = []
-    scroll_count = COUNT_POSTS if COUNT_POSTS <= 25 else GOOD_SCROLL_COUNT
 
-    search_and_del_file_in_current_directory('reddit*')
     selenium_driver = make_request_selenium(site_url)
-    all_posts_urls = get_post_urls_from_main_page(selenium_driver,
-                                                  scroll_count)
-
-    while count_records < COUNT_POSTS:
-        with multiprocessing.Pool(multiprocessing.cpu_count()) as process:
-            all_posts_data = process.map(get_data_from_post_and_user_page,
-                                         all_posts_urls)
-
-            for post_data in all_posts_data:
-                if post_data:
-                    posts_urls_done.append(post_data["post_url"])
-                    json_data = json.dumps(post_data, indent=4,
-                                           ensure_ascii=False).encode('utf8')
-                    try:
-                        re = requests.post("http://localhost:8087/posts/",
-                                           data=json_data)
-                        count_records += 1
-                    except Exception as server_ex:
-                        logging.error(server_ex)
-                        selenium_driver.close()
-                        selenium_driver.quit()
-                        sys.exit()
-
-                if count_records == COUNT_POSTS:
-                    selenium_driver.close()
-                    selenium_driver.quit()
-                    sys.exit()
-
-            next_posts_urls = get_post_urls_from_main_page(selenium_driver,
-                                                           scroll_count)
-
-            # Select urls for which there was no request
-            new_posts_urls = [x for x in next_posts_urls
-                              if x not in posts_urls_done]
-
-            all_posts_urls = new_posts_urls
+    # Links are taken from the page as it grows, every url once
+    harvester = LinkHarvester(selenium_driver, timeout=MAX_WAIT)
+
+    # Posts are written down in batches while next pages are requested.
+    # Data is found in pages by regular expressions in less than
+    # millisecond, so pages are processed in the event loop
+    loop = asyncio.new_event_loop()
+    author_cache = AuthorCache(args.author_cache, args.author_ttl,
+                               args.author_cache_size)
+    scraper = AsyncScraper(args.concurrency, MAX_WAIT, None,
+                           args.retries, args.backoff, author_cache)
+    loop.run_until_complete(scraper.start())
+    api_session = http_sessions.make_session(args.api_pool_size, args.retries,
+                                             args.backoff)
+    # Every post needs post and user pages, so twice more posts than
+    # simultaneous requests are in progress to use all requests
+    # Written posts are skipped on resume and unchanged ones on refresh
+    skip_link = None
+    if args.resume or args.refresh:
+        skip_link = functools.partial(is_post_written, crawl_state,
+                                      harvester.listing, args.refresh)
+    pipeline = ScrapePipeline(harvester.get_new_links, scraper,
+                              functools.partial(write_records, api_session,
+                                                crawl_state,
+                                                harvester.listing,
+                                                workers=args.api_pool_size),
+                              COUNT_POSTS, 2 * args.concurrency,
+                              args.batch_size, skip_link=skip_link)
+    try:
+        count_records = loop.run_until_complete(pipeline.run())
+        logging.info(f"{count_records} posts are done: "
+                     f"{pipeline.written} written, {pipeline.skipped} "
+                     f"skipped, {pipeline.failed} failed")
+    except Exception as server_ex:
+        logging.error(server_ex)
+    finally:
+        selenium_driver.close()
+        selenium_driver.quit()
+        loop.run_until_complete(scraper.close())
+        loop.close()
+        api_session.close()
+        logging.info(f"author cache: {author_cache.statistics()}")
+        author_cache.close()
+        crawl_state.close()
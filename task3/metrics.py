@@ -0,0 +1,144 @@
+"""Counters and latency histograms exposed in Prometheus text format"""
+import bisect
+import threading
+
+from typing import Dict, List, Tuple
+
+# Upper bounds of histogram buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...],
+                  extra: str = "") -> str:
+    """Return labels of the sample in Prometheus text format"""
+    labels = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, description: str,
+                 label_names: Tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        """Add amount to the counter with label values"""
+        with self._lock:
+            self._values[label_values] = (self._values.get(label_values, 0)
+                                          + amount)
+
+    def collect(self, extra: str = "") -> List[str]:
+        """Return lines of the counter in Prometheus text format
+        "extra" - labels of every sample in Prometheus text format
+        """
+        lines = [f"# HELP {self.name} {self.description}",
+                 f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values):
+            labels = format_labels(self.label_names, label_values, extra)
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Histogram:
+    """Histogram of observed values with labels"""
+
+    def __init__(self, name: str, description: str,
+                 label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Add observed value to the histogram with label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                # Bucket counts, the last one is "+Inf", and sum of values
+                counts = self._values[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def collect(self, extra: str = "") -> List[str]:
+        """Return lines of the histogram in Prometheus text format
+        "extra" - labels of every sample in Prometheus text format
+        """
+        lines = [f"# HELP {self.name} {self.description}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = [(label_values, list(counts[0]), counts[1])
+                      for label_values, counts in self._values.items()]
+        for label_values, bucket_counts, total in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),),
+                                    bucket_counts):
+                cumulative += count
+                bound = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.label_names, label_values,
+                                       ",".join(filter(None, (
+                                           extra, f'le="{bound}"'))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, label_values, extra)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics of the process"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        # Labels of every sample in Prometheus text format
+        self._labels = ""
+
+    def set_labels(self, **labels: str) -> None:
+        """Set labels added to every sample, for example process id
+        of the worker which collected the metrics"""
+        self._labels = format_labels(tuple(labels),
+                                     tuple(labels.values()))[1:-1]
+
+    def counter(self, name: str, description: str,
+                label_names: Tuple[str, ...] = ()) -> Counter:
+        """Get counter by name, it is created on first call"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description, label_names)
+            return self._metrics[name]
+
+    def histogram(self, name: str, description: str,
+                  label_names: Tuple[str, ...] = ()) -> Histogram:
+        """Get histogram by name, it is created on first call"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description,
+                                                label_names)
+            return self._metrics[name]
+
+    def exposition(self) -> bytes:
+        """Return all metrics in Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.collect(self._labels)
+        return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+REGISTRY = Registry()
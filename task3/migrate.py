@@ -0,0 +1,116 @@
+"""
+Convert numbers and dates stored as strings in "posts" and "users"
+collections to types described in data_description.FIELD_TYPES
+and count posts of every user.
+Run once after server update with server stopped, documents of other
+types are not changed.
+"""
+import sys
+import logging
+import argparse
+
+from pymongo import collection
+
+from db_connectors.mongo import MongodbService
+from data_description import PostDataDB, UserDataDB, FIELD_TYPES, \
+    POST_COUNT, convert_to_db_type
+
+logging.basicConfig(handlers=[logging.FileHandler(filename='migrate.log',
+                                                  mode='w', encoding='utf-8')],
+                    level=logging.DEBUG,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def migrate_collection(connector: MongodbService,
+                       collection_name: collection.Collection,
+                       fields: list, batch_size: int) -> tuple:
+    """Convert string values of fields in all documents of collection
+    "connector" - MongodbService class instance
+    "collection_name" - pymongo.collection.Collection class instance
+    "fields" - fields to convert
+    "batch_size" - number of documents read and updated at once
+    Return tuple of numbers of converted and not converted documents.
+    """
+    string_filter = {"$or": [{field: {"$type": "string"}}
+                             for field in fields]}
+    projection = dict.fromkeys(fields, True)
+    converted = failed = 0
+    last_id = None
+    while True:
+        search_filter = string_filter
+        if last_id is not None:
+            search_filter = {"$and": [string_filter,
+                                      {"_id": {"$gt": last_id}}]}
+        documents = connector.find_many(collection_name, search_filter,
+                                        projection, limit=batch_size)
+        if not documents:
+            return converted, failed
+        updates = []
+        for document in documents:
+            try:
+                new_values = {field: convert_to_db_type(field,
+                                                        document[field])
+                              for field in fields if field in document}
+                updates.append(({"_id": document["_id"]}, new_values))
+            except ValueError as ex:
+                logging.error(f"{collection_name.name} "
+                              f"{document['_id']}: {ex}")
+                failed += 1
+        connector.update_each(collection_name, updates)
+        converted += len(updates)
+        last_id = documents[-1]["_id"]
+
+
+def count_user_posts(connector: MongodbService,
+                     posts_collection: collection.Collection,
+                     users_collection: collection.Collection,
+                     batch_size: int) -> int:
+    """Write down number of posts of every user to "users" collection
+    "connector" - MongodbService class instance
+    "posts_collection" - pymongo.collection.Collection class instance
+    with posts
+    "users_collection" - pymongo.collection.Collection class instance
+    with users
+    "batch_size" - number of documents updated at once
+    Return number of users with posts.
+    """
+    connector.update_many(users_collection, {}, {POST_COUNT: 0})
+    post_counts = connector.aggregate(posts_collection, [
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}])
+    for start in range(0, len(post_counts), batch_size):
+        connector.update_each(users_collection,
+                              [({"_id": item["_id"]},
+                                {POST_COUNT: item["count"]})
+                               for item in post_counts[start:start
+                                                       + batch_size]])
+    return len(post_counts)
+
+
+parser = argparse.ArgumentParser(description='Convert numbers and dates '
+                                             'stored as strings to native '
+                                             'types')
+parser.add_argument('--batch_size', type=int,
+                    default=1000,
+                    help='Number of documents updated at once')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    try:
+        db_name = 'posts_data'
+        connector = MongodbService("localhost", 27017)
+        db = connector.create_db(db_name)
+        posts = connector.create_collection(db, 'posts')
+        users = connector.create_collection(db, 'users')
+    except Exception as server_ex:
+        logging.error(server_ex)
+        sys.exit()
+    for collection_name, slots in ((posts, PostDataDB.__slots__),
+                                   (users, UserDataDB.__slots__)):
+        fields = [field for field in slots if field in FIELD_TYPES]
+        converted, failed = migrate_collection(connector, collection_name,
+                                               fields, args.batch_size)
+        print(f"{collection_name.name}: {converted} documents converted, "
+              f"{failed} documents not converted")
+    authors = count_user_posts(connector, posts, users, args.batch_size)
+    print(f"{users.name}: posts counted for {authors} users")
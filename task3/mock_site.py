@@ -0,0 +1,216 @@
+"""
+Local imitation of the site www.reddit.com for benchmarks of the scraper:
+listing of top posts, post pages and user pages with the same markup
+and embedded json as on the site.
+Every response is delayed to imitate network latency.
+"""
+import json
+import time
+import argparse
+
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+POST_CATEGORY_CLASS = "_19bCWnxeTjqzBElWZfIlJb"
+POST_LINK_CLASS = "SQnoC3ObvgnGjWt90zD9Z _2INHSNB8V5eaWp4P0rY_mE"
+POST_VOTES_CLASS = "_1rZYMD_4xY3gRcSS3p8ODO"
+# Date of the first post in milliseconds as in json of the site
+FIRST_POST_DATE = 1633046400000
+USERS_NUMBER = 50
+CATEGORIES_NUMBER = 5
+# Number of links added to the listing by every scroll to the end
+LISTING_SIZE = 25
+
+# Listing requests the next links when it is scrolled to the end,
+# as the site does
+LISTING_SCRIPT = """
+let next = %(size)d;
+let loading = false;
+window.addEventListener("scroll", () => {
+    const end = document.body.scrollHeight - 200;
+    if (loading || next >= %(total)d
+            || window.innerHeight + window.scrollY < end) {
+        return;
+    }
+    loading = true;
+    fetch("/top/more/" + next).then(response => response.text())
+        .then(html => {
+            document.getElementById("posts")
+                .insertAdjacentHTML("beforeend", html);
+            next += %(size)d;
+            loading = false;
+        });
+});
+"""
+
+
+def make_post_path(number: int) -> str:
+    """Return path of the post page by number of the post"""
+    return (f"/r/category{number % CATEGORIES_NUMBER}/comments/"
+            f"{number:06x}/post_{number}/")
+
+
+def make_filler(size: int) -> str:
+    """Return markup of about "size" bytes which is not used
+    by the scraper, pages of the site are mostly such markup"""
+    item = ('<div class="_1oQyIsiPHYt6nx7VOmd1sz"><a href="/r/popular/">'
+            '<span class="_2tbHP6ZydRpjI44J3syuqC">popular</span></a>'
+            '<p class="_1qeIAgB0cPwnLhDF9XSiJM">text of the comment</p>'
+            '</div>\n')
+    return item * (size // len(item))
+
+
+def make_page(title: str, body: str, data: dict, filler: str) -> bytes:
+    """Return page with embedded json in the script with id "data" """
+    return (f'<!DOCTYPE html><html lang="en"><head>'
+            f'<meta charset="utf-8"><title>{title}</title></head>'
+            f'<body><div id="2x-container">{filler}{body}</div>'
+            f'<script id="data">window.___r = '
+            f'{json.dumps(data)};</script></body></html>').encode('utf-8')
+
+
+def get_score(number: int) -> int:
+    """Return score of the post by number of the post"""
+    return number * 7 % 1000
+
+
+def get_comments_number(number: int) -> int:
+    """Return number of comments of the post by number of the post"""
+    return number * 3 % 100
+
+
+def make_post_page(number: int, filler: str) -> bytes:
+    """Return post page by number of the post"""
+    post_id = f"t3_{number:06x}"
+    data = {"posts": {"models": {post_id: {
+        "author": f"user_{number % USERS_NUMBER}",
+        "score": get_score(number),
+        "numComments": get_comments_number(number),
+        "created": FIRST_POST_DATE + number * 3600000}}}}
+    body = (f'<span class="{POST_CATEGORY_CLASS}">'
+            f'r/category{number % CATEGORIES_NUMBER}</span>')
+    return make_page(f"post {number}", body, data, filler)
+
+
+def make_user_page(user_name: str, filler: str) -> bytes:
+    """Return page of the user by user name"""
+    number = int(user_name.rsplit("_", 1)[-1])
+    user_id = f"t2_{number:04x}"
+    data = {"profiles": {"about": {user_id: {"karma": {
+        "total": number * 100, "fromPosts": number * 60,
+        "fromComments": number * 40}}}},
+        "subreddits": {"about": {user_id: {
+            "created": FIRST_POST_DATE // 1000 - number * 86400}}}}
+    return make_page(user_name, "", data, filler)
+
+
+def make_listing_links(start: int, posts_number: int) -> str:
+    """Return markup of links with score and comments of posts
+    from the post number "start", "LISTING_SIZE" links at most"""
+    return "".join(f'<div data-testid="post-container" '
+                   f'style="height: 100px">'
+                   f'<div class="{POST_VOTES_CLASS}">{get_score(number)}'
+                   f'</div><a class="{POST_LINK_CLASS}" '
+                   f'href="{make_post_path(number)}">post {number}</a>'
+                   f'<a data-click-id="comments" '
+                   f'href="{make_post_path(number)}">'
+                   f'{get_comments_number(number)} comments</a></div>\n'
+                   for number in range(start, min(start + LISTING_SIZE,
+                                                  posts_number)))
+
+
+def make_listing_page(posts_number: int) -> bytes:
+    """Return page with the first links to posts, next links
+    are added by scroll to the end of the page"""
+    script = LISTING_SCRIPT % {"size": LISTING_SIZE, "total": posts_number}
+    body = (f'<div id="posts">{make_listing_links(0, posts_number)}</div>'
+            f'<script>{script}</script>')
+    return make_page("top", body, {}, "")
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    """Pages of the site generated by path"""
+
+    protocol_version = "HTTP/1.1"
+    # Seconds to wait before every response
+    delay = 0.3
+    # Markup added to post and user pages
+    filler = make_filler(100 * 1024)
+    posts_number = 1000
+
+    def do_GET(self):
+        """Send page by path: "/top/", "/top/more/<start>",
+        "/r/.../comments/<id>/..." or "/user/<name>" """
+        time.sleep(self.delay)
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        try:
+            if parts[0] == "top" and parts[1:2] == ["more"]:
+                body = make_listing_links(int(parts[2]),
+                                          self.posts_number).encode('utf-8')
+            elif parts[0] == "top":
+                body = make_listing_page(self.posts_number)
+            elif parts[0] == "r" and parts[2] == "comments":
+                body = make_post_page(int(parts[3], 16), self.filler)
+            elif parts[0] == "user":
+                body = make_user_page(parts[1], self.filler)
+            else:
+                raise ValueError(self.path)
+        except (IndexError, ValueError):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Access log is not written"""
+
+
+class MockSiteServer(ThreadingHTTPServer):
+    """Server with thread per connection"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        """Connections closed by clients are not reported"""
+
+
+def run_mock_site(host: str, port: int, delay: float,
+                  page_size: int) -> None:
+    """Serve pages until the process is stopped, it is run in separate
+    process, so scraper and site do not share interpreter
+    "delay" - seconds to wait before every response
+    "page_size" - size of markup added to post and user pages in bytes
+    """
+    MockSiteHandler.delay = delay
+    MockSiteHandler.filler = make_filler(page_size)
+    with MockSiteServer((host, port), MockSiteHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+parser = argparse.ArgumentParser(description='Local imitation of the site '
+                                             'www.reddit.com')
+parser.add_argument('--host', type=str,
+                    default='127.0.0.1',
+                    help='Address to listen on')
+parser.add_argument('--port', type=int,
+                    default=8089,
+                    help='Port to listen on')
+parser.add_argument('--delay', type=float,
+                    default=MockSiteHandler.delay,
+                    help='Seconds to wait before every response')
+parser.add_argument('--page_size', type=int,
+                    default=100 * 1024,
+                    help='Size of post and user pages in bytes')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    run_mock_site(args.host, args.port, args.delay, args.page_size)
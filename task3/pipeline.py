@@ -0,0 +1,211 @@
+"""Streaming pipeline from links to posts written down by RESTful server:
+
+    frontier -> fetch and parse -> check -> write down
+
+Stages are asyncio tasks connected by bounded queues, so posts
+are written down in batches while next pages are requested, and one
+slow page delays only its own post.
+Links are requested only for posts which are still needed, so the
+pipeline stops exactly at the required number of written posts.
+Posts written by previous runs are skipped without requests and counted
+as written."""
+import asyncio
+import logging
+
+from collections import deque
+from typing import Callable, List, Union
+
+from async_scraper import AsyncScraper
+from data_description import AllData, convert_to_db_type
+
+
+def check_record(record: Union[dict, list]) -> bool:
+    """Check record as RESTful server does before write
+    Return "True" if record has all data and values have right types.
+    """
+    if not record:
+        return False
+    for attribute in AllData.__slots__:
+        if attribute not in record:
+            return False
+        try:
+            convert_to_db_type(attribute, record[attribute])
+        except ValueError:
+            return False
+    return True
+
+
+class ScrapePipeline:
+    """Pipeline is run in the event loop of the scraper:
+
+        pipeline = ScrapePipeline(get_links, scraper, write_posts, 100)
+        done = await pipeline.run()
+    """
+
+    def __init__(self, get_links: Callable[[int], List[str]],
+                 scraper: AsyncScraper,
+                 write_posts: Callable[[List[dict]], List[dict]],
+                 posts_number: int, workers: int = 20,
+                 batch_size: int = 100, max_delay: float = 0.5,
+                 skip_link: Callable[[str], bool] = None):
+        """"get_links" - function which returns at least the given number
+        of new links if the site has them, it is called in a thread
+        "scraper" - started scraper of post and user pages
+        "write_posts" - function which writes down posts and returns
+        status of every post as "POST /posts/bulk", 200 and 201 are
+        statuses of written posts, it is called in a thread
+        "posts_number" - required number of written posts
+        "workers" - number of posts scraped at the same time
+        "batch_size" - maximum number of posts written at once
+        "max_delay" - seconds to wait for more posts to the batch
+        "skip_link" - function which returns "True" if the post
+        is already written and its link is skipped
+        """
+        self.get_links = get_links
+        self.scraper = scraper
+        self.write_posts = write_posts
+        self.posts_number = posts_number
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.skip_link = skip_link
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        # Posts which are scraped or written now
+        self._in_progress = 0
+        self._slots = None
+        self._links = None
+        self._records = None
+
+    @property
+    def done(self) -> int:
+        """Return number of written and skipped posts"""
+        return self.written + self.skipped
+
+    async def run(self) -> int:
+        """Run stages until required number of posts is written
+        or skipped or the site has no more links
+        Return number of written and skipped posts.
+        Raise exception of "get_links" or "write_posts".
+        """
+        # Slot is taken by every post in progress, written or skipped
+        self._slots = asyncio.Semaphore(self.posts_number)
+        self._links = asyncio.Queue(self.workers)
+        self._records = asyncio.Queue(self.batch_size)
+        tasks = [asyncio.ensure_future(self.frontier())]
+        tasks += [asyncio.ensure_future(self.scrape())
+                  for _ in range(self.workers)]
+        writer = asyncio.ensure_future(self.write())
+        try:
+            # Writer ends with the last post, other stages may wait
+            # for slots or links. Frontier ends if the last post
+            # is skipped or there are no more links
+            done, _ = await asyncio.wait([writer, tasks[0]],
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if tasks[0] in done and tasks[0].exception() is not None:
+                raise tasks[0].exception()
+            await writer
+        finally:
+            for task in tasks + [writer]:
+                task.cancel()
+            await asyncio.gather(*tasks, writer, return_exceptions=True)
+        return self.done
+
+    def finish_post(self, written: bool) -> None:
+        """Count post which is written or failed, slot of the failed
+        post is free for the next link"""
+        self._in_progress -= 1
+        if written:
+            self.written += 1
+        else:
+            self.failed += 1
+            self._slots.release()
+
+    async def frontier(self) -> None:
+        """Pass links to scrapers while there are free slots, new links
+        are requested for the number of free slots. Slot of the skipped
+        link is kept as of the written post."""
+        loop = asyncio.get_running_loop()
+        links = deque()
+        while True:
+            await self._slots.acquire()
+            if not links:
+                number = self.posts_number - self.done - self._in_progress
+                links.extend(await loop.run_in_executor(None, self.get_links,
+                                                        number))
+                if not links:
+                    logging.info(f"no more links, {self.done} posts "
+                                 f"are written")
+                    break
+            url = links.popleft()
+            if self.skip_link is not None and self.skip_link(url):
+                self.skipped += 1
+                if self.done == self.posts_number:
+                    break
+                continue
+            self._in_progress += 1
+            await self._links.put(url)
+        for _ in range(self.workers):
+            await self._links.put(None)
+
+    async def scrape(self) -> None:
+        """Get data of posts by links and pass correct records
+        to the writer in the order of completion"""
+        while True:
+            url = await self._links.get()
+            if url is None:
+                break
+            record = await self.scraper.get_data_from_post_and_user_page(url)
+            if check_record(record):
+                await self._records.put(record)
+            else:
+                logging.error(f"{url}: post data is not found")
+                self.finish_post(False)
+        await self._records.put(None)
+
+    async def next_batch(self) -> tuple:
+        """Wait for records and collect them to the batch until
+        it is full, all required posts or all posts in progress are in it
+        or "max_delay" passes after the first record
+        Return list of records and number of finished scrapers.
+        """
+        loop = asyncio.get_running_loop()
+        batch = []
+        finished = 0
+        record = await self._records.get()
+        deadline = loop.time() + self.max_delay
+        while True:
+            if record is None:
+                finished += 1
+            else:
+                batch.append(record)
+            if (len(batch) >= min(self.batch_size,
+                                  self.posts_number - self.done)
+                    or len(batch) == self._in_progress):
+                return batch, finished
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                return batch, finished
+            try:
+                record = await asyncio.wait_for(self._records.get(), timeout)
+            except asyncio.TimeoutError:
+                return batch, finished
+
+    async def write(self) -> None:
+        """Write down batches of records until required number of posts
+        is written or all scrapers are finished"""
+        loop = asyncio.get_running_loop()
+        finished = 0
+        while self.done < self.posts_number and finished < self.workers:
+            batch, batch_finished = await self.next_batch()
+            finished += batch_finished
+            if not batch:
+                continue
+            statuses = await loop.run_in_executor(None, self.write_posts,
+                                                  batch)
+            for record, status in zip(batch, statuses):
+                written = status.get("status") in (200, 201)
+                if not written:
+                    logging.error(f"{record['post_url']}: {status}")
+                self.finish_post(written)
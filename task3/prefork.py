@@ -0,0 +1,117 @@
+"""Parent process of the pre-fork server: starts worker processes
+which handle requests on the inherited listening socket, restarts
+them on SIGHUP and stops them on SIGTERM or SIGINT.
+Workers are forked from the parent, so restart does not load changed
+code or configuration, the whole server is restarted for that."""
+import os
+import time
+import signal
+import logging
+
+from typing import Callable
+
+# Worker which exits faster than this number of seconds is not
+# restarted, it fails on start, for example without data base
+MIN_WORKER_UPTIME = 1.0
+
+
+class PreforkServer:
+    """Fixed number of worker processes forked from the parent process.
+    Parent process does not handle requests, it only supervises
+    workers: dead worker is replaced by the new one."""
+
+    def __init__(self, run_worker: Callable[[], None], workers: int):
+        """"run_worker" - function which handles requests in the worker
+        process until SIGTERM
+        "workers" - number of worker processes
+        """
+        self.workers = workers
+        self._run_worker = run_worker
+        # Start time of the running workers by process id
+        self._started = {}
+        # Workers stopped by restart, they are not replaced
+        self._retired = set()
+        self._stopping = False
+
+    def start_worker(self) -> int:
+        """Fork worker process
+        Return process id of the worker.
+        """
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for signal_number in (signal.SIGTERM, signal.SIGINT,
+                                      signal.SIGHUP):
+                    signal.signal(signal_number, signal.SIG_DFL)
+                self._run_worker()
+            except SystemExit as ex:
+                code = ex.code if isinstance(ex.code, int) else 1
+            except BaseException as ex:
+                logging.error(f"worker {os.getpid()}: {ex!r}")
+                code = 1
+            finally:
+                # Parent state (signal handlers, atexit) is not run
+                # in the worker
+                os._exit(code)
+        self._started[pid] = time.monotonic()
+        logging.info(f"worker {pid} started")
+        return pid
+
+    def stop_workers(self, pids) -> None:
+        """Ask workers to finish requests in progress and exit"""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def restart_workers(self, signum=None, frame=None) -> None:
+        """Replace all workers by new ones forked from the parent, new
+        workers start before old ones stop, so listening socket is always
+        served. Workers get fresh connections, caches and queues, but
+        code and configuration already loaded by the parent."""
+        if self._stopping:
+            return
+        old_workers = [pid for pid in self._started
+                       if pid not in self._retired]
+        logging.info(f"restart: replacing workers {old_workers}")
+        for _ in range(self.workers):
+            self.start_worker()
+        self._retired.update(old_workers)
+        self.stop_workers(old_workers)
+
+    def stop(self, signum=None, frame=None) -> None:
+        """Stop all workers gracefully, parent exits after them"""
+        self._stopping = True
+        self.stop_workers(list(self._started))
+
+    def run(self) -> None:
+        """Start workers and supervise them until they all exit
+        after SIGTERM or SIGINT"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.restart_workers)
+        for _ in range(self.workers):
+            self.start_worker()
+        while self._started:
+            try:
+                # Signal handlers run while waiting
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self._started.pop(pid, None)
+            if started is None:
+                continue
+            if pid in self._retired:
+                self._retired.discard(pid)
+                continue
+            logging.info(f"worker {pid} exited with status {status}")
+            if self._stopping:
+                continue
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                logging.error(f"worker {pid} failed on start, stopping "
+                              f"server")
+                self.stop()
+            else:
+                self.start_worker()
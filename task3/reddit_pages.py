@@ -0,0 +1,202 @@
+"""Data of posts and their authors on pages of the site www.reddit.com.
+Data is found in HTML by regular expressions, pages are processed
+with BeautifulSoup only if data is not found that way."""
+import re
+import html
+import json
+import uuid
+import logging
+import datetime
+
+import bs4
+
+from bs4 import BeautifulSoup
+from typing import Union
+from urllib.parse import urljoin
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 6.3; Win64; x64)"
+              "AppleWebKit/537.36 (KHTML, like Gecko)"
+              "Chrome/92.0.4515.159 Safari/537.36")
+
+POST_CATEGORY_CLASS = "_19bCWnxeTjqzBElWZfIlJb"
+# Script with json of all page data
+DATA_SCRIPT_RE = re.compile(r'<script\b[^>]*\sid=(["\']?)data\1(?=[\s>])'
+                            r'[^>]*>(.*?)</script>', re.S)
+# Span with name of subreddit "r/<category>" of the post, it is matched
+# from the tag start found by the class name
+POST_CATEGORY_RE = re.compile(rf'<span\b[^>]*\sclass="(?:[^"]*\s)?'
+                              rf'{POST_CATEGORY_CLASS}(?:\s[^"]*)?"[^>]*>'
+                              rf'(.*?)</span>', re.S)
+TAG_RE = re.compile(r"<[^>]*>")
+
+
+def get_post_data_from_page(soup: bs4.BeautifulSoup) -> dict:
+    """Get author, votes, comments, date and category of the post
+    from post page
+    Raise exception if page has no post data.
+    """
+    post_category = soup.find("span",
+                              class_=POST_CATEGORY_CLASS
+                              ).text.split("/")[1]
+    return post_data_from_json(get_data_from_response(soup), post_category)
+
+
+def post_data_from_json(data_from_json: dict, post_category: str) -> dict:
+    """Get author, votes, comments and date of the post from json
+    of post page
+    "data_from_json" - json from the script with id "data"
+    "post_category" - category of the post from the page
+    Raise exception if json has no post data.
+    """
+    user_id = list(data_from_json["posts"]["models"].keys())[0]
+    user_name = str(data_from_json["posts"]["models"]
+                    [f'{user_id}']['author'])
+    number_of_votes = int(data_from_json["posts"]["models"]
+                          [f'{user_id}']['score'])
+    number_of_comments = int(data_from_json["posts"]["models"]
+                             [f'{user_id}']['numComments'])
+
+    # post creation date from json comes as 1634227843000
+    unix_post_date = str(data_from_json["posts"]["models"]
+                         [f'{user_id}']['created'])[:-3]
+    post_date = convert_unix_time(int(unix_post_date))
+    return {"user_name": user_name,
+            "post_date": post_date,
+            "number_of_comments": number_of_comments,
+            "number_of_votes": number_of_votes,
+            "post_category": post_category}
+
+
+def parse_post_page(src: str) -> dict:
+    """Get post data from HTML of post page as "get_post_data_from_page"
+    Page is processed with library "lxml" only if data is not found
+    by "extract_post_data".
+    """
+    try:
+        return extract_post_data(src)
+    except Exception as ex:
+        logging.debug(f"post page is processed by BeautifulSoup: {ex!r}")
+    return get_post_data_from_page(BeautifulSoup(src, "lxml"))
+
+
+def parse_user_page(src: str) -> dict:
+    """Get user data from HTML of user page as "get_user_data_from_page"
+    Page is processed with library "lxml" only if data is not found
+    by "extract_user_data".
+    """
+    try:
+        return extract_user_data(src)
+    except Exception as ex:
+        logging.debug(f"user page is processed by BeautifulSoup: {ex!r}")
+    return get_user_data_from_page(BeautifulSoup(src, "lxml"))
+
+
+def extract_post_data(src: str) -> dict:
+    """Get post data from HTML of post page without building of the tree
+    of the page
+    Raise exception if script with json or category is not found.
+    """
+    post_category = find_post_category(src)
+    if post_category is None:
+        raise ValueError("category of the post is not found")
+    return post_data_from_json(extract_data_json(src),
+                               post_category.split("/")[1])
+
+
+def find_post_category(src: str) -> Union[str, None]:
+    """Find text of the span with category of the post in HTML
+    Return "None" if span is not found.
+    """
+    position = src.find(POST_CATEGORY_CLASS)
+    while position != -1:
+        match = POST_CATEGORY_RE.match(src, src.rfind("<", 0, position))
+        if match is not None:
+            return html.unescape(TAG_RE.sub("", match.group(1)))
+        position = src.find(POST_CATEGORY_CLASS, position + 1)
+    return None
+
+
+def extract_user_data(src: str) -> dict:
+    """Get user data from HTML of user page without building of the tree
+    of the page
+    Raise exception if script with json is not found.
+    """
+    return user_data_from_json(extract_data_json(src))
+
+
+def extract_data_json(src: str) -> dict:
+    """Get json from the script with id "data" in HTML
+    Raise exception if script is not found.
+    """
+    match = DATA_SCRIPT_RE.search(src)
+    if match is None:
+        raise ValueError("script with data is not found")
+    return json_from_script(match.group(2))
+
+
+def get_user_link(post_url: str, user_name: str) -> str:
+    """Return link to the page of the post author on the same site"""
+    return urljoin(post_url, "/user/" + f"{user_name}")
+
+
+def get_user_data_from_page(soup: bs4.BeautifulSoup) -> dict:
+    """Get karma and cake day of the user from user page
+    Raise exception if page has no user data.
+    """
+    return user_data_from_json(get_data_from_response(soup))
+
+
+def user_data_from_json(data_from_json: dict) -> dict:
+    """Get karma and cake day of the user from json of user page
+    Raise exception if json has no user data.
+    """
+    user_id = list(data_from_json["profiles"]["about"].keys())[0]
+    user_karma = int(data_from_json["profiles"]["about"]
+                     [f'{user_id}']['karma']['total'])
+    post_karma = int(data_from_json["profiles"]["about"]
+                     [f'{user_id}']['karma']['fromPosts'])
+    comment_karma = int(data_from_json["profiles"]["about"]
+                        [f'{user_id}']['karma']['fromComments'])
+    unix_user_cake_day = str(data_from_json["subreddits"]["about"]
+                             [f'{user_id}']['created'])
+    user_cake_day = convert_unix_time(int(unix_user_cake_day))
+    return {"user_karma": user_karma,
+            "user_cake_day": user_cake_day,
+            "post_karma": post_karma,
+            "comment_karma": comment_karma}
+
+
+def make_post_record(post_url: str, post_data: dict,
+                     user_data: dict) -> dict:
+    """Return all data of the post and its author with new unique id"""
+    return {"_id": uuid.uuid1().hex,
+            "post_url": post_url,
+            "user_name": post_data["user_name"],
+            "user_karma": user_data["user_karma"],
+            "user_cake_day": user_data["user_cake_day"],
+            "post_karma": user_data["post_karma"],
+            "comment_karma": user_data["comment_karma"],
+            "post_date": post_data["post_date"],
+            "number_of_comments": post_data["number_of_comments"],
+            "number_of_votes": post_data["number_of_votes"],
+            "post_category": post_data["post_category"]
+            }
+
+
+def get_data_from_response(soup: bs4.BeautifulSoup):
+    """Get 'JSON' from HTML and return 'dict' data"""
+    return json_from_script(soup.find("script", id="data").text)
+
+
+def json_from_script(script: str) -> dict:
+    """Get json from the text of script "window.___r = {...};" """
+    get_json_from_response = script[:-1].split('= ', maxsplit=1)[1]
+    data_from_json = json.loads(get_json_from_response)
+    return data_from_json
+
+
+def convert_unix_time(unix_post_date: int):
+    """Convert unix time and return readable date"""
+    post_date = datetime.datetime.utcfromtimestamp(
+        unix_post_date).strftime('%Y-%m-%d')
+    return post_date
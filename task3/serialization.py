@@ -0,0 +1,116 @@
+"""Encoding of response data to json and compression
+of response body negotiated by "Accept-Encoding" header.
+"orjson" and "brotli" libraries are used if they are installed."""
+import json
+import zlib
+import datetime
+
+from typing import List, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings supported by server in order of preference
+ENCODINGS = ["br", "gzip"] if brotli else ["gzip"]
+
+# Bodies less than this size in bytes are not compressed
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def encode_default(value) -> str:
+    """Encode value which is not supported by json
+    Return dates as str "YYYY-MM-DD".
+    Raise "TypeError" for other values.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(data: Union[dict, List[dict]], pretty: bool = False) -> bytes:
+    """Encode data to json
+    "data" - data to encode
+    "pretty" - encode with indents, compact json otherwise
+    Return json encoded with "utf-8".
+    """
+    if pretty:
+        return json.dumps(data, indent=4,
+                          default=encode_default).encode('utf-8')
+    if orjson is not None:
+        return orjson.dumps(data, default=encode_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False,
+                      default=encode_default).encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding: Union[str, None]) -> Union[str,
+                                                                   None]:
+    """Choose content coding of the response
+    "accept_encoding" - value of the "Accept-Encoding" request header
+    Return name of the supported coding accepted by client.
+    Return "None" if response is sent without coding.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, parameters = item.strip().partition(";")
+        quality = 1.0
+        parameter, _, value = parameters.strip().partition("=")
+        if parameter.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+class Compressor:
+    """Incremental compressor of the response body parts"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress = self._compressor.process
+            self._flush = self._compressor.finish
+        elif encoding == "gzip":
+            # 16 + MAX_WBITS adds gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED,
+                                                16 + zlib.MAX_WBITS)
+            self._compress = self._compressor.compress
+            self._flush = self._compressor.flush
+        else:
+            raise ValueError(f"unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress part of the body, result can be empty"""
+        return self._compress(data)
+
+    def flush(self) -> bytes:
+        """Return the rest of compressed body"""
+        return self._flush()
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress whole body
+    "body" - response body
+    "encoding" - name of the content coding
+    Return compressed body.
+    """
+    compressor = Compressor(encoding)
+    return compressor.compress(body) + compressor.flush()
@@ -1,39 +1,245 @@
 """Connect to database, routes requests by path and calls
 appropriate methods"""
+import os
 import sys
 import json
+import time
+import uuid
+import datetime
+import hashlib
+import signal
 import logging
+import argparse
+import threading
 
-from typing import Union, List
+from typing import Union, List, Iterable
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
 from bson.objectid import ObjectId
 from pymongo import collection
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
+import serialization
+from cache import LRUCache
+from metrics import REGISTRY
+from stats import PostsStatistics
+from prefork import PreforkServer
+from write_behind import WriteBehindQueue
 from db_connectors.mongo import MongodbService
-from data_description import PostDataDB, UserDataDB, AllData
+from db_connectors.sql import SqlService
+from db_connectors.connector import DuplicateDataError
+from data_description import PostDataDB, UserDataDB, AllData, INDEXES, \
+    TABLES, DATE_FORMAT, POST_COUNT, convert_to_db_type
 
 logging.basicConfig(handlers=[logging.FileHandler(filename='server.log',
                                                   mode='w', encoding='utf-8')],
                     level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-try:
-    db_name = 'posts_data'
-    connector = MongodbService("localhost", 27017)
-    db = connector.create_db(db_name)
-    posts = connector.create_collection(db, 'posts')
-    users = connector.create_collection(db, 'users')
-except Exception as server_ex:
-    logging.error(server_ex)
-    sys.exit()
+# Data base connection and collections, they are set by "connect_to_db"
+connector = db = posts = users = counters = statistics = None
+
+
+def connect_to_db(database: str) -> None:
+    """Connect to data base, create collections and indexes
+    "database" - "mongodb", "sqlite" or "postgresql"
+    """
+    global connector, db, posts, users, counters, statistics
+    try:
+        db_name = 'posts_data'
+        if database == "mongodb":
+            connector = MongodbService("localhost", 27017)
+        else:
+            connector = SqlService("localhost", 5432, database, TABLES)
+        db = connector.create_db(db_name)
+        posts = connector.create_collection(db, 'posts')
+        users = connector.create_collection(db, 'users')
+        counters = connector.create_collection(db, 'counters')
+        # Statistics are calculated by aggregation pipelines, SQL
+        # connector does not have them
+        if hasattr(connector, "aggregate"):
+            statistics = PostsStatistics(
+                connector, posts, users,
+                connector.create_collection(db, 'stats'),
+                connector.create_collection(db, 'author_stats'))
+    except Exception as server_ex:
+        logging.error(server_ex)
+        sys.exit()
+
+    try:
+        connector.ensure_indexes(db, INDEXES)
+    except Exception as index_ex:
+        # Server works without indexes, but queries scan collections
+        logging.error(index_ex)
+
+    try:
+        # Epoch is also set on the first read after drop of data base
+        if "epoch" not in (connector.find_one(counters, {"_id": "posts"})
+                           or {}):
+            MyHandler.set_posts_epoch(None)
+    except Exception as epoch_ex:
+        logging.error(epoch_ex)
+
+    if statistics is not None:
+        try:
+            statistics.ensure_summary()
+        except Exception as stats_ex:
+            logging.error(stats_ex)
+
+# Post and user data by unique id of the post, entries are marked
+# with "_id" of the user to invalidate all posts of the user
+post_cache = LRUCache(max_size=10000, ttl=60)
+
+# Number of posts deleted at once by DELETE request with filter
+DELETE_BATCH_SIZE = 1000
+
+# Queue of posts accepted by POST request and written down later,
+# it is set in write-behind mode only
+write_queue = None
+
+# Process id of the worker, it is set with several workers only: cache,
+# queue and metrics of every worker are separate, so they are marked
+# with the worker which answered the request
+worker_pid = None
+
+REQUESTS = REGISTRY.counter("http_requests_total",
+                            "Processed requests",
+                            ("method", "route", "status"))
+REQUEST_DURATION = REGISTRY.histogram("http_request_duration_seconds",
+                                      "Duration of request processing",
+                                      ("method", "route"))
+
+# Queries of the server as (collection, filter, sort) for query plans
+def get_server_queries() -> List[tuple]:
+    """Return (collection, filter, sort) of the server queries"""
+    return [(posts, {"_id": "unique_id"}, None),
+            (posts, {"_id": {"$gt": "unique_id"}}, [("_id", 1)]),
+            (posts, {"user_id": ObjectId()}, None),
+            (users, {"_id": ObjectId()}, None),
+            (users, {"user_name": "user_name"}, None),
+            (users, {"user_name": {"$in": ["user_name"]}}, None),
+            (posts, {"number_of_votes": {"$gte": 100}},
+             [("number_of_votes", -1), ("_id", 1)]),
+            (posts, {"post_category": "category",
+                     "post_date": {"$gte": datetime.datetime(2021, 1, 1)}},
+             [("_id", 1)]),
+            (posts, {"post_date": {"$lte": datetime.datetime(2021, 1, 1)}},
+             [("post_date", 1), ("_id", 1)])
+            ]
+
+
+def get_plan_stages(plan: dict) -> List[str]:
+    """Get stages of query plan from the root to the leaf
+    "plan" - query plan in dict format
+    Return list of stages with index names.
+    """
+    stages = []
+    while plan:
+        stage = plan.get("stage", "")
+        if plan.get("indexName"):
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage")
+    return stages
+
+
+def print_query_plans() -> None:
+    """Print indexes of collections and query plans
+    of the server queries"""
+    for collection_name in (posts, users):
+        for index in connector.list_indexes(collection_name):
+            print(f"{collection_name.name} index: {index['name']} "
+                  f"{dict(index['key'])}"
+                  f"{' unique' if index.get('unique') else ''}")
+    for collection_name, search_filter, sort in get_server_queries():
+        plan = connector.explain(collection_name, search_filter, sort)
+        print(f"{collection_name.name} {search_filter} sort {sort}: "
+              f"{' <- '.join(get_plan_stages(plan))}")
+
+
+class BoundedThreadingHTTPServer(ThreadingHTTPServer):
+    """HTTP server with thread per connection which processes
+    at most "threads" requests at the same time. Idle keep-alive
+    connection waits for the next request in its own thread without
+    a slot, so it does not delay requests of other connections."""
+
+    # Connections waiting for accept, with the default 5 clients
+    # connecting at the same time repeat connection after a second
+    request_queue_size = 128
+
+    def __init__(self, server_address: tuple, handler_class, threads: int):
+        super(BoundedThreadingHTTPServer, self).__init__(server_address,
+                                                         handler_class)
+        # Slot is taken by the handler after the request headers are read
+        self.request_slots = threading.BoundedSemaphore(threads)
 
 
 class MyHandler(BaseHTTPRequestHandler):
     """The main http handler, routes requests by path
     and calls appropriate methods."""
 
+    # HTTP/1.1 keeps connection open between requests (keep-alive),
+    # idle connections are closed after "timeout" seconds
+    protocol_version = "HTTP/1.1"
+    timeout = 5
+    # Encoded documents are sent by chunks of at least this size in bytes
+    stream_chunk_size = 64 * 1024
     count_data_to_write = len(AllData.__slots__)
 
+    def handle_one_request(self):
+        """Reset response state, process single request of the connection
+        and record its duration and status"""
+        self.response_sent = False
+        self.response_status = None
+        self.command = None
+        self.slot_taken = False
+        start = time.perf_counter()
+        try:
+            super(MyHandler, self).handle_one_request()
+        finally:
+            if self.slot_taken:
+                self.server.request_slots.release()
+        if self.command and self.response_status:
+            route = self.get_route_from_request_path(self.path)
+            REQUEST_DURATION.observe(time.perf_counter() - start,
+                                     self.command, route)
+            REQUESTS.inc(self.command, route, str(self.response_status))
+
+    def parse_request(self):
+        """Take slot of the server after the request line and headers
+        are read, so slow client does not hold the slot, it is released
+        after the response in "handle_one_request" """
+        if not super(MyHandler, self).parse_request():
+            return False
+        request_slots = getattr(self.server, "request_slots", None)
+        if request_slots is not None:
+            request_slots.acquire()
+            self.slot_taken = True
+        return True
+
+    def send_response_only(self, code, message=None):
+        """Remember status of the response and send it"""
+        self.response_status = code
+        super(MyHandler, self).send_response_only(code, message)
+
+    @staticmethod
+    def get_route_from_request_path(path: str) -> str:
+        """Get route of the request to group metrics
+        "path" - request path
+        Return request path where unique id is replaced by "{id}".
+        """
+        route = urlsplit(path).path
+        if route in ("/posts/", "/posts/bulk", "/cache", "/metrics",
+                     "/stats", "/stats/rebuild", "/queue"):
+            return route
+        if route.startswith("/posts/"):
+            return "/posts/{id}"
+        return "other"
+
+    def log_message(self, format, *args):
+        """Write down access log to the server log file"""
+        logging.debug("%s - %s", self.address_string(), format % args)
+
     @staticmethod
     def get_unique_id_from_request_path(path: str) -> Union[str, None]:
         """Get unique id from request path
@@ -41,16 +247,178 @@ class MyHandler(BaseHTTPRequestHandler):
         Return "unique_id" in str format if it was found.
         Return "None" if it was not found.
         """
-        path_parts = path.split("/")
+        path_parts = urlsplit(path).path.split("/")
         unique_id = path_parts[2]
         if unique_id:
             return unique_id
         else:
             return None
 
+    @staticmethod
+    def get_query_from_request_path(path: str) -> dict:
+        """Get query parameters from request path
+        "path" - request path
+        Return query parameters in dict format, the last value is taken
+        for repeated parameter.
+        """
+        query = parse_qs(urlsplit(path).query)
+        return {key: values[-1] for key, values in query.items()}
+
+    @staticmethod
+    def get_page_parameters_from_query(query: dict) -> dict:
+        """Get parameters of the posts page from query parameters
+        "query" - query parameters of the request:
+        "limit" - maximum number of posts on the page, all posts
+        are streamed if it is not set,
+        "after" - unique id of the last post of the previous page,
+        "category" - category of posts,
+        "since", "until" - first and last date of posts (YYYY-MM-DD),
+        "min_votes" - minimum number of votes,
+        "sort" - fields to sort posts separated by comma, "-" before
+        field sorts in descending order,
+        "fields" - fields of posts separated by comma
+        Fields are checked by PostDataDB.__slots__ and UserDataDB.__slots__.
+        Return parameters of "find_all_joined" in dict format.
+        Raise "ValueError" if parameters are not correct.
+        """
+        limit = int(query.get("limit", 0))
+        if limit < 0:
+            raise ValueError("limit must not be negative")
+        conditions = []
+        if query.get("after"):
+            conditions.append(("_id", "gt", query["after"]))
+        if query.get("category"):
+            conditions.append(("post_category", "eq", query["category"]))
+        if query.get("since"):
+            conditions.append(("post_date", "gte", datetime.datetime.strptime(
+                query["since"], DATE_FORMAT)))
+        if query.get("until"):
+            conditions.append(("post_date", "lte", datetime.datetime.strptime(
+                query["until"], DATE_FORMAT)))
+        if query.get("min_votes"):
+            conditions.append(("number_of_votes", "gte",
+                               int(query["min_votes"])))
+
+        sort = []
+        for field in filter(None, query.get("sort", "").split(",")):
+            direction = -1 if field.startswith("-") else 1
+            sort.append((field.lstrip("-+"), direction))
+        fields = None
+        if query.get("fields"):
+            fields = query["fields"].split(",")
+        for field in [field for field, _ in sort] + (fields or []):
+            if field not in AllData.__slots__:
+                raise ValueError(f"unknown field: {field}")
+        if query.get("after") and sort:
+            raise ValueError("after is used only with default sort")
+        return {"conditions": conditions,
+                "limit": limit,
+                "sort": sort,
+                "fields": fields,
+                "foreign_fields": UserDataDB.__slots__,
+                "hidden_fields": [POST_COUNT]}
+
+    @staticmethod
+    def get_posts_version() -> str:
+        """Get version of "posts" collection, it is changed on every
+        change of posts or users data
+        Counter of changes starts again after data base is dropped,
+        so version also contains random epoch set with the counter.
+        Return version in str format.
+        """
+        counter = connector.find_one(counters, {"_id": "posts"})
+        if isinstance(counter, str):
+            raise ConnectionError(counter)
+        if counter is None or "epoch" not in counter:
+            counter = MyHandler.set_posts_epoch(counter)
+        return f"{counter['epoch']}.{counter.get('version', 0)}"
+
+    @staticmethod
+    def set_posts_epoch(counter: Union[dict, None]) -> dict:
+        """Set new random epoch of "posts" collection, counter of changes
+        is created if it was dropped
+        "counter" - counter of changes without epoch or "None"
+        Return counter with epoch in dict format.
+        """
+        epoch = uuid.uuid4().hex[:12]
+        connector.increment_one(counters, {"_id": "posts"}, {"version": 0},
+                                {"epoch": epoch})
+        return dict(counter or {"version": 0}, epoch=epoch)
+
+    @staticmethod
+    def increment_posts_version() -> None:
+        """Change version of "posts" collection after change
+        of posts or users data"""
+        connector.increment_one(counters, {"_id": "posts"}, {"version": 1})
+
+    @staticmethod
+    def is_query_flag_set(query: dict, name: str) -> bool:
+        """Check flag in query parameters
+        "query" - query parameters of the request
+        "name" - name of the flag
+        Return "True" if flag is passed with value other than "0"
+        or "false".
+        """
+        return query.get(name, "0").lower() not in ("0", "false")
+
+    def get_response_encoding(self) -> Union[str, None]:
+        """Choose content coding of the response by "Accept-Encoding"
+        header of the request
+        Return name of the content coding.
+        Return "None" if response is sent without coding.
+        """
+        return serialization.negotiate_encoding(
+            self.headers.get("Accept-Encoding"))
+
+    def is_pretty_response_requested(self) -> bool:
+        """Check "pretty" flag of the request to encode json with indents
+        Return "True" if flag is set.
+        """
+        query = self.get_query_from_request_path(self.path)
+        return self.is_query_flag_set(query, "pretty")
+
+    def make_etag(self, tag: str) -> str:
+        """Make strong entity tag of the response representation
+        "tag" - version or hash of the response data
+        Return entity tag which differs for every content coding.
+        """
+        encoding = self.get_response_encoding()
+        return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+    def etag_matches(self, etag: str) -> bool:
+        """Check "If-None-Match" header of the request
+        "etag" - entity tag of the current response data
+        Return "True" if client has the current response data.
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        client_etags = [client_etag.strip() for client_etag
+                        in if_none_match.split(",")]
+        # Weak comparison, the "W/" prefix is ignored
+        return etag in [client_etag[2:] if client_etag.startswith("W/")
+                        else client_etag for client_etag in client_etags]
+
+    @staticmethod
+    def update_statistics(method_name: str, *args) -> None:
+        """Call method of statistics to change it after change of data
+        Errors are only logged, statistics can be fixed by rebuild.
+        "method_name" - name of PostsStatistics method
+        "*args" - arguments of the method
+        """
+        if statistics is None:
+            return
+        try:
+            getattr(statistics, method_name)(*args)
+        except Exception as ex:
+            logging.error(ex)
+
     def verification_of_request_data(self,
                                      request_data: dict) -> Union[dict, None]:
         """Check request data by "key" in AllData.__slots__
+        and convert it to types of data base
         "request_data" - all data passed in the request
         Return "request_data" in dict format if data is correct.
         Return "None" if data is not correct.
@@ -60,7 +428,11 @@ class MyHandler(BaseHTTPRequestHandler):
         for attribute in AllData.__slots__:
             if attribute in request_data:
                 count_request_data += 1
-                data_for_db[attribute] = request_data[attribute]
+                try:
+                    data_for_db[attribute] = convert_to_db_type(
+                        attribute, request_data[attribute])
+                except ValueError:
+                    return None
         if count_request_data == self.count_data_to_write:
             return data_for_db
         else:
@@ -74,11 +446,14 @@ class MyHandler(BaseHTTPRequestHandler):
         "user_data" -  user data from "users" collection
         Add "user_id" field to connect to user in "users" collection.
         Return post data in dict format.
+        Raise "ValueError" if data can not be converted to types
+        of data base.
         """
         post_data_for_db = {}
         for attribute in PostDataDB.__slots__:
             if attribute in request_data:
-                post_data_for_db[attribute] = str(request_data[attribute])
+                post_data_for_db[attribute] = convert_to_db_type(
+                    attribute, request_data[attribute])
         post_data_for_db["user_id"] = user_data["_id"]
         return post_data_for_db
 
@@ -87,43 +462,45 @@ class MyHandler(BaseHTTPRequestHandler):
         """Get user data by "key" in UserDataDB.__slots__
         "request_data" - all data passed in the request
         Return user_data in dict format.
+        Raise "ValueError" if data can not be converted to types
+        of data base.
         """
         user_data_for_db = {}
         for attribute in UserDataDB.__slots__:
             if attribute in request_data:
-                user_data_for_db[attribute] = str(request_data[attribute])
+                user_data_for_db[attribute] = convert_to_db_type(
+                    attribute, request_data[attribute])
         return user_data_for_db
 
-    def get_data_from_db(self,
-                         unique_id: str) -> Union[dict, str, List[dict], None]:
+    def get_data_from_db(self, unique_id: str) -> Union[dict, str, None]:
         """Sequence of actions to get data from data base
         "unique_id" - unique id of the document in the "posts" collection
         Return all data by id in dict format if it was found.
         Return str "No data by unique_id" if post data by id was not found.
-        Return list of posts and users data in dict format, if unique id
-        was not found.
         Return "None" if there is no connection to database server.
+        Pages of posts are got by "get_posts_page".
         """
         try:
-            if unique_id:
-                all_data_by_id = {}
-                post_data_by_id = self.get_unique_data_from_db(posts,
-                                                               {"_id": unique_id})
-                if isinstance(post_data_by_id, str):
-                    return None
-                elif post_data_by_id:
-                    all_data_by_id = self.get_user_data_from_db(post_data_by_id)
+            all_data_by_id = post_cache.get(unique_id)
+            if all_data_by_id:
+                return all_data_by_id
+            all_data_by_id = {}
+            # Data changed while it is read is not saved to cache
+            cache_token = post_cache.read_token()
+            post_data_by_id = self.get_unique_data_from_db(posts,
+                                                           {"_id": unique_id})
+            if isinstance(post_data_by_id, str):
+                return None
+            elif post_data_by_id:
+                user_id = post_data_by_id.get("user_id")
+                all_data_by_id = self.get_user_data_from_db(post_data_by_id)
                 if all_data_by_id:
-                    return all_data_by_id
-                else:
-                    return "No data by unique_id"
+                    post_cache.set(unique_id, all_data_by_id, user_id,
+                                   cache_token)
+            if all_data_by_id:
+                return all_data_by_id
             else:
-                list_all_data_from_db = []
-                posts_data_from_db = connector.find_all(posts)
-                for post_data in posts_data_from_db:
-                    all_data_from_document = self.get_user_data_from_db(post_data)
-                    list_all_data_from_db.append(all_data_from_document)
-                return list_all_data_from_db
+                return "No data by unique_id"
         except Exception as ex:
             logging.error(ex)
             self.write_response(500)
@@ -161,7 +538,8 @@ class MyHandler(BaseHTTPRequestHandler):
             if "user_id" in post_data:
                 user_id = post_data["user_id"]
                 user_data_by_id = self.get_unique_data_from_db(users,
-                                    {"_id": ObjectId(user_id)}, {"_id": False})
+                                    {"_id": ObjectId(user_id)},
+                                    {"_id": False, POST_COUNT: False})
                 if user_data_by_id:
                     post_data.pop("user_id", None)
                     all_data.update(post_data)
@@ -174,26 +552,56 @@ class MyHandler(BaseHTTPRequestHandler):
             self.write_response(500)
 
     def write_data_and_response(self, post_data: dict,
-                                response_data: dict) -> None:
+                                response_data: dict, user: dict,
+                                user_inserted: bool = False) -> None:
         """Sequence of actions to write down data to data base
         and to generate a response
+        Post with existing unique id is not inserted, number of posts
+        of the user is decremented and user without posts is deleted.
         "post_data" - post data to insert into "posts" collection
         "response_data" - request response data
+        "user" - user data of the post
+        "user_inserted" - user of the post was inserted by the request
         """
         try:
             connector.insert_one(posts, post_data)
+            self.increment_posts_version()
+            self.update_statistics("add_posts",
+                                   [dict(post_data,
+                                         user_name=user["user_name"])],
+                                   [user] if user_inserted else [])
             self.write_response_with_data(201, response_data)
+        except DuplicateDataError:
+            # Post of the same user may be added by concurrent request,
+            # so user is deleted only if it has no posts as on DELETE
+            user_id = post_data["user_id"]
+            user_data = connector.find_one_and_increment(
+                users, {"_id": user_id}, {POST_COUNT: -1})
+            removed = bool(user_data and user_data.get(POST_COUNT, 0) <= 0
+                           and connector.delete_many(users,
+                                                     {"_id": user_id,
+                                                      POST_COUNT:
+                                                          {"$lte": 0}}))
+            # User inserted by this request is in statistics only
+            # if it stays for posts of concurrent requests
+            if removed and not user_inserted:
+                self.update_statistics("remove_posts", [], [user_data])
+            elif not removed and user_inserted:
+                self.update_statistics("add_posts", [], [user])
+            self.write_response_with_data(409, {'error': 'wrong _id'})
         except Exception as ex:
             logging.error(ex)
             self.write_response(500)
 
     def process_new_user_data_from_PUT_request(self, new_post_data: dict,
                                                new_user_data: dict,
-                                               unique_id: str) -> None:
+                                               unique_id: str,
+                                               old_post_data: dict) -> None:
         """Sequence of actions to process user data from PUT request
         "new_post_data" - post data passed in the PUT request
         "new_user_data" - user data passed in the PUT request
         "unique_id" - unique id of the document in the "posts" collection
+        "old_post_data" - post and user data before update
         """
         try:
             if "user_name" in new_user_data:
@@ -202,47 +610,294 @@ class MyHandler(BaseHTTPRequestHandler):
                 if not new_user_name:
                     self.update_post_and_user_document(new_post_data,
                                                        new_user_data,
-                                                       unique_id)
+                                                       unique_id,
+                                                       old_post_data)
                 else:
                     self.write_response_with_data(400, {'error': 'user exists'})
             else:
                 self.update_post_and_user_document(new_post_data, new_user_data,
-                                                   unique_id)
+                                                   unique_id, old_post_data)
         except Exception as ex:
             logging.error(ex)
             self.write_response(500)
 
     def update_post_and_user_document(self, new_post_data: dict,
                                       new_user_data: dict,
-                                      unique_id: str) -> None:
+                                      unique_id: str,
+                                      old_post_data: dict) -> None:
         """Sequence of actions to update post and user data
         and to generate a response
         "new_post_data" - post data passed in the PUT request
         "new_user_data" - user data passed in the PUT request
         "unique_id" - unique id of the document in the "posts" collection
+        "old_post_data" - post and user data before update
         """
         try:
-            connector.update_one(users, {'_id': new_post_data["user_id"]},
-                                 new_user_data)
-            new_post_data.pop("user_id", None)
+            user_id = new_post_data.pop("user_id", None)
+            connector.update_one(users, {'_id': user_id}, new_user_data)
+            # User data is changed in all posts of the user
+            post_cache.invalidate_tag(user_id)
             if new_post_data:
                 connector.update_one(posts, {'_id': unique_id}, new_post_data)
+                post_cache.invalidate(unique_id)
+            self.increment_posts_version()
+            self.update_statistics("update_post", user_id,
+                                   old_post_data,
+                                   dict(old_post_data, **new_post_data,
+                                        **new_user_data))
             self.write_response(200)
         except Exception as ex:
             logging.error(ex)
             self.write_response(500)
 
-    def insert_user_data_to_db(self, data_for_db: dict) -> Union[dict, None]:
-        """Sequence of actions to write down user data to data base
+    def insert_user_data_to_db(self, data_for_db: dict) -> tuple:
+        """Write down user data to data base if user does not exist
+        and increment number of posts of the user in single request
         "data_for_db" - all data passed in the request
-        Return inserted user data in dict format.
+        Return tuple of user data in dict format and flag
+        "user was inserted".
+        """
+        user_data = self.user_data_from_request_data(data_for_db)
+        return connector.find_one_and_upsert(users,
+                                             {"user_name":
+                                                  user_data["user_name"]},
+                                             user_data, {POST_COUNT: 1})
+
+    def get_posts_page(self) -> None:
+        """Sequence of actions to get page of posts from data base
+        and to generate a response
+        Posts are encoded one at a time straight from the data base cursor
+        if the query has "stream" parameter or has no "limit", so all
+        posts are never kept in memory. Page with "limit" and default
+        sort has "X-Next-After" header with "after" of the next page.
+        Query parameters are described in "get_page_parameters_from_query".
+        """
+        query = self.get_query_from_request_path(self.path)
+        try:
+            parameters = self.get_page_parameters_from_query(query)
+        except ValueError:
+            self.write_response_with_data(400, {'error': 'wrong query'})
+            return
+        try:
+            # Version is read before the data, so the data can be only
+            # newer than the entity tag
+            query_hash = hashlib.sha1(
+                urlsplit(self.path).query.encode('utf-8')).hexdigest()
+            etag = self.make_etag(f"{self.get_posts_version()}-"
+                                  f"{query_hash[:16]}")
+            if self.etag_matches(etag):
+                self.write_response_with_body(304, b"", headers={"ETag": etag})
+                return
+            # Filter, sort and projection are applied by data base
+            documents = connector.find_all_joined(posts, users, "user_id",
+                                                  **parameters)
+            if (self.is_query_flag_set(query, "stream")
+                    or not parameters["limit"]):
+                self.write_streamed_response_with_data(200, documents,
+                                                       {"ETag": etag})
+                return
+            documents = list(documents)
+        except ValueError as ex:
+            # Filter is not supported by data base
+            logging.error(ex)
+            self.write_response_with_data(400, {'error': 'wrong query'})
+            return
+        except Exception as ex:
+            logging.error(ex)
+            self.write_response(500)
+            return
+        headers = {"ETag": etag}
+        if (len(documents) == parameters["limit"]
+                and not parameters["sort"]):
+            headers["X-Next-After"] = documents[-1]["_id"]
+        self.write_response_with_data(200, documents, headers)
+
+    @staticmethod
+    def remove_user_posts(post_counts: Counter) -> List[dict]:
+        """Decrement numbers of posts of users in single bulk write
+        and delete users without posts
+        "post_counts" - numbers of removed posts by "_id" of the user
+        Return data of deleted users in dict format.
+        """
+        connector.increment_each(users, [({"_id": user_id},
+                                          {POST_COUNT: -count}, None)
+                                         for user_id, count
+                                         in post_counts.items()],
+                                 upsert=False)
+        orphan_filter = {"_id": {"$in": list(post_counts)},
+                         POST_COUNT: {"$lte": 0}}
+        orphans = connector.find_many(users, orphan_filter)
+        if orphans:
+            # Number of posts is checked again in case a post was added
+            # by concurrent request
+            orphan_filter["_id"]["$in"] = [user["_id"] for user in orphans]
+            connector.delete_many(users, orphan_filter)
+            for user in orphans:
+                post_cache.invalidate_tag(user["_id"])
+        return orphans
+
+    def delete_posts_from_db(self, conditions: List[tuple]) -> dict:
+        """Sequence of actions to delete all posts found by conditions
+        and users without posts in few bulk writes per batch of posts
+        "conditions" - list of (field, operator, value) to find posts
+        Return numbers of deleted posts and users in dict format.
+        """
+        deleted_posts = deleted_users = 0
+        search_filter = connector.make_filter(conditions)
+        while True:
+            batch = connector.find_many(posts, search_filter,
+                                        {"user_id": True,
+                                         "post_category": True,
+                                         "number_of_votes": True},
+                                        limit=DELETE_BATCH_SIZE)
+            if not batch:
+                return {"deleted_posts": deleted_posts,
+                        "deleted_users": deleted_users}
+            unique_ids = [post["_id"] for post in batch]
+            deleted_posts += connector.delete_many(posts,
+                                                   {"_id": {"$in": unique_ids}})
+            for unique_id in unique_ids:
+                post_cache.invalidate(unique_id)
+            self.increment_posts_version()
+            orphans = self.remove_user_posts(Counter(post["user_id"]
+                                                     for post in batch))
+            deleted_users += len(orphans)
+            self.update_statistics("remove_posts", batch, orphans)
+
+    @staticmethod
+    def get_records_from_request_body(request_body: str) -> list:
+        """Get records from request body with json array
+        or newline delimited json (one record per line)
+        "request_body" - decoded request body
+        Return list of records.
+        Raise "ValueError" if request body is not correct json.
+        """
+        request_body = request_body.strip()
+        if request_body.startswith("["):
+            return json.loads(request_body)
+        return [json.loads(line) for line in request_body.splitlines()
+                if line.strip()]
+
+    def insert_bulk_data_to_db(self, records: list) -> List[dict]:
+        """Sequence of actions to write down many records to data base
+        in few bulk writes
+        "records" - all data passed in the request
+        Every record is checked as the data of the single POST request.
+        Return status of every record in the same order: 201 if record
+        was inserted, 400 if data is not correct, 409 if record
+        with the same unique id exists.
+        """
+        statuses = []
+        records_for_db = {}
+        unique_ids = set()
+        for index, record in enumerate(records):
+            data_for_db = None
+            status = {"_id": None}
+            if isinstance(record, dict):
+                data_for_db = self.verification_of_request_data(record)
+                status["_id"] = str(record.get("_id"))
+            if not data_for_db:
+                status.update(status=400, error='wrong data')
+            elif status["_id"] in unique_ids:
+                status.update(status=409, error='wrong _id')
+            else:
+                unique_ids.add(status["_id"])
+                records_for_db[index] = data_for_db
+            statuses.append(status)
+
+        errors = self.write_bulk_data_to_db(list(records_for_db.values()))
+        for position, index in enumerate(records_for_db):
+            error = errors.get(position)
+            if error is None:
+                statuses[index]["status"] = 201
+            elif isinstance(error, DuplicateDataError):
+                statuses[index].update(status=409, error='wrong _id')
+            else:
+                logging.error(error)
+                statuses[index].update(status=500, error='not inserted')
+        return statuses
+
+    @staticmethod
+    def write_bulk_data_to_db(records_for_db: List[dict]) -> dict:
+        """Write down checked records to data base in few bulk writes
+        "records_for_db" - records converted to types of data base,
+        unique ids of records are different
+        Return errors of not inserted records by position in the list.
+        """
+        if not records_for_db:
+            return {}
+        users_data = {}
+        post_counts = Counter()
+        for data_for_db in records_for_db:
+            user_data = MyHandler.user_data_from_request_data(data_for_db)
+            users_data.setdefault(user_data["user_name"], user_data)
+            post_counts[user_data["user_name"]] += 1
+        users_list = list(users_data.values())
+        inserted_users = [users_list[index] for index in
+                          connector.upsert_many(users, "user_name",
+                                                users_list,
+                                                [{POST_COUNT:
+                                                      post_counts[user_name]}
+                                                 for user_name in users_data])]
+        users_by_name = {user["user_name"]: user for user in
+                         connector.find_many(users,
+                                             {"user_name":
+                                                  {"$in": list(users_data)}},
+                                             {"user_name": True})}
+
+        posts_data = [MyHandler.post_data_from_request_data(
+            data_for_db, users_by_name[str(data_for_db["user_name"])])
+            for data_for_db in records_for_db]
+        errors = connector.insert_many(posts, posts_data)
+        if len(errors) < len(posts_data):
+            MyHandler.increment_posts_version()
+        MyHandler.update_statistics(
+            "add_posts",
+            [dict(post_data, user_name=data_for_db["user_name"])
+             for position, (post_data, data_for_db)
+             in enumerate(zip(posts_data, records_for_db))
+             if position not in errors],
+            [dict(user_data, _id=users_by_name[user_data["user_name"]]["_id"])
+             for user_data in inserted_users])
+        if errors:
+            # Posts were counted before insert
+            not_inserted = Counter(posts_data[position]["user_id"]
+                                   for position in errors)
+            MyHandler.remove_user_posts(not_inserted)
+        return errors
+
+    def enqueue_data_and_response(self, data_for_db: dict,
+                                  response_data: dict) -> None:
+        """Pass checked post to the write-behind queue and create
+        response: 202 if post was accepted, 503 if queue is full
+        Existence of the post is checked on write, so accepted post
+        with existing unique id is only reported in the server log.
+        "data_for_db" - data converted to types of data base
+        "response_data" - response data with unique id of the post
         """
+        if write_queue.put(data_for_db):
+            self.write_response_with_data(202, response_data)
+        else:
+            self.write_response_with_data(503, {'error': 'queue is full'},
+                                          {"Retry-After": "1"})
+
+    def process_bulk_POST_request(self) -> None:
+        """Sequence of actions to write down many records passed
+        in the POST request and to generate a response with status
+        of every record"""
+        content_len = int(self.headers.get('Content-Length'))
+        request_body = self.rfile.read(content_len).decode("utf-8")
         try:
-            user_data = self.user_data_from_request_data(data_for_db)
-            connector.insert_one(users, user_data)
-            user = self.get_unique_data_from_db(users,
-                                                {"user_name": data_for_db["user_name"]})
-            return user
+            records = self.get_records_from_request_body(request_body)
+        except ValueError:
+            self.write_response_with_data(400, {'error': 'wrong data'})
+            return
+        if not isinstance(records, list):
+            self.write_response_with_data(400, {'error': 'wrong data'})
+            return
+        try:
+            statuses = self.insert_bulk_data_to_db(records)
+            self.write_response_with_data(200, statuses)
         except Exception as ex:
             logging.error(ex)
             self.write_response(500)
@@ -250,42 +905,94 @@ class MyHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         """Process GET requests"""
         if self.path.startswith('/posts/'):
-            self.send_response(200)
-            self.end_headers()
             unique_id = self.get_unique_id_from_request_path(self.path)
+            if not unique_id:
+                self.get_posts_page()
+                return
             try:
                 result = self.get_data_from_db(unique_id)
                 if isinstance(result, dict):
-                    self.write_response_with_data(200, result)
-                elif isinstance(result, list):
-                    self.write_response_with_data(200, result)
+                    self.write_response_with_data(200, result, etag=True)
                 else:
                     raise Exception
             except Exception as ex:
                 logging.error(ex)
                 self.write_response(404)
+        elif self.path == '/cache':
+            self.write_worker_status(post_cache.statistics())
+        elif self.path == '/queue':
+            if write_queue is None:
+                self.write_response_with_data(404, {'error': 'write-behind '
+                                                             'mode is off'})
+            else:
+                self.write_worker_status(write_queue.status())
+        elif urlsplit(self.path).path == '/stats':
+            if statistics is None:
+                self.write_response_with_data(501, {'error': 'not supported '
+                                                             'by data base'})
+                return
+            query = self.get_query_from_request_path(self.path)
+            try:
+                top = int(query.get("top", 10))
+            except ValueError:
+                self.write_response_with_data(400, {'error': 'wrong query'})
+                return
+            try:
+                self.write_response_with_data(200,
+                                              statistics.get_summary(top))
+            except Exception as ex:
+                logging.error(ex)
+                self.write_response(500)
+        elif self.path == '/metrics':
+            self.write_response_with_body(200, REGISTRY.exposition(),
+                                          "text/plain; version=0.0.4")
         else:
             self.write_response_with_data(400, {'error': 'wrong path'})
 
     def do_DELETE(self):
         """Process DELETE requests"""
-        if self.path.startswith('/posts/'):
-            self.send_response(200)
-            self.end_headers()
+        if urlsplit(self.path).path == '/posts/':
+            query = self.get_query_from_request_path(self.path)
+            try:
+                conditions = self.get_page_parameters_from_query(
+                    query)["conditions"]
+            except ValueError:
+                self.write_response_with_data(400, {'error': 'wrong query'})
+                return
+            if not conditions:
+                # Filter is required not to delete all posts by mistake
+                self.write_response_with_data(400, {'error': 'no filter'})
+                return
+            try:
+                self.write_response_with_data(
+                    200, self.delete_posts_from_db(conditions))
+            except ValueError as ex:
+                logging.error(ex)
+                self.write_response_with_data(400, {'error': 'wrong query'})
+            except Exception as ex:
+                logging.error(ex)
+                self.write_response(500)
+        elif self.path.startswith('/posts/'):
             unique_id = self.get_unique_id_from_request_path(self.path)
             try:
-                result = self.get_data_from_db(unique_id)
-                if isinstance(result, dict):
-                    post_content_by_id = self.get_unique_data_from_db(posts,
-                                                                      {"_id": unique_id})
-                    user_id = post_content_by_id["user_id"]
-                    connector.delete_one(posts, {"_id": unique_id})
-
-                    # Check to delete user data
-                    post_content_by_user_id = self.get_unique_data_from_db(posts,
-                                                                           {"user_id": user_id})
-                    if not post_content_by_user_id:
-                        connector.delete_one(users, {"_id": user_id})
+                post_data = connector.find_one_and_delete(posts,
+                                                          {"_id": unique_id})
+                if post_data:
+                    post_cache.invalidate(unique_id)
+                    self.increment_posts_version()
+
+                    # User is deleted with the last post
+                    user_id = post_data["user_id"]
+                    user_data = connector.find_one_and_increment(
+                        users, {"_id": user_id}, {POST_COUNT: -1})
+                    removed_users = []
+                    if user_data and user_data.get(POST_COUNT, 0) <= 0:
+                        if connector.delete_many(users, {"_id": user_id,
+                                                         POST_COUNT:
+                                                             {"$lte": 0}}):
+                            removed_users.append(user_data)
+                    self.update_statistics("remove_posts",
+                                           [post_data], removed_users)
                     self.write_response(200)
                 else:
                     self.write_response(404)
@@ -297,9 +1004,20 @@ class MyHandler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         """Process POST requests"""
-        if self.path == "/posts/":
-            self.send_response(201)
-            self.end_headers()
+        if self.path == "/posts/bulk":
+            self.process_bulk_POST_request()
+        elif self.path == "/stats/rebuild":
+            if statistics is None:
+                self.write_response_with_data(501, {'error': 'not supported '
+                                                             'by data base'})
+                return
+            try:
+                statistics.rebuild()
+                self.write_response(200)
+            except Exception as ex:
+                logging.error(ex)
+                self.write_response(500)
+        elif self.path == "/posts/":
             response_data = {}
             content_len = int(self.headers.get('Content-Length'))
             request_post_data = str(self.rfile.read(content_len).decode("utf-8"))
@@ -307,30 +1025,27 @@ class MyHandler(BaseHTTPRequestHandler):
             unique_id = str(post_data_dict.get("_id"))
             if unique_id:
                 response_data["_id"] = unique_id
-                result = self.get_data_from_db(unique_id)
-                if isinstance(result, dict):
-                    self.write_response_with_data(409, {'error': 'wrong _id'})
-                elif result is None:
-                    self.write_response(404)
-                elif isinstance(result, str):
-                    if len(post_data_dict) >= self.count_data_to_write:
-                        data_for_db = self.verification_of_request_data(post_data_dict)
-                        if data_for_db:
-                            try:
-                                user = self.get_unique_data_from_db(users,
-                                        {"user_name": data_for_db["user_name"]})
-                                if not user:
-                                    user = self.insert_user_data_to_db(data_for_db)
-                                post_data = self.post_data_from_request_data(data_for_db, user)
-                                self.write_data_and_response(post_data,
-                                                             response_data)
-                            except Exception as ex:
-                                logging.error(ex)
-                                self.write_response(500)
-                        else:
-                            self.write_response_with_data(400, {'error': 'wrong data'})
+                if len(post_data_dict) >= self.count_data_to_write:
+                    data_for_db = self.verification_of_request_data(post_data_dict)
+                    if data_for_db and write_queue is not None:
+                        self.enqueue_data_and_response(data_for_db,
+                                                       response_data)
+                    elif data_for_db:
+                        try:
+                            # Existence of the post is checked by unique
+                            # index of data base on insert
+                            user, user_inserted = self.insert_user_data_to_db(data_for_db)
+                            post_data = self.post_data_from_request_data(data_for_db, user)
+                            self.write_data_and_response(post_data,
+                                                         response_data, user,
+                                                         user_inserted)
+                        except Exception as ex:
+                            logging.error(ex)
+                            self.write_response(500)
                     else:
-                        self.write_response_with_data(400, {'error': 'wrong data amount'})
+                        self.write_response_with_data(400, {'error': 'wrong data'})
+                else:
+                    self.write_response_with_data(400, {'error': 'wrong data amount'})
             else:
                 self.write_response_with_data(400, {'error': 'wrong data'})
         else:
@@ -339,8 +1054,6 @@ class MyHandler(BaseHTTPRequestHandler):
     def do_PUT(self):
         """Process PUT requests"""
         if self.path.startswith('/posts/'):
-            self.send_response(200)
-            self.end_headers()
             content_len = int(self.headers.get('Content-Length'))
             request_post_data = str(self.rfile.read(content_len).decode("utf-8"))
             new_data_dict = json.loads(request_post_data)
@@ -361,16 +1074,25 @@ class MyHandler(BaseHTTPRequestHandler):
                             if new_user_data:
                                 self.process_new_user_data_from_PUT_request(new_post_data,
                                                                             new_user_data,
-                                                                            unique_id)
+                                                                            unique_id,
+                                                                            old_post_data)
                             else:
-                                new_post_data.pop("user_id", None)
+                                user_id = new_post_data.pop("user_id", None)
                                 connector.update_one(posts, {'_id': unique_id},
                                                      new_post_data)
+                                post_cache.invalidate(unique_id)
+                                self.increment_posts_version()
+                                self.update_statistics("update_post",
+                                                       user_id, old_post_data,
+                                                       dict(old_post_data,
+                                                            **new_post_data))
                                 self.write_response(200)
                         else:
                             self.write_response(404)
                     else:
                         raise Exception
+            except ValueError:
+                self.write_response_with_data(400, {'error': 'wrong data'})
             except Exception as ex:
                 logging.error(ex)
                 self.write_response(404)
@@ -381,21 +1103,250 @@ class MyHandler(BaseHTTPRequestHandler):
         """Сreate response as status
         "status" - request response status
         """
-        self.send_response_only(status)
-        self.end_headers()
+        self.write_response_with_body(status, b"")
 
     def write_response_with_data(self, status: int,
-                                 data: Union[dict, List[dict]]):
+                                 data: Union[dict, List[dict]],
+                                 headers: dict = None, etag: bool = False):
         """Сreate response with data as json
+        Json is compact unless "pretty" flag is set in the request.
+        Response without body (304) is created if client has the same
+        data by entity tag.
         "status" - request response status
         "data' - request response data
+        "headers" - additional response headers
+        "etag" - add strong entity tag by hash of the response body
+        """
+        body = serialization.dumps(data, self.is_pretty_response_requested())
+        if etag:
+            headers = dict(headers or {})
+            headers["ETag"] = self.make_etag(hashlib.sha1(body).hexdigest())
+            if self.etag_matches(headers["ETag"]):
+                self.write_response_with_body(304, b"", headers=headers)
+                return
+        self.write_response_with_body(status, body, "application/json",
+                                      headers)
+
+    def write_worker_status(self, status: dict) -> None:
+        """Create response with status of cache or queue of this process,
+        process id of the worker is added with several workers
+        "status" - status in dict format
+        """
+        if worker_pid is not None:
+            status = dict(status, worker=worker_pid)
+        self.write_response_with_data(200, status)
+
+    def write_response_with_body(self, status: int, body: bytes,
+                                 content_type: str = None,
+                                 headers: dict = None):
+        """Send status, headers and body of the response
+        Only the first response for the request is sent.
+        Body with content type is compressed if client accepts it.
+        "status" - request response status
+        "body" - encoded response body
+        "content_type" - value of the "Content-Type" header
+        "headers" - additional response headers
         """
-        body = json.dumps(data, indent=4).encode('utf-8')
-        self.write_response(status)
-        self.wfile.write(body)
+        if self.response_sent:
+            return
+        self.response_sent = True
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Vary", "Accept-Encoding")
+            encoding = self.get_response_encoding()
+            if encoding and len(body) >= serialization.MIN_COMPRESS_SIZE:
+                body = serialization.compress(body, encoding)
+                self.send_header("Content-Encoding", encoding)
+        elif status == 304:
+            # Caches match the validator with the same headers as the
+            # full response
+            self.send_header("Vary", "Accept-Encoding")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
         self.wfile.flush()
 
+    def write_streamed_response_with_data(self, status: int,
+                                          documents: Iterable[dict],
+                                          headers: dict = None):
+        """Сreate response with json array of documents encoded one
+        at a time and sent with chunked transfer encoding
+        Connection is closed without last chunk if "documents" fail,
+        so the client can detect incomplete response.
+        Body is compressed on the fly if client accepts it.
+        "status" - request response status
+        "documents" - iterable of request response documents
+        "headers" - additional response headers
+        """
+        if self.response_sent:
+            return
+        self.response_sent = True
+        chunked = self.request_version == "HTTP/1.1"
+        pretty = self.is_pretty_response_requested()
+        encoding = self.get_response_encoding()
+        compressor = serialization.Compressor(encoding) if encoding else None
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            # HTTP/1.0 clients read the body until connection is closed
+            self.close_connection = True
+        self.end_headers()
+        buffer = bytearray(b"[")
+        try:
+            for number, document in enumerate(documents):
+                if number:
+                    buffer += b","
+                buffer += serialization.dumps(document, pretty)
+                if len(buffer) >= self.stream_chunk_size:
+                    self.write_chunk(bytes(buffer), chunked, compressor)
+                    buffer.clear()
+        except Exception as ex:
+            logging.error(ex)
+            self.close_connection = True
+            return
+        buffer += b"]"
+        self.write_chunk(bytes(buffer), chunked, compressor)
+        if compressor:
+            self.write_chunk(compressor.flush(), chunked)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, data: bytes, chunked: bool,
+                    compressor: serialization.Compressor = None):
+        """Send part of the response body
+        "data" - part of the body
+        "chunked" - frame data as chunk of chunked transfer encoding
+        "compressor" - compress data before sending
+        """
+        if compressor:
+            data = compressor.compress(data)
+        if not data:
+            # Empty chunk marks the end of the body
+            return
+        if chunked:
+            data = b"%X\r\n%s\r\n" % (len(data), data)
+        self.wfile.write(data)
+
+
+parser = argparse.ArgumentParser(description='RESTful server for posts data')
+parser.add_argument('--host', type=str,
+                    default='127.0.0.1',
+                    help='Address to listen on')
+parser.add_argument('--port', type=int,
+                    default=8087,
+                    help='Port to listen on')
+parser.add_argument('--threads', type=int,
+                    default=16,
+                    help='Number of requests processed at the same '
+                         'time, 1 processes requests one at a time. Every '
+                         'connection has its own thread, idle keep-alive '
+                         'connections do not take place of requests')
+parser.add_argument('--keep_alive', type=int,
+                    default=MyHandler.timeout,
+                    help='Seconds to keep idle connection open')
+parser.add_argument('--cache_size', type=int,
+                    help=f'Maximum number of posts in cache, 0 disables '
+                         f'cache (default {post_cache.max_size} with one '
+                         f'worker and 0 with several workers, cache '
+                         f'of worker is not invalidated by writes of other '
+                         f'workers)')
+parser.add_argument('--cache_ttl', type=float,
+                    default=post_cache.ttl,
+                    help='Seconds to keep post in cache')
+parser.add_argument('--database', type=str,
+                    choices=['mongodb', 'sqlite', 'postgresql'],
+                    default='mongodb',
+                    help='Data base to store posts, SQLite data base '
+                         'is the file "posts_data.sqlite3"')
+parser.add_argument('--explain', action='store_true',
+                    help='Print indexes and query plans of the server '
+                         'queries and exit')
+parser.add_argument('--write_behind', action='store_true',
+                    help='Answer POST /posts/ with 202 after check of data '
+                         'and write posts to data base in background '
+                         'batches')
+parser.add_argument('--write_queue_size', type=int,
+                    default=10000,
+                    help='Maximum number of posts waiting for write, '
+                         'POST /posts/ is answered with 503 when queue '
+                         'is full')
+parser.add_argument('--write_batch_size', type=int,
+                    default=1000,
+                    help='Maximum number of posts written at once')
+parser.add_argument('--write_delay', type=float,
+                    default=0.5,
+                    help='Seconds the first post of batch waits for other '
+                         'posts')
+parser.add_argument('--workers', type=int,
+                    default=1,
+                    help='Number of processes handling requests on the same '
+                         'port, SIGHUP restarts them, SIGTERM stops them '
+                         'after requests in progress. GET /metrics, /cache '
+                         'and /queue show only the worker which answered, '
+                         'it is marked by process id')
+
+
+def run_worker(server: BoundedThreadingHTTPServer,
+               args: argparse.Namespace) -> None:
+    """Connect to data base and handle requests until SIGTERM or SIGINT,
+    then finish requests in progress and write down queued posts
+    "server" - server with listening socket
+    "args" - command line arguments
+    """
+    global post_cache, write_queue, worker_pid
+    if args.workers > 1:
+        worker_pid = os.getpid()
+        REGISTRY.set_labels(worker=str(worker_pid))
+    connect_to_db(args.database)
+    post_cache = LRUCache(args.cache_size, args.cache_ttl)
+    if args.write_behind:
+        write_queue = WriteBehindQueue(MyHandler.write_bulk_data_to_db,
+                                       args.write_queue_size,
+                                       args.write_batch_size,
+                                       args.write_delay)
+
+    def stop(signum, frame):
+        # "shutdown" waits for "serve_forever" loop of this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if write_queue is not None:
+            # Accepted posts are written down before exit
+            write_queue.close()
+
 
 if __name__ == '__main__':
-    server = HTTPServer(('127.0.0.1', 8087), MyHandler)
-    server.serve_forever()
+    args = parser.parse_args()
+    if args.explain:
+        connect_to_db(args.database)
+        print_query_plans()
+        sys.exit()
+    if args.cache_size is None:
+        args.cache_size = post_cache.max_size if args.workers == 1 else 0
+    MyHandler.timeout = args.keep_alive
+    # Workers accept connections on the listening socket inherited
+    # from the parent process, data base is connected after fork
+    server = BoundedThreadingHTTPServer((args.host, args.port), MyHandler,
+                                        args.threads)
+    if args.workers == 1:
+        run_worker(server, args)
+    else:
+        PreforkServer(lambda: run_worker(server, args), args.workers).run()
+        server.server_close()
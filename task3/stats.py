@@ -0,0 +1,235 @@
+"""Statistics of posts and users kept in materialized summary
+collections, updated incrementally on every change of data"""
+from collections import Counter
+from typing import Iterable, List
+
+from pymongo import collection
+
+from db_connectors.mongo import MongodbService
+
+SUMMARY_ID = "summary"
+
+# Lower bounds of distribution buckets for $bucket aggregation stage
+BUCKET_BOUNDARIES = ([-10 ** 18, 0, 1]
+                     + [10 ** power for power in range(1, 16)]
+                     + [10 ** 18])
+
+
+def bucket_label(value: int) -> str:
+    """Get name of distribution bucket of the value
+    Return "<0", "0", "1-9", "10-99", "100-999" and so on.
+    """
+    if value < 0:
+        return "<0"
+    if value == 0:
+        return "0"
+    digits = len(str(int(value)))
+    return f"{10 ** (digits - 1)}-{10 ** digits - 1}"
+
+
+def bucket_stage(group_by: str) -> dict:
+    """Make $bucket aggregation stage which counts documents
+    by distribution buckets of the field
+    "group_by" - field expression, for example "$number_of_votes"
+    """
+    return {"$bucket": {"groupBy": group_by,
+                        "boundaries": BUCKET_BOUNDARIES,
+                        "default": "other",
+                        "output": {"count": {"$sum": 1}}}}
+
+
+def encode_key(value) -> str:
+    """Make field name from value, "." and "$" are not allowed
+    in field names"""
+    return str(value).replace(".", "．").replace("$", "＄")
+
+
+def decode_key(key: str) -> str:
+    """Get value from field name made by "encode_key" """
+    return key.replace("．", ".").replace("＄", "$")
+
+
+class PostsStatistics:
+    """Number of posts and users, posts by category, distributions
+    of votes and karma and top authors.
+    Summary is a single document, authors are documents with number
+    of posts and votes of every user."""
+
+    def __init__(self, connector: MongodbService,
+                 posts: collection.Collection, users: collection.Collection,
+                 summary_collection: collection.Collection,
+                 authors_collection: collection.Collection):
+        self._connector = connector
+        self._posts = posts
+        self._users = users
+        self._summary = summary_collection
+        self._authors = authors_collection
+
+    @staticmethod
+    def post_increments(post: dict, sign: int) -> Counter:
+        """Get changes of summary fields for the post
+        "post" - post data
+        "sign" - 1 to add post, -1 to remove post
+        """
+        return Counter({
+            "posts": sign,
+            f"categories.{encode_key(post['post_category'])}": sign,
+            f"votes.{bucket_label(post['number_of_votes'])}": sign})
+
+    @staticmethod
+    def user_increments(user: dict, sign: int) -> Counter:
+        """Get changes of summary fields for the user
+        "user" - user data
+        "sign" - 1 to add user, -1 to remove user
+        """
+        return Counter({"users": sign,
+                        f"karma.{bucket_label(user['user_karma'])}": sign})
+
+    def apply(self, increments: Counter, authors: dict) -> None:
+        """Write down changes of statistics
+        "increments" - changes of summary fields
+        "authors" - changes of authors by user "_id" as tuple
+        of changes of "posts" and "votes" fields and new user name
+        """
+        increments = {field: amount for field, amount in increments.items()
+                      if amount}
+        if increments:
+            self._connector.increment_one(self._summary,
+                                          {"_id": SUMMARY_ID}, increments)
+        author_increments = []
+        for user_id, (amounts, user_name) in authors.items():
+            amounts = {field: amount for field, amount in amounts.items()
+                       if amount}
+            new_values = {"user_name": user_name} if user_name else None
+            if amounts or new_values:
+                author_increments.append(({"_id": user_id}, amounts,
+                                          new_values))
+        self._connector.increment_each(self._authors, author_increments)
+
+    def add_posts(self, posts: Iterable[dict],
+                  inserted_users: Iterable[dict] = ()) -> None:
+        """Add inserted posts and users to statistics
+        "posts" - post data with "user_id" and "user_name" fields
+        "inserted_users" - data of users inserted with the posts
+        """
+        increments = Counter()
+        authors = {}
+        for post in posts:
+            increments.update(self.post_increments(post, 1))
+            amounts, _ = authors.setdefault(post["user_id"],
+                                            (Counter(), post["user_name"]))
+            amounts.update({"posts": 1, "votes": post["number_of_votes"]})
+        for user in inserted_users:
+            increments.update(self.user_increments(user, 1))
+        self.apply(increments, authors)
+
+    def remove_posts(self, posts: Iterable[dict],
+                     removed_users: Iterable[dict] = ()) -> None:
+        """Remove deleted posts and users from statistics
+        "posts" - post data with "user_id" field
+        "removed_users" - data of users deleted with the posts
+        """
+        increments = Counter()
+        authors = {}
+        for post in posts:
+            increments.update(self.post_increments(post, -1))
+            amounts, _ = authors.setdefault(post["user_id"],
+                                            (Counter(), None))
+            amounts.update({"posts": -1, "votes": -post["number_of_votes"]})
+        removed_ids = []
+        for user in removed_users:
+            increments.update(self.user_increments(user, -1))
+            authors.pop(user["_id"], None)
+            removed_ids.append(user["_id"])
+        self.apply(increments, authors)
+        for user_id in removed_ids:
+            self._connector.delete_one(self._authors, {"_id": user_id})
+
+    def update_post(self, user_id, old_data: dict, new_data: dict) -> None:
+        """Change statistics for updated post and user
+        "user_id" - "_id" of the user of the post
+        "old_data" - post and user data before update
+        "new_data" - post and user data after update
+        """
+        increments = self.post_increments(old_data, -1)
+        increments.update(self.post_increments(new_data, 1))
+        increments.update(self.user_increments(old_data, -1))
+        increments.update(self.user_increments(new_data, 1))
+        user_name = new_data["user_name"]
+        authors = {user_id: (Counter({"votes": new_data["number_of_votes"]
+                                      - old_data["number_of_votes"]}),
+                             user_name if user_name != old_data["user_name"]
+                             else None)}
+        self.apply(increments, authors)
+
+    def rebuild(self) -> None:
+        """Calculate all statistics from "posts" and "users" collections
+        by aggregation pipelines"""
+        posts, users = self._posts, self._users
+        categories = self._connector.aggregate(
+            posts, [{"$group": {"_id": "$post_category",
+                                "count": {"$sum": 1}}}])
+        votes = self._connector.aggregate(
+            posts, [bucket_stage("$number_of_votes")])
+        karma = self._connector.aggregate(
+            users, [bucket_stage("$user_karma")])
+        summary = {
+            "posts": sum(item["count"] for item in categories),
+            "users": sum(item["count"] for item in karma),
+            "categories": {encode_key(item["_id"]): item["count"]
+                           for item in categories},
+            "votes": self.bucket_counts(votes),
+            "karma": self.bucket_counts(karma)}
+        self._connector.update_one(self._summary, {"_id": SUMMARY_ID},
+                                   summary, upsert=True)
+        self._connector.aggregate(posts, [
+            {"$group": {"_id": "$user_id",
+                        "posts": {"$sum": 1},
+                        "votes": {"$sum": "$number_of_votes"}}},
+            {"$lookup": {"from": users.name,
+                         "localField": "_id",
+                         "foreignField": "_id",
+                         "as": "user"}},
+            {"$project": {"user_name": {"$arrayElemAt": ["$user.user_name",
+                                                         0]},
+                          "posts": True,
+                          "votes": True}},
+            {"$out": self._authors.name}])
+
+    @staticmethod
+    def bucket_counts(buckets: List[dict]) -> dict:
+        """Get counts by bucket name from result of $bucket stage"""
+        return {bucket_label(item["_id"]) if item["_id"] != "other"
+                else "other": item["count"] for item in buckets}
+
+    def ensure_summary(self) -> None:
+        """Calculate statistics from collections if summary does not
+        exist yet, for example for data written by previous versions"""
+        summary = self._connector.find_one(self._summary,
+                                           {"_id": SUMMARY_ID})
+        if isinstance(summary, str):
+            raise ConnectionError(summary)
+        if summary is None:
+            self.rebuild()
+
+    def get_summary(self, top: int) -> dict:
+        """Get statistics from summary document and top authors
+        "top" - number of authors with most posts
+        Return statistics in dict format.
+        """
+        summary = self._connector.find_one(self._summary,
+                                           {"_id": SUMMARY_ID})
+        if isinstance(summary, str):
+            raise ConnectionError(summary)
+        summary = summary or {}
+        summary.pop("_id", None)
+        summary["categories"] = {decode_key(key): count for key, count
+                                 in summary.get("categories", {}).items()
+                                 if count}
+        for field in ("votes", "karma"):
+            summary[field] = {key: count for key, count
+                              in summary.get(field, {}).items() if count}
+        summary["top_authors"] = self._connector.find_many(
+            self._authors, {"posts": {"$gt": 0}}, {"_id": False},
+            limit=top, sort=[("posts", -1), ("votes", -1)])
+        return summary
@@ -0,0 +1,113 @@
+"""Fixtures of the tests. Modules are imported from the "task3" directory
+as the scripts import them."""
+import os
+import sys
+import json
+import threading
+import http.client
+
+from collections import Counter
+from typing import List
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+
+def make_records(count: int, users_number: int = 10) -> List[dict]:
+    """Return "count" records with all data of post and its author"""
+    return [{"_id": f"post{number:06d}",
+             "post_url": f"https://www.reddit.com/r/test/comments/{number}",
+             "user_name": f"user_{number % users_number}",
+             "user_karma": 1000 + number % users_number,
+             "user_cake_day": "2015-06-01",
+             "post_karma": 700 + number % users_number,
+             "comment_karma": 300 + number % users_number,
+             "post_date": f"2021-10-{1 + number % 28:02d}",
+             "number_of_comments": number % 500,
+             "number_of_votes": number % 5000,
+             "post_category": f"category_{number % 20}"}
+            for number in range(count)]
+
+
+class CountingConnector:
+    """Connector which counts calls of its methods by method name"""
+
+    def __init__(self, connector):
+        self.connector = connector
+        self.calls = Counter()
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.connector, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            return attribute(*args, **kwargs)
+        return call
+
+
+class Client:
+    """Keep-alive client of the test server"""
+
+    def __init__(self, port: int):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port,
+                                                     timeout=10)
+
+    def request(self, method: str, path: str, data=None,
+                headers: dict = None) -> tuple:
+        """Send request, "data" is encoded to json
+        Return status and decoded json body or "None".
+        """
+        status, _, content = self.request_raw(method, path, data, headers)
+        return status, json.loads(content) if content else None
+
+    def request_raw(self, method: str, path: str, data=None,
+                    headers: dict = None) -> tuple:
+        """Send request, "data" is encoded to json
+        Return status, headers and body of the response.
+        """
+        body = None if data is None else json.dumps(data).encode('utf-8')
+        self.connection.request(method, path, body, headers or {})
+        response = self.connection.getresponse()
+        return response.status, response.headers, response.read()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Server module connected to SQLite data base in the temporary
+    directory, post cache is empty"""
+    monkeypatch.chdir(tmp_path)
+    import server
+    from cache import LRUCache
+    server.connect_to_db("sqlite")
+    monkeypatch.setattr(server, "post_cache",
+                        LRUCache(max_size=10000, ttl=60))
+    monkeypatch.setattr(server, "write_queue", None)
+    return server
+
+
+@pytest.fixture
+def http_server(server):
+    """Running HTTP server with the test data base"""
+    httpd = server.BoundedThreadingHTTPServer(("127.0.0.1", 0),
+                                              server.MyHandler, 2)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def client(http_server):
+    """Client connected to the running HTTP server"""
+    client = Client(http_server.server_address[1])
+    yield client
+    client.close()
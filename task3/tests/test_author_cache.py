@@ -0,0 +1,63 @@
+"""Author cache counts its size only every "eviction_interval" inserts
+and is called by the async scraper outside of the event loop"""
+import asyncio
+import threading
+
+from async_scraper import AsyncScraper
+from author_cache import AuthorCache
+
+
+class ThreadRecorder(AuthorCache):
+    """Cache which records threads of its calls"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def get(self, user_name):
+        self.threads.append(threading.current_thread())
+        return super().get(user_name)
+
+
+def test_size_is_checked_every_eviction_interval(tmp_path):
+    cache = AuthorCache(str(tmp_path / "authors.sqlite3"), max_size=20)
+    assert cache.eviction_interval == 2
+    counts = []
+    count_users = cache.count_users
+    cache.count_users = lambda: counts.append(1) or count_users()
+    for number in range(40):
+        cache.set(f"user{number}", {"karma": number})
+    assert len(counts) == 20
+    cache.count_users = count_users
+    assert cache.size() == cache.max_size
+    assert cache.evictions == 20
+    assert cache.get("user0") is None
+    assert cache.get("user39") == {"karma": 39}
+    cache.close()
+
+
+def test_cache_is_shared_by_threads(tmp_path):
+    cache = AuthorCache(str(tmp_path / "authors.sqlite3"))
+    cache.set("user", {"karma": 1})
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(cache.get("user")))
+    thread.start()
+    thread.join()
+    assert results == [{"karma": 1}]
+    cache.close()
+
+
+def test_scraper_reads_cache_outside_of_event_loop(tmp_path):
+    cache = ThreadRecorder(str(tmp_path / "authors.sqlite3"))
+    cache.set("user", {"karma": 1})
+
+    async def get_user_data():
+        async with AsyncScraper(author_cache=cache) as scraper:
+            return await scraper.get_user_data(
+                "https://www.reddit.com/r/test/comments/1/post/", "user")
+
+    assert asyncio.run(get_user_data()) == {"karma": 1}
+    assert cache.threads
+    assert threading.main_thread() not in cache.threads
+    cache.close()
@@ -0,0 +1,91 @@
+"""Crawl state keeps written posts between runs: resumed crawl skips
+written posts, refresh skips only posts with the same fingerprint"""
+import pytest
+
+from crawl_state import CrawlState, make_fingerprint
+
+POST_URL = "https://www.reddit.com/r/test/comments/1/post/"
+OTHER_URL = "https://www.reddit.com/r/test/comments/2/post/"
+
+
+@pytest.fixture
+def state_path(tmp_path, monkeypatch):
+    """File of the crawl state, "app.log" of the scraper module
+    is written to the temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "crawl_state.sqlite3")
+
+
+def is_post_written(*args) -> bool:
+    from main_multiprocessing import is_post_written
+    return is_post_written(*args)
+
+
+def test_fingerprint_depends_on_listing_text():
+    assert make_fingerprint("") is None
+    assert make_fingerprint("15|3 comments") == \
+        make_fingerprint("15|3 comments")
+    assert make_fingerprint("15|3 comments") != \
+        make_fingerprint("16|3 comments")
+    assert make_fingerprint("15|3 comments") != \
+        make_fingerprint("15|4 comments")
+
+
+def test_written_posts_are_kept_between_runs(state_path):
+    state = CrawlState(state_path)
+    state.set(POST_URL, "post_1", make_fingerprint("15|3 comments"))
+    state.set(OTHER_URL, "post_2", None)
+    state.close()
+    state = CrawlState(state_path)
+    assert state.size() == 2
+    assert state.get(POST_URL) == ("post_1",
+                                   make_fingerprint("15|3 comments"))
+    assert state.get(OTHER_URL) == ("post_2", None)
+    assert state.get("https://www.reddit.com/unknown/") is None
+    state.clear()
+    assert state.size() == 0
+    assert state.get(POST_URL) is None
+    state.close()
+
+
+def test_resume_skips_every_written_post(state_path):
+    state = CrawlState(state_path)
+    state.set(POST_URL, "post_1", make_fingerprint("15|3 comments"))
+    state.set(OTHER_URL, "post_2", None)
+    listing = {POST_URL: "99|50 comments", OTHER_URL: ""}
+    assert is_post_written(state, listing, False, POST_URL)
+    assert is_post_written(state, listing, False, OTHER_URL)
+    assert not is_post_written(state, listing, False,
+                               "https://www.reddit.com/new/")
+    state.close()
+
+
+@pytest.mark.parametrize("saved_text, listing_text, skipped", [
+    ("15|3 comments", "15|3 comments", True),
+    ("15|3 comments", "16|3 comments", False),
+    ("15|3 comments", "15|4 comments", False),
+    # Post without score or comments on the listing is always fetched
+    ("15|3 comments", "", False),
+    ("", "15|3 comments", False),
+    ("", "", False),
+])
+def test_refresh_skips_only_unchanged_posts(state_path, saved_text,
+                                            listing_text, skipped):
+    state = CrawlState(state_path)
+    state.set(POST_URL, "post_1", make_fingerprint(saved_text))
+    assert is_post_written(state, {POST_URL: listing_text}, True,
+                           POST_URL) == skipped
+    assert not is_post_written(state, {OTHER_URL: listing_text}, True,
+                               OTHER_URL)
+    state.close()
+
+
+def test_post_rewritten_with_new_fingerprint_is_skipped(state_path):
+    state = CrawlState(state_path)
+    state.set(POST_URL, "post_1", make_fingerprint("15|3 comments"))
+    listing = {POST_URL: "20|3 comments"}
+    assert not is_post_written(state, listing, True, POST_URL)
+    state.set(POST_URL, "post_1", make_fingerprint(listing[POST_URL]))
+    assert is_post_written(state, listing, True, POST_URL)
+    assert state.size() == 1
+    state.close()
@@ -0,0 +1,52 @@
+"""Link harvester returns every link of the growing listing once,
+it runs in headless Chrome and is skipped if Chrome is not installed"""
+import os
+import pathlib
+
+import pytest
+
+from link_harvester import LinkHarvester
+
+LISTING_FILE = os.path.join(os.path.dirname(__file__), "fixtures",
+                            "listing.html")
+# Posts added by every scroll of the listing fixture and their total
+STEP = 5
+TOTAL = 20
+
+
+@pytest.fixture(scope="module")
+def driver():
+    """Headless Chrome with the listing fixture"""
+    webdriver = pytest.importorskip("selenium.webdriver")
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--window-size=800,600")
+    try:
+        driver = webdriver.Chrome(options=options)
+    except Exception as ex:
+        pytest.skip(f"Chrome is not started: {ex!r}")
+    driver.get(pathlib.Path(LISTING_FILE).as_uri())
+    yield driver
+    driver.quit()
+
+
+def get_post_numbers(urls: list) -> list:
+    """Return numbers of posts by their urls"""
+    return [int(url.rstrip("/").rsplit("_", 1)[-1]) for url in urls]
+
+
+def test_every_new_link_is_returned_once(driver):
+    harvester = LinkHarvester(driver, timeout=2, poll_frequency=0.05)
+    steps = [harvester.harvest()]
+    while len(steps) <= TOTAL // STEP:
+        steps.append(harvester.get_new_links(1))
+    assert [get_post_numbers(urls) for urls in steps] == [
+        list(range(start, start + STEP))
+        for start in range(0, TOTAL, STEP)] + [[]]
+    urls = [url for urls in steps for url in urls]
+    assert len(set(urls)) == TOTAL
+    assert harvester.seen == set(urls)
+    # Post rendered again is taken without returning its url
+    assert harvester.count_new_links() == 0
+    for url, number in zip(urls, get_post_numbers(urls)):
+        assert harvester.listing[url] == f"{number * 7}|{number} comments"
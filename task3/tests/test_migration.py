@@ -0,0 +1,122 @@
+"""Values of fields are converted to native types and back to the same
+response values, migration converts documents with string values"""
+import datetime
+import json
+
+import pytest
+
+import serialization
+
+from conftest import make_records
+from data_description import (FIELD_TYPES, POST_COUNT, PostDataDB,
+                              UserDataDB, convert_to_db_type)
+
+
+def make_string_record(record: dict) -> dict:
+    """Return record with all values as strings, as old scraper sent"""
+    return {field: str(value) for field, value in record.items()}
+
+
+def test_conversion_round_trip_returns_the_same_values():
+    for record in make_records(30):
+        converted = {field: convert_to_db_type(field, value)
+                     for field, value in make_string_record(record).items()}
+        for field, field_type in FIELD_TYPES.items():
+            assert type(converted[field]) is field_type
+        assert json.loads(serialization.dumps(converted)) == record
+        # Converted values are converted to themselves
+        assert {field: convert_to_db_type(field, value)
+                for field, value in converted.items()} == converted
+
+
+@pytest.mark.parametrize("field, value", [
+    ("number_of_votes", "many"),
+    ("number_of_votes", 1.5),
+    ("number_of_votes", True),
+    ("user_karma", None),
+    ("post_date", "2021-13-01"),
+    ("user_cake_day", 20150601),
+])
+def test_values_of_wrong_type_are_not_converted(field, value):
+    with pytest.raises(ValueError):
+        convert_to_db_type(field, value)
+
+
+def test_posted_strings_are_stored_as_native_types(server, client):
+    record = make_records(1)[0]
+    status, _ = client.request("POST", "/posts/",
+                               make_string_record(record))
+    assert status == 201
+    stored = server.connector.find_one(server.posts, {"_id": record["_id"]})
+    assert stored["post_date"] == datetime.datetime(2021, 10, 1)
+    assert stored["number_of_votes"] == record["number_of_votes"]
+    status, listed = client.request("GET", "/posts/")
+    assert status == 200
+    assert listed == [record]
+
+
+@pytest.fixture
+def old_documents(monkeypatch, tmp_path):
+    """Migration module and in-memory MongoDB connector with posts and
+    users written down with string values"""
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.chdir(tmp_path)
+    from db_connectors import mongo
+    monkeypatch.setattr(mongo, "MongoClient", mongomock.MongoClient)
+    import migrate
+    connector = mongo.MongodbService("localhost", 27017)
+    db = connector.create_db("posts_data")
+    posts = connector.create_collection(db, "posts")
+    users = connector.create_collection(db, "users")
+    records = [make_string_record(record)
+               for record in make_records(25, users_number=4)]
+    for number in range(4):
+        user = records[number]
+        users.insert_one(dict({"_id": f"id_{number}"},
+                              **{field: user[field]
+                                 for field in UserDataDB.__slots__}))
+    for number, record in enumerate(records):
+        posts.insert_one(dict({"user_id": f"id_{number % 4}"},
+                              **{field: record[field]
+                                 for field in PostDataDB.__slots__}))
+    return migrate, connector, posts, users
+
+
+def test_migration_converts_string_values(old_documents):
+    migrate, connector, posts, users = old_documents
+    # Post converted already and post with value which is not a number
+    posts.update_one({"_id": "post000003"}, {"$set": {
+        "number_of_votes": 3, "number_of_comments": 3,
+        "post_date": datetime.datetime(2021, 10, 4)}})
+    posts.update_one({"_id": "post000007"},
+                     {"$set": {"number_of_votes": "many"}})
+    fields = [field for field in PostDataDB.__slots__
+              if field in FIELD_TYPES]
+    assert migrate.migrate_collection(connector, posts, fields,
+                                      batch_size=4) == (23, 1)
+    fields = [field for field in UserDataDB.__slots__
+              if field in FIELD_TYPES]
+    assert migrate.migrate_collection(connector, users, fields,
+                                      batch_size=4) == (4, 0)
+    expected = {record["_id"]: record
+                for record in make_records(25, users_number=4)}
+    for post in posts.find({"_id": {"$ne": "post000007"}}):
+        for field in ("number_of_votes", "number_of_comments", "post_date"):
+            assert post[field] == convert_to_db_type(
+                field, expected[post["_id"]][field])
+    assert posts.find_one({"_id": "post000007"})["number_of_votes"] == \
+        "many"
+    for user in users.find():
+        assert type(user["user_karma"]) is int
+        assert type(user["user_cake_day"]) is datetime.datetime
+    # Second run finds only the document which is not converted
+    assert migrate.migrate_collection(connector, posts, ["number_of_votes"],
+                                      batch_size=4) == (0, 1)
+
+
+def test_migration_counts_posts_of_users(old_documents):
+    migrate, connector, posts, users = old_documents
+    assert migrate.count_user_posts(connector, posts, users,
+                                    batch_size=3) == 4
+    assert {user["_id"]: user[POST_COUNT] for user in users.find()} == {
+        "id_0": 7, "id_1": 6, "id_2": 6, "id_3": 6}
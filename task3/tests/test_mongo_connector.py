@@ -0,0 +1,54 @@
+"""MongoDB connector on the in-memory "mongomock" data base"""
+import pytest
+
+from pymongo.errors import DuplicateKeyError
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Connector to the in-memory data base"""
+    from db_connectors import mongo
+    monkeypatch.setattr(mongo, "MongoClient", mongomock.MongoClient)
+    return mongo.MongodbService("localhost", 27017)
+
+
+class ConflictOnce:
+    """Collection which fails the first upsert as if concurrent request
+    inserted the document and deleted it before it was found"""
+
+    def __init__(self, collection_name):
+        self.collection = collection_name
+        self.conflicts = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self.collection, name)
+
+    def find_one_and_update(self, *args, **kwargs):
+        if not self.conflicts:
+            self.conflicts += 1
+            raise DuplicateKeyError("duplicate key")
+        return self.collection.find_one_and_update(*args, **kwargs)
+
+
+def test_upsert_inserts_document_deleted_after_conflict(mongo):
+    users = ConflictOnce(mongo.create_db("test_data")["users"])
+    user, inserted = mongo.find_one_and_upsert(
+        users, {"user_name": "user_1"}, {"user_name": "user_1"},
+        {"post_count": 1})
+    assert inserted
+    assert users.conflicts == 1
+    assert users.find_one({"user_name": "user_1"})["post_count"] == 1
+
+
+def test_upsert_finds_existing_document(mongo):
+    users = mongo.create_db("test_data")["users"]
+    mongo.find_one_and_upsert(users, {"user_name": "user_1"},
+                              {"user_name": "user_1"}, {"post_count": 1})
+    user, inserted = mongo.find_one_and_upsert(
+        users, {"user_name": "user_1"}, {"user_name": "user_1"},
+        {"post_count": 1})
+    assert not inserted
+    assert user["post_count"] == 1
+    assert users.find_one({"user_name": "user_1"})["post_count"] == 2
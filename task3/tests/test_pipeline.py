@@ -0,0 +1,130 @@
+"""Scrape pipeline stops at the required number of posts, counts skipped
+and failed posts and writes posts in batches"""
+import asyncio
+
+import pytest
+
+from conftest import make_records
+from pipeline import ScrapePipeline
+
+
+class FakeScraper:
+    """Scraper which returns records by url after a short delay,
+    urls from "broken" have no post data"""
+
+    def __init__(self, records: list, broken=(), delay: float = 0.001):
+        self.records = {record["post_url"]: record for record in records}
+        self.broken = set(broken)
+        self.delay = delay
+        self.scraped = []
+
+    async def get_data_from_post_and_user_page(self, url: str):
+        self.scraped.append(url)
+        await asyncio.sleep(self.delay)
+        if url in self.broken:
+            return []
+        return self.records[url]
+
+
+class LinkSource:
+    """Links of records given by the requested number"""
+
+    def __init__(self, records: list):
+        self.urls = [record["post_url"] for record in records]
+
+    def __call__(self, number: int) -> list:
+        links, self.urls = self.urls[:number], self.urls[number:]
+        return links
+
+
+class BatchWriter:
+    """Write function which records batches and rejects "rejected" urls
+    as "POST /posts/bulk" rejects existing posts"""
+
+    def __init__(self, rejected=()):
+        self.rejected = set(rejected)
+        self.batches = []
+
+    def __call__(self, records: list) -> list:
+        self.batches.append([record["post_url"] for record in records])
+        return [{"_id": record["_id"], "status": 409}
+                if record["post_url"] in self.rejected
+                else {"_id": record["_id"], "status": 201}
+                for record in records]
+
+
+def run_pipeline(records: list, posts_number: int, scraper: FakeScraper,
+                 writer: BatchWriter, **kwargs) -> tuple:
+    """Run pipeline over links of "records"
+    Return pipeline and its result.
+    """
+    pipeline = ScrapePipeline(LinkSource(records), scraper, writer,
+                              posts_number, **kwargs)
+    return pipeline, asyncio.run(pipeline.run())
+
+
+@pytest.mark.parametrize("workers", [1, 5, 40])
+def test_pipeline_stops_at_posts_number(workers):
+    records = make_records(100)
+    scraper = FakeScraper(records)
+    writer = BatchWriter()
+    pipeline, done = run_pipeline(records, 25, scraper, writer,
+                                  workers=workers, batch_size=10)
+    assert done == pipeline.written == 25
+    written = [url for batch in writer.batches for url in batch]
+    assert sorted(written) == sorted(record["post_url"]
+                                     for record in records[:25])
+    # Links are not requested beyond the required number
+    assert len(scraper.scraped) == 25
+
+
+def test_pipeline_stops_when_site_has_no_more_links():
+    records = make_records(12)
+    pipeline, done = run_pipeline(records, 50, FakeScraper(records),
+                                  BatchWriter(), workers=4)
+    assert done == pipeline.written == 12
+
+
+def test_skipped_and_failed_posts_are_counted():
+    records = make_records(40)
+    urls = [record["post_url"] for record in records]
+    skipped = {urls[0], urls[3], urls[5]}
+    broken = {urls[1], urls[4]}
+    rejected = {urls[2]}
+    scraper = FakeScraper(records, broken=broken)
+    writer = BatchWriter(rejected=rejected)
+    pipeline, done = run_pipeline(records, 20, scraper, writer, workers=3,
+                                  batch_size=4,
+                                  skip_link=lambda url: url in skipped)
+    assert done == 20
+    assert pipeline.skipped == 3
+    assert pipeline.failed == 3
+    assert pipeline.written == 17
+    # Skipped links are not scraped, failed posts are replaced by next
+    # links
+    assert not skipped & set(scraper.scraped)
+    assert len(scraper.scraped) == pipeline.written + pipeline.failed
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 50])
+def test_posts_are_written_in_batches_of_batch_size(batch_size):
+    records = make_records(60)
+    writer = BatchWriter()
+    pipeline, done = run_pipeline(records, 45, FakeScraper(records), writer,
+                                  workers=20, batch_size=batch_size,
+                                  max_delay=5)
+    assert done == 45
+    sizes = [len(batch) for batch in writer.batches]
+    assert sum(sizes) == 45
+    assert max(sizes) <= batch_size
+    assert len(sizes) >= -(-45 // batch_size)
+
+
+def test_batch_is_written_after_max_delay():
+    records = make_records(3)
+    writer = BatchWriter()
+    scraper = FakeScraper(records, delay=0.3)
+    pipeline, done = run_pipeline(records, 3, scraper, writer, workers=1,
+                                  batch_size=10, max_delay=0.01)
+    assert done == 3
+    assert [len(batch) for batch in writer.batches] == [1, 1, 1]
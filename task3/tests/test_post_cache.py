@@ -0,0 +1,49 @@
+"""Post read from data base during its change is not saved to cache"""
+from cache import LRUCache
+from conftest import Client, make_records
+
+
+def test_value_read_before_invalidation_is_not_saved():
+    cache = LRUCache(max_size=10, ttl=60)
+    token = cache.read_token()
+    cache.invalidate("post")
+    cache.set("post", {"votes": 1}, "user", token)
+    assert cache.get("post") is None
+    cache.set("post", {"votes": 2}, "user", cache.read_token())
+    assert cache.get("post") == {"votes": 2}
+
+
+def test_value_read_before_invalidation_of_tag_is_not_saved():
+    cache = LRUCache(max_size=10, ttl=60)
+    token = cache.read_token()
+    cache.invalidate_tag("user")
+    cache.set("post", {"votes": 1}, "user", token)
+    assert cache.get("post") is None
+    cache.set("other", {"votes": 1}, "other_user", token)
+    assert cache.get("other") == {"votes": 1}
+
+
+def test_post_changed_during_read_is_not_cached(server, client,
+                                                http_server, monkeypatch):
+    record, = make_records(1)
+    assert client.request("POST", "/posts/", record)[0] == 201
+    get_user_data_from_db = server.MyHandler.get_user_data_from_db
+    changed = []
+
+    def change_post_during_read(handler, post_data):
+        # The post is changed after it was read by GET request
+        if not changed:
+            changed.append(True)
+            other = Client(http_server.server_address[1])
+            assert other.request("PUT", f"/posts/{record['_id']}",
+                                 {"post_category": "changed"})[0] == 200
+            other.close()
+        return get_user_data_from_db(handler, post_data)
+
+    monkeypatch.setattr(server.MyHandler, "get_user_data_from_db",
+                        change_post_during_read)
+    status, post = client.request("GET", f"/posts/{record['_id']}")
+    assert status == 200
+    assert post["post_category"] == record["post_category"]
+    status, post = client.request("GET", f"/posts/{record['_id']}")
+    assert post["post_category"] == "changed"
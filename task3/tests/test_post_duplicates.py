@@ -0,0 +1,61 @@
+"""POST /posts/ with existing unique id keeps users of other posts"""
+from conftest import Client, make_records
+
+
+def find_user(server, user_name: str):
+    """Return user document by user name or "None" """
+    found = server.connector.find_many(server.users,
+                                       {"user_name": user_name})
+    return found[0] if found else None
+
+
+def test_duplicate_post_deletes_user_inserted_for_it(server, client):
+    first, second = make_records(2)
+    assert client.request("POST", "/posts/", first)[0] == 201
+    status, _ = client.request("POST", "/posts/",
+                               dict(second, _id=first["_id"],
+                                    user_name="new_user"))
+    assert status == 409
+    assert find_user(server, "new_user") is None
+
+
+def test_duplicate_post_decrements_posts_of_existing_user(server, client):
+    first, second = make_records(2)
+    assert client.request("POST", "/posts/", first)[0] == 201
+    status, _ = client.request("POST", "/posts/",
+                               dict(second, _id=first["_id"]))
+    assert status == 409
+    user = find_user(server, first["user_name"])
+    assert user[server.POST_COUNT] == 1
+
+
+def test_duplicate_post_keeps_user_of_concurrent_post(server, client,
+                                                      http_server,
+                                                      monkeypatch):
+    first, second, third = make_records(3)
+    assert client.request("POST", "/posts/", first)[0] == 201
+    duplicate = dict(second, _id=first["_id"], user_name="shared_user")
+    concurrent = dict(third, user_name="shared_user")
+    insert_one = server.connector.insert_one
+    statuses = []
+
+    def insert_after_concurrent_post(collection_name, data):
+        # The other post of the same new user is written between upsert
+        # of the user and insert of the duplicate post
+        if data["_id"] == first["_id"] and not statuses:
+            other = Client(http_server.server_address[1])
+            statuses.append(other.request("POST", "/posts/",
+                                          concurrent)[0])
+            other.close()
+        return insert_one(collection_name, data)
+
+    monkeypatch.setattr(server.connector, "insert_one",
+                        insert_after_concurrent_post)
+    status, _ = client.request("POST", "/posts/", duplicate)
+    assert status == 409
+    assert statuses == [201]
+    assert find_user(server, "shared_user")[server.POST_COUNT] == 1
+    status, listed = client.request("GET", "/posts/")
+    assert status == 200
+    assert {post["_id"]: post["user_name"] for post in listed} == {
+        first["_id"]: first["user_name"], third["_id"]: "shared_user"}
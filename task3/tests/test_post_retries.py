@@ -0,0 +1,46 @@
+"""Records written down by the failed attempt of POST /posts/bulk are
+counted as written by the repeated request"""
+import http_sessions
+
+from conftest import make_records
+
+
+def fail_first_bulk_write(server, monkeypatch) -> None:
+    """Make the first bulk write answer 500 after records are written"""
+    insert_bulk_data_to_db = server.MyHandler.insert_bulk_data_to_db
+    calls = []
+
+    def insert_and_fail(handler, records):
+        statuses = insert_bulk_data_to_db(handler, records)
+        calls.append(statuses)
+        if len(calls) == 1:
+            raise ConnectionError("response is lost")
+        return statuses
+
+    monkeypatch.setattr(server.MyHandler, "insert_bulk_data_to_db",
+                        insert_and_fail)
+
+
+def test_records_written_by_failed_attempt_are_written(server, http_server,
+                                                       monkeypatch):
+    from main_multiprocessing import post_records
+    fail_first_bulk_write(server, monkeypatch)
+    session = http_sessions.make_session(retries=1, backoff=0)
+    api_url = f"http://127.0.0.1:{http_server.server_address[1]}"
+    records = make_records(3)
+    statuses = post_records(session, records, api_url)
+    assert [status["status"] for status in statuses] == [201, 201, 201]
+    assert [status["_id"] for status in statuses] == [
+        record["_id"] for record in records]
+    session.close()
+
+
+def test_existing_records_are_rejected_without_retry(server, http_server):
+    from main_multiprocessing import post_records
+    session = http_sessions.make_session(retries=1, backoff=0)
+    api_url = f"http://127.0.0.1:{http_server.server_address[1]}"
+    first, second = make_records(2)
+    assert post_records(session, [first], api_url)[0]["status"] == 201
+    statuses = post_records(session, [first, second], api_url)
+    assert [status["status"] for status in statuses] == [409, 201]
+    session.close()
@@ -0,0 +1,55 @@
+"""Entity tag of the list of posts is not repeated after the data base
+is dropped and written again, not modified responses vary by the same
+headers as full ones"""
+import pytest
+
+from conftest import make_records
+
+
+def drop_documents(server) -> None:
+    """Delete all documents as another process drops the data base
+    while server is running"""
+    for collection_name in (server.posts, server.users):
+        server.connector.delete_many(collection_name, {})
+    server.connector.delete_one(server.counters, {"_id": "posts"})
+
+
+def drop_data_base(server) -> None:
+    """Drop data base and connect to the new one as on server start"""
+    server.connector.drop_db("posts_data")
+    server.connect_to_db("sqlite")
+
+
+def test_unchanged_list_is_not_sent_again(server, client):
+    client.request("POST", "/posts/bulk", make_records(3))
+    status, headers, _ = client.request_raw("GET", "/posts/")
+    assert status == 200
+    status, _, body = client.request_raw("GET", "/posts/", headers={
+        "If-None-Match": headers["ETag"]})
+    assert (status, body) == (304, b"")
+
+
+@pytest.mark.parametrize("path", ["/posts/", "/posts/post000001"])
+def test_not_modified_response_has_the_same_vary(server, client, path):
+    client.request("POST", "/posts/bulk", make_records(3))
+    status, headers, _ = client.request_raw("GET", path)
+    assert status == 200
+    status, not_modified, _ = client.request_raw("GET", path, headers={
+        "If-None-Match": headers["ETag"]})
+    assert status == 304
+    assert not_modified["Vary"] == headers["Vary"] == "Accept-Encoding"
+    assert not_modified["ETag"] == headers["ETag"]
+
+
+@pytest.mark.parametrize("drop", [drop_documents, drop_data_base])
+def test_list_written_again_after_drop_is_sent(server, client, drop):
+    records = make_records(3)
+    client.request("POST", "/posts/bulk", records)
+    status, headers, _ = client.request_raw("GET", "/posts/")
+    assert status == 200
+    drop(server)
+    client.request("POST", "/posts/bulk", records[:2])
+    status, _, body = client.request_raw("GET", "/posts/", headers={
+        "If-None-Match": headers["ETag"]})
+    assert status == 200
+    assert len(client.request("GET", "/posts/")[1]) == 2
@@ -0,0 +1,87 @@
+"""GET /posts/ joins posts with their authors in the data base"""
+import json
+
+import pytest
+
+from conftest import CountingConnector, make_records
+
+
+def list_posts_with_counted_calls(server, client, count: int) -> tuple:
+    """Write down "count" posts and list them
+    Return listed posts and numbers of connector calls by method name.
+    """
+    status, _ = client.request("POST", "/posts/bulk", make_records(count))
+    assert status == 200
+    counting = CountingConnector(server.connector)
+    server.connector = counting
+    try:
+        status, listed = client.request("GET", "/posts/")
+    finally:
+        server.connector = counting.connector
+    assert status == 200
+    return listed, counting.calls
+
+
+@pytest.mark.parametrize("count", [10, 1000])
+def test_posts_are_listed_with_author_data(server, client, count):
+    listed, _ = list_posts_with_counted_calls(server, client, count)
+    assert len(listed) == count
+    assert {post["_id"] for post in listed} == {
+        record["_id"] for record in make_records(count)}
+    for post in listed:
+        number = int(post["_id"][len("post"):])
+        assert post["user_name"] == f"user_{number % 10}"
+        assert post["user_karma"] == 1000 + number % 10
+
+
+def test_number_of_db_calls_does_not_depend_on_number_of_posts(server,
+                                                                  client):
+    listed, few_calls = list_posts_with_counted_calls(server, client, 10)
+    assert len(listed) == 10
+    # The first 10 posts are written already, so 1000 posts are listed
+    listed, many_calls = list_posts_with_counted_calls(server, client, 1000)
+    assert len(listed) == 1000
+    assert many_calls == few_calls
+    assert sum(many_calls.values()) <= 2
+
+
+@pytest.mark.parametrize("query", ["", "&category=category_1"])
+def test_pages_chained_by_next_after_cover_every_post_once(server, client,
+                                                           query):
+    records = make_records(53)
+    status, _ = client.request("POST", "/posts/bulk", records)
+    assert status == 200
+    expected = [record["_id"] for record in records
+                if not query or record["post_category"] == "category_1"]
+    listed = []
+    path = f"/posts/?limit=2{query}"
+    while True:
+        status, headers, body = client.request_raw("GET", path)
+        assert status == 200
+        page = json.loads(body)
+        assert len(page) <= 2
+        listed += [post["_id"] for post in page]
+        if "X-Next-After" not in headers:
+            break
+        assert headers["X-Next-After"] == page[-1]["_id"]
+        path = f"/posts/?limit=2{query}&after={headers['X-Next-After']}"
+    assert sorted(listed) == sorted(expected)
+    assert len(listed) == len(set(listed))
+
+
+@pytest.mark.parametrize("count", [0, 1, 2000])
+def test_posts_without_limit_are_streamed_as_json_array(server, client,
+                                                        count, monkeypatch):
+    monkeypatch.setattr(server.MyHandler, "stream_chunk_size", 1024)
+    if count:
+        status, _ = client.request("POST", "/posts/bulk",
+                                   make_records(count))
+        assert status == 200
+    status, headers, body = client.request_raw(
+        "GET", "/posts/", headers={"Accept-Encoding": "identity"})
+    assert status == 200
+    assert headers["Transfer-Encoding"] == "chunked"
+    assert "X-Next-After" not in headers
+    listed = json.loads(body)
+    assert sorted(post["_id"] for post in listed) == sorted(
+        record["_id"] for record in make_records(count))
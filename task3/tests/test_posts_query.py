@@ -0,0 +1,107 @@
+"""Filters, sort and fields of GET /posts/ are applied by the data base,
+malformed queries are answered with 400"""
+import pytest
+
+from conftest import make_records
+
+RECORDS = make_records(60)
+
+
+@pytest.fixture
+def posts_client(server, client):
+    """Client of the server with "RECORDS" written down"""
+    status, _ = client.request("POST", "/posts/bulk", RECORDS)
+    assert status == 200
+    return client
+
+
+def list_ids(client, query: str) -> list:
+    """Return "_id" of posts listed by the query in the response order"""
+    status, listed = client.request("GET", f"/posts/?{query}")
+    assert status == 200
+    return [post["_id"] for post in listed]
+
+
+@pytest.mark.parametrize("query, matches", [
+    ("category=category_3",
+     lambda record: record["post_category"] == "category_3"),
+    ("since=2021-10-20",
+     lambda record: record["post_date"] >= "2021-10-20"),
+    ("until=2021-10-05",
+     lambda record: record["post_date"] <= "2021-10-05"),
+    ("since=2021-10-10&until=2021-10-12",
+     lambda record: "2021-10-10" <= record["post_date"] <= "2021-10-12"),
+    ("min_votes=50",
+     lambda record: record["number_of_votes"] >= 50),
+    ("after=post000050",
+     lambda record: record["_id"] > "post000050"),
+    ("category=category_5&min_votes=20",
+     lambda record: record["post_category"] == "category_5"
+     and record["number_of_votes"] >= 20),
+])
+def test_filter_finds_matching_posts(posts_client, query, matches):
+    expected = sorted(record["_id"] for record in RECORDS
+                      if matches(record))
+    assert expected
+    assert sorted(list_ids(posts_client, query)) == expected
+
+
+def test_default_order_is_by_unique_id(posts_client):
+    assert list_ids(posts_client, "limit=15") == [
+        record["_id"] for record in RECORDS[:15]]
+
+
+@pytest.mark.parametrize("sort, key, reverse", [
+    ("number_of_votes", "number_of_votes", False),
+    ("-number_of_votes", "number_of_votes", True),
+    ("%2Bpost_date", "post_date", False),
+    ("-user_karma", "user_karma", True),
+])
+def test_posts_are_sorted_in_direction(posts_client, sort, key, reverse):
+    status, listed = posts_client.request("GET", f"/posts/?sort={sort}")
+    assert status == 200
+    values = [post[key] for post in listed]
+    assert len(values) == len(RECORDS)
+    assert values == sorted(values, reverse=reverse)
+
+
+def test_posts_are_sorted_by_several_fields(posts_client):
+    status, listed = posts_client.request(
+        "GET", "/posts/?sort=post_category,-number_of_votes")
+    assert status == 200
+    keys = [(post["post_category"], -post["number_of_votes"])
+            for post in listed]
+    assert keys == sorted(keys)
+
+
+@pytest.mark.parametrize("fields", [
+    ["post_url"],
+    ["number_of_votes", "post_category"],
+    ["user_name", "user_karma", "post_date"],
+])
+def test_only_requested_fields_are_returned(posts_client, fields):
+    status, listed = posts_client.request(
+        "GET", f"/posts/?limit=5&fields={','.join(fields)}")
+    assert status == 200
+    assert len(listed) == 5
+    for post, record in zip(listed, RECORDS):
+        assert set(post) == {"_id"} | set(fields)
+        for field in fields:
+            assert str(post[field]) == str(record[field])
+
+
+@pytest.mark.parametrize("query", [
+    "limit=-1",
+    "limit=ten",
+    "since=2021-13-01",
+    "until=yesterday",
+    "min_votes=many",
+    "sort=unknown_field",
+    "sort=-password",
+    "fields=post_url,unknown_field",
+    "after=post000010&sort=number_of_votes",
+])
+def test_malformed_query_is_answered_with_400(posts_client, query):
+    status, body = posts_client.request("GET", f"/posts/?{query}")
+    assert status == 400
+    assert body == {"error": "wrong query"}
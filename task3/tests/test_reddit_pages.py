@@ -0,0 +1,65 @@
+"""Data found in saved pages by regular expressions is the same
+as data found by BeautifulSoup, pages missed by regular expressions
+are processed by BeautifulSoup"""
+import os
+import argparse
+
+import pytest
+
+from bs4 import BeautifulSoup
+
+import reddit_pages
+
+from benchmark import load_pages
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+# Page with category in the span with class in single quotes
+MISSED_PAGE = "post_single_quotes.html"
+PAGE_FILES = sorted(os.listdir(PAGES_DIR))
+
+
+def read_page(file_name: str) -> str:
+    """Return HTML of the saved page"""
+    with open(os.path.join(PAGES_DIR, file_name), encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("file_name", [file_name for file_name in PAGE_FILES
+                                       if file_name.startswith("post_")])
+def test_post_page_data_is_the_same_as_by_beautiful_soup(file_name):
+    src = read_page(file_name)
+    expected = reddit_pages.get_post_data_from_page(BeautifulSoup(src,
+                                                                  "lxml"))
+    assert reddit_pages.parse_post_page(src) == expected
+    if file_name != MISSED_PAGE:
+        assert reddit_pages.extract_post_data(src) == expected
+
+
+@pytest.mark.parametrize("file_name", [file_name for file_name in PAGE_FILES
+                                       if file_name.startswith("user_")])
+def test_user_page_data_is_the_same_as_by_beautiful_soup(file_name):
+    src = read_page(file_name)
+    expected = reddit_pages.get_user_data_from_page(BeautifulSoup(src,
+                                                                  "lxml"))
+    assert reddit_pages.extract_user_data(src) == expected
+    assert reddit_pages.parse_user_page(src) == expected
+
+
+def test_missed_page_is_processed_by_beautiful_soup(monkeypatch):
+    src = read_page(MISSED_PAGE)
+    with pytest.raises(ValueError):
+        reddit_pages.extract_post_data(src)
+    soup_calls = []
+    get_post_data_from_page = reddit_pages.get_post_data_from_page
+    monkeypatch.setattr(reddit_pages, "get_post_data_from_page",
+                        lambda soup: soup_calls.append(soup)
+                        or get_post_data_from_page(soup))
+    assert reddit_pages.parse_post_page(src)["post_category"] == \
+        "todayilearned"
+    assert len(soup_calls) == 1
+
+
+def test_benchmark_loads_pages_by_file_prefix():
+    pages = load_pages(argparse.Namespace(pages_dir=PAGES_DIR))
+    assert [kind for kind, _ in pages] == [
+        file_name.split("_", 1)[0] for file_name in PAGE_FILES]
@@ -0,0 +1,49 @@
+"""Request takes slot of the server only after its headers are read,
+so slow clients do not hold slots"""
+import socket
+import threading
+
+import pytest
+
+from conftest import Client
+
+
+@pytest.fixture
+def single_slot_server(server):
+    """Running HTTP server which processes one request at a time"""
+    httpd = server.BoundedThreadingHTTPServer(("127.0.0.1", 0),
+                                              server.MyHandler, 1)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+def test_client_sending_headers_does_not_hold_slot(single_slot_server):
+    port = single_slot_server.server_address[1]
+    slow = socket.create_connection(("127.0.0.1", port), timeout=10)
+    slow.sendall(b"GET /cache HTTP/1.1\r\nHost: 127.0.0.1\r\n")
+    client = Client(port)
+    try:
+        status, _ = client.request("GET", "/cache")
+        assert status == 200
+    finally:
+        client.close()
+    slow.sendall(b"\r\n")
+    assert slow.recv(1024).startswith(b"HTTP/1.1 200")
+    slow.close()
+
+
+def test_slot_is_released_after_malformed_request(single_slot_server):
+    port = single_slot_server.server_address[1]
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as bad:
+        bad.sendall(b"GET /cache HTTP/9\r\n\r\n")
+        assert b"400" in bad.recv(1024)
+    client = Client(port)
+    try:
+        assert client.request("GET", "/cache")[0] == 200
+    finally:
+        client.close()
+    assert single_slot_server.request_slots.acquire(timeout=5)
@@ -0,0 +1,233 @@
+"""SQL connector on SQLite data base in the temporary directory"""
+import threading
+
+import pytest
+
+from data_description import INDEXES, TABLES
+from db_connectors import sql as sql_module
+from db_connectors.connector import DuplicateDataError
+from db_connectors.sql import ConnectionPool, SqlService
+
+
+@pytest.fixture
+def sql(tmp_path, monkeypatch):
+    """Connector to the new SQLite data base with single connection"""
+    monkeypatch.chdir(tmp_path)
+    connector = SqlService("localhost", 5432, "sqlite", TABLES, pool_size=1)
+    connector.create_db("test_data")
+    connector.ensure_indexes("test_data", INDEXES)
+    yield connector
+    connector.drop_db("test_data")
+
+
+def write_posts(sql, count: int) -> tuple:
+    """Write down "count" posts of 3 users
+    Return tables of posts and users.
+    """
+    posts = sql.create_collection("test_data", "posts")
+    users = sql.create_collection("test_data", "users")
+    sql.insert_many(users, [{"_id": f"user{number}",
+                             "user_name": f"user_{number}",
+                             "user_karma": number} for number in range(3)])
+    sql.insert_many(posts, [{"_id": f"post{number:03d}",
+                             "user_id": f"user{number % 3}",
+                             "post_category": f"category_{number % 4}",
+                             "number_of_votes": number % 5}
+                            for number in range(count)])
+    return posts, users
+
+
+def test_unsupported_operator_is_wrong_value(sql):
+    users = sql.create_collection("test_data", "users")
+    with pytest.raises(ValueError):
+        sql.find_many(users, {"user_karma": {"$regex": "^1"}})
+
+
+def test_document_is_found_only_by_id(sql):
+    counters = sql.create_collection("test_data", "counters")
+    with pytest.raises(ValueError):
+        sql.delete_one(counters, {"version": 1})
+
+
+def test_statistics_are_not_supported(server, client):
+    assert not hasattr(server.connector, "aggregate")
+    assert client.request("GET", "/stats")[0] == 501
+
+
+def test_upsert_inserts_row_deleted_after_conflict(sql, monkeypatch):
+    users = sql.create_collection("test_data", "users")
+    insert_row = sql.insert_row
+    conflicts = []
+
+    def conflict_once(*args, **kwargs):
+        # Concurrent request inserted the row and deleted it
+        # before it was found
+        if not conflicts:
+            conflicts.append(True)
+            return False
+        return insert_row(*args, **kwargs)
+
+    monkeypatch.setattr(sql, "insert_row", conflict_once)
+    user, inserted = sql.find_one_and_upsert(
+        users, {"user_name": "user_1"}, {"user_name": "user_1"},
+        {"post_count": 1})
+    assert inserted
+    assert conflicts == [True]
+    assert sql.find_one(users, {"user_name": "user_1"})["post_count"] == 1
+
+
+@pytest.mark.parametrize("sort", [[], [("number_of_votes", -1)],
+                                  [("post_category", 1),
+                                   ("user_karma", -1)]])
+def test_joined_rows_are_read_by_pages(sql, monkeypatch, sort):
+    monkeypatch.setattr(sql_module, "FETCH_SIZE", 4)
+    posts, users = write_posts(sql, 23)
+    rows = list(sql.find_all_joined(posts, users, "user_id", sort=sort,
+                                    foreign_fields=("user_name",
+                                                    "user_karma")))
+    expected = sorted(
+        [{"_id": f"post{number:03d}",
+          "post_category": f"category_{number % 4}",
+          "number_of_votes": number % 5, "user_name": f"user_{number % 3}",
+          "user_karma": number % 3} for number in range(23)],
+        key=lambda row: row["_id"])
+    for field, direction in reversed(sort):
+        expected.sort(key=lambda row: row[field], reverse=direction < 0)
+    assert rows == expected
+    limited = list(sql.find_all_joined(posts, users, "user_id", sort=sort,
+                                       limit=10, fields=["_id"]))
+    assert limited == [{"_id": row["_id"]} for row in expected[:10]]
+
+
+def test_connection_is_not_kept_between_pages(sql, monkeypatch):
+    monkeypatch.setattr(sql_module, "FETCH_SIZE", 4)
+    posts, users = write_posts(sql, 10)
+    rows = sql.find_all_joined(posts, users, "user_id")
+    assert next(rows)["_id"] == "post000"
+    # The only connection of the pool is free while rows are read
+    found = []
+    reader = threading.Thread(
+        target=lambda: found.append(sql.find_one(users, {"_id": "user1"})),
+        daemon=True)
+    reader.start()
+    reader.join(5)
+    assert found and found[0]["user_name"] == "user_1"
+    assert len(list(rows)) == 9
+
+
+@pytest.mark.parametrize("search_filter, numbers", [
+    ({"number_of_votes": 2}, [2, 7]),
+    ({"number_of_votes": {"$ne": 2}}, [0, 1, 3, 4, 5, 6, 8, 9]),
+    ({"number_of_votes": {"$gt": 3}}, [4, 9]),
+    ({"number_of_votes": {"$gte": 3}}, [3, 4, 8, 9]),
+    ({"number_of_votes": {"$lt": 1}}, [0, 5]),
+    ({"number_of_votes": {"$lte": 1}}, [0, 1, 5, 6]),
+    ({"_id": {"$in": ["post001", "post003", "missing"]}}, [1, 3]),
+    ({"_id": {"$in": []}}, []),
+    ({"number_of_comments": {"$exists": False}}, list(range(10))),
+    ({"post_category": "category_1", "number_of_votes": {"$gte": 3}}, [9]),
+    ({"$or": [{"number_of_votes": 0}, {"post_category": "category_3"}]},
+     [0, 3, 5, 7]),
+    ({"$and": [{"number_of_votes": {"$gt": 0}},
+               {"number_of_votes": {"$lt": 2}}]}, [1, 6]),
+])
+def test_filter_is_translated_to_where(sql, search_filter, numbers):
+    posts, _ = write_posts(sql, 10)
+    found = sql.find_many(posts, search_filter, {"_id": True},
+                          sort=[("_id", 1)])
+    assert found == [{"_id": f"post{number:03d}"} for number in numbers]
+
+
+def test_rows_are_sorted_and_projected(sql):
+    posts, _ = write_posts(sql, 10)
+    found = sql.find_many(posts, {}, {"number_of_votes": True},
+                          sort=[("number_of_votes", -1), ("_id", 1)],
+                          limit=4)
+    assert found == [{"_id": "post004", "number_of_votes": 4},
+                     {"_id": "post009", "number_of_votes": 4},
+                     {"_id": "post003", "number_of_votes": 3},
+                     {"_id": "post008", "number_of_votes": 3}]
+    found = sql.find_one(posts, {"_id": "post001"},
+                         {"_id": False, "user_id": False,
+                          "number_of_votes": False})
+    assert found == {"post_category": "category_1"}
+
+
+@pytest.mark.parametrize("search_filter", [
+    {"number_of_votes": {"$regex": "^1"}},
+    {"unknown_field": 1},
+])
+def test_wrong_filter_is_rejected(sql, search_filter):
+    posts, _ = write_posts(sql, 1)
+    with pytest.raises(ValueError):
+        sql.find_many(posts, search_filter)
+
+
+def test_bulk_insert_reports_duplicates_by_position(sql):
+    posts, _ = write_posts(sql, 2)
+    errors = sql.insert_many(posts, [{"_id": "post002"}, {"_id": "post000"},
+                                     {"_id": "post003"}, {"_id": "post002"}])
+    assert sorted(errors) == [1, 3]
+    assert all(isinstance(error, DuplicateDataError)
+               for error in errors.values())
+    assert len(sql.find_many(posts, {})) == 4
+
+
+def test_upsert_inserts_new_rows_and_increments_existing(sql):
+    users = sql.create_collection("test_data", "users")
+    inserted = sql.upsert_many(users, "user_name",
+                               [{"user_name": "first"},
+                                {"user_name": "second"}],
+                               [{"post_count": 2}, {"post_count": 1}])
+    assert inserted == [0, 1]
+    inserted = sql.upsert_many(users, "user_name",
+                               [{"user_name": "second"},
+                                {"user_name": "third"}],
+                               [{"post_count": 3}, {"post_count": 1}])
+    assert inserted == [1]
+    counts = {user["user_name"]: user["post_count"]
+              for user in sql.find_many(users, {})}
+    assert counts == {"first": 2, "second": 4, "third": 1}
+    user, inserted = sql.find_one_and_upsert(
+        users, {"user_name": "first"}, {"user_name": "first"},
+        {"post_count": 1})
+    assert not inserted
+    assert user["post_count"] == 2
+    with pytest.raises(DuplicateDataError):
+        sql.insert_one(users, {"_id": user["_id"], "user_name": "other"})
+
+
+def test_pool_reuses_connections_and_drops_broken_ones():
+    opened = []
+
+    class FakeConnection:
+        def __init__(self):
+            self.broken = self.closed = False
+            opened.append(self)
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            if self.broken:
+                raise ConnectionError("connection is lost")
+
+        def close(self):
+            self.closed = True
+
+    pool = ConnectionPool(FakeConnection, 2)
+    for _ in range(3):
+        with pool.connection() as connection:
+            assert connection is opened[0]
+    with pool.connection() as first:
+        with pool.connection() as second:
+            assert [first, second] == opened
+    with pytest.raises(KeyError):
+        with pool.connection() as broken:
+            broken.broken = True
+            raise KeyError("query failed")
+    assert broken.closed
+    with pool.connection() as connection:
+        assert connection is not broken
+        assert not connection.closed
+    assert len(opened) == 2
@@ -0,0 +1,35 @@
+"""With several workers cache, queue and metrics are marked with process
+id of the worker which answered the request"""
+import http.client
+
+from metrics import REGISTRY
+
+
+def get_metrics(http_server) -> str:
+    """Return body of GET /metrics"""
+    connection = http.client.HTTPConnection("127.0.0.1",
+                                            http_server.server_address[1],
+                                            timeout=10)
+    connection.request("GET", "/metrics")
+    body = connection.getresponse().read().decode('utf-8')
+    connection.close()
+    return body
+
+
+def test_single_worker_is_not_marked(server, http_server, client):
+    assert "worker" not in client.request("GET", "/cache")[1]
+    assert 'worker="' not in get_metrics(http_server)
+
+
+def test_status_and_metrics_are_marked_with_worker(server, http_server,
+                                                   client, monkeypatch):
+    monkeypatch.setattr(server, "worker_pid", 4321)
+    monkeypatch.setattr(REGISTRY, "_labels", "")
+    REGISTRY.set_labels(worker="4321")
+    status, cache = client.request("GET", "/cache")
+    assert status == 200
+    assert cache["worker"] == 4321
+    samples = [line for line in get_metrics(http_server).splitlines()
+               if line.startswith("http_request")]
+    assert samples
+    assert all('worker="4321"' in line for line in samples)
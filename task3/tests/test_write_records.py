@@ -0,0 +1,61 @@
+"""Changed posts written by previous runs are updated by simultaneous
+PUT requests, new and deleted posts are written by one bulk POST"""
+import threading
+import time
+
+import http_sessions
+
+from conftest import make_records
+from crawl_state import CrawlState
+
+
+def test_changed_posts_are_updated_and_new_posts_are_posted(server,
+                                                            http_server):
+    from main_multiprocessing import write_records
+    api_url = f"http://127.0.0.1:{http_server.server_address[1]}"
+    session = http_sessions.make_session(retries=0)
+    crawl_state = CrawlState("crawl_state.sqlite3")
+    records = make_records(8)
+    listing = {record["post_url"]: f"{record['number_of_votes']}|0"
+               for record in records}
+    assert all(status["status"] == 201 for status in write_records(
+        session, crawl_state, listing, records[:6], api_url, workers=4))
+    # Post deleted from data base is written again with the same id
+    server.connector.delete_one(server.posts, {"_id": records[5]["_id"]})
+    changed = [dict(record, _id="new_id", number_of_votes=4000)
+               for record in records[:6]] + records[6:]
+    statuses = write_records(session, crawl_state, listing, changed,
+                             api_url, workers=4)
+    assert [status["_id"] for status in statuses] == [
+        record["_id"] for record in records]
+    assert [status["status"] for status in statuses] == [200] * 5 + [201] * 3
+    for record in records[:6]:
+        stored = server.connector.find_one(server.posts,
+                                           {"_id": record["_id"]})
+        assert stored["number_of_votes"] == 4000
+    assert crawl_state.size() == 8
+    crawl_state.close()
+    session.close()
+
+
+def test_updates_are_sent_at_the_same_time(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    import main_multiprocessing
+    lock = threading.Lock()
+    running = []
+    most = []
+
+    def put_record(session, post_id, record, api_url):
+        with lock:
+            running.append(post_id)
+            most.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(post_id)
+        return 200
+
+    monkeypatch.setattr(main_multiprocessing, "put_record", put_record)
+    updates = [(record["_id"], record) for record in make_records(10)]
+    statuses = main_multiprocessing.put_records(None, updates, workers=4)
+    assert statuses == [200] * 10
+    assert max(most) == 4
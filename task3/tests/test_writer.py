@@ -0,0 +1,137 @@
+"""Buffered writer flushes operations by size and time and resolves
+future of every operation, write-behind queue writes through it"""
+import time
+import threading
+
+import pytest
+
+from db_connectors.connector import (DuplicateDataError, NotExecutedError,
+                                     Operation)
+from db_connectors.writer import BufferedWriter
+from write_behind import WriteBehindQueue
+
+
+class BatchRecorder:
+    """Write function which records written batches and fails
+    operations listed in "failed" """
+
+    def __init__(self, failed=()):
+        self.failed = list(failed)
+        self.batches = []
+        self.written = threading.Event()
+
+    def __call__(self, batch: list) -> dict:
+        self.batches.append(list(batch))
+        self.written.set()
+        return {position: ValueError(operation)
+                for position, operation in enumerate(batch)
+                if operation in self.failed}
+
+
+def test_writer_flushes_full_buffer():
+    recorder = BatchRecorder()
+    writer = BufferedWriter(recorder, max_size=3, max_delay=60)
+    futures = writer.add_many(list(range(7)))
+    for future in futures[:6]:
+        assert future.result(timeout=5) is None
+    assert recorder.batches == [[0, 1, 2], [3, 4, 5]]
+    assert not futures[6].done()
+    assert len(writer) == 1
+    writer.close()
+    assert futures[6].result(timeout=0) is None
+    assert recorder.batches[-1] == [6]
+
+
+def test_writer_flushes_oldest_operation_after_delay():
+    recorder = BatchRecorder()
+    writer = BufferedWriter(recorder, max_size=100, max_delay=0.2)
+    start = time.monotonic()
+    futures = writer.add_many(["first", "second"])
+    assert recorder.written.wait(5)
+    assert time.monotonic() - start >= 0.2
+    assert [future.result(timeout=5) for future in futures] == [None, None]
+    assert recorder.batches == [["first", "second"]]
+    writer.close()
+
+
+def test_writer_resolves_future_of_every_operation():
+    recorder = BatchRecorder(failed=["bad"])
+    writer = BufferedWriter(recorder, max_size=3, max_delay=60)
+    futures = writer.add_many(["good", "bad", "other"])
+    assert futures[0].result(timeout=5) is None
+    assert isinstance(futures[1].exception(timeout=5), ValueError)
+    assert futures[2].result(timeout=5) is None
+    writer.close()
+
+
+def test_writer_fails_all_operations_if_write_raises():
+    def write_batch(batch):
+        raise ConnectionError("data base is down")
+
+    writer = BufferedWriter(write_batch, max_size=10, max_delay=60)
+    futures = writer.add_many(["first", "second"])
+    writer.close()
+    for future in futures:
+        assert isinstance(future.exception(timeout=0), ConnectionError)
+    with pytest.raises(RuntimeError):
+        writer.add("late")
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_ordered_bulk_write_stops_at_first_error(server, ordered):
+    writer = BufferedWriter.for_collection(server.connector, server.counters,
+                                           max_size=3, max_delay=60,
+                                           ordered=ordered)
+    futures = writer.add_many([
+        Operation("insert", data={"_id": "first", "version": 1}),
+        Operation("insert", data={"_id": "first", "version": 2}),
+        Operation("insert", data={"_id": "second", "version": 1})])
+    writer.close()
+    assert futures[0].result(timeout=0) is None
+    assert isinstance(futures[1].exception(timeout=0), DuplicateDataError)
+    second = server.connector.find_one(server.counters, {"_id": "second"})
+    if ordered:
+        assert isinstance(futures[2].exception(timeout=0), NotExecutedError)
+        assert second is None
+    else:
+        assert futures[2].result(timeout=0) is None
+        assert second["version"] == 1
+
+
+def test_write_behind_queue_writes_batches_and_counts_results():
+    first, bad, third = ({"_id": unique_id}
+                         for unique_id in ("first", "bad", "third"))
+    recorder = BatchRecorder(failed=[bad])
+    write_queue = WriteBehindQueue(recorder, max_size=5, batch_size=2,
+                                   max_delay=60)
+    accepted = [write_queue.put(record)
+                for record in (first, bad, third)]
+    assert accepted == [True, True, True]
+    write_queue.close()
+    assert not write_queue.put({"_id": "late"})
+    assert recorder.batches == [[first, bad], [third]]
+    status = write_queue.status()
+    assert status["depth"] == 0
+    assert (status["written"], status["failed"], status["batches"],
+            status["rejected"]) == (2, 1, 2, 1)
+
+
+def test_write_behind_queue_rejects_records_when_full():
+    written = threading.Event()
+    release = threading.Event()
+
+    def write_batch(batch):
+        written.set()
+        release.wait(5)
+        return {}
+
+    write_queue = WriteBehindQueue(write_batch, max_size=2, batch_size=1,
+                                   max_delay=60)
+    assert write_queue.put({"_id": "first"})
+    assert written.wait(5)
+    # The first record is being written, it keeps its place in the queue
+    assert write_queue.put({"_id": "second"})
+    assert not write_queue.put({"_id": "third"})
+    release.set()
+    write_queue.close()
+    assert write_queue.status()["written"] == 2
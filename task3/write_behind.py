@@ -0,0 +1,107 @@
+"""Bounded queue of accepted records which are written down to data
+base later by the background thread in batches"""
+import time
+import logging
+import threading
+
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+from db_connectors.writer import BufferedWriter
+from metrics import REGISTRY
+
+RECORDS = REGISTRY.counter("write_behind_records_total",
+                           "Records passed through write-behind queue",
+                           ("result",))
+BATCH_DURATION = REGISTRY.histogram("write_behind_batch_duration_seconds",
+                                    "Duration of batch writes of "
+                                    "write-behind queue")
+
+
+class WriteBehindQueue:
+    """Records are accepted while queue has free places and written
+    down by "write_batch" function of the buffered writer when batch
+    is full or the first record of the batch waits "max_delay"
+    seconds."""
+
+    def __init__(self, write_batch: Callable[[List[dict]],
+                                             Dict[int, Exception]],
+                 max_size: int = 10000, batch_size: int = 1000,
+                 max_delay: float = 0.5):
+        """"write_batch" - function which writes down list of records
+        and returns errors of not written records by position
+        "max_size" - number of records waiting for write, records
+        are rejected when queue is full
+        "batch_size" - maximum number of records written at once
+        "max_delay" - seconds the first record of batch waits for
+        other records
+        """
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._write_batch = write_batch
+        self._depth = 0
+        self._counts = dict.fromkeys(("accepted", "rejected", "written",
+                                      "failed", "batches"), 0)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._writer = BufferedWriter(self._write_records, batch_size,
+                                      max_delay)
+
+    def put(self, record: dict) -> bool:
+        """Add record to the queue without waiting
+        Return "True" if record was accepted.
+        Return "False" if queue is full or closed.
+        """
+        with self._lock:
+            accepted = not self._closed and self._depth < self.max_size
+            if accepted:
+                self._depth += 1
+                future = self._writer.add(record)
+            self._counts["accepted" if accepted else "rejected"] += 1
+        RECORDS.inc("accepted" if accepted else "rejected")
+        if accepted:
+            future.add_done_callback(
+                lambda done: self._record_written(record, done))
+        return accepted
+
+    def status(self) -> dict:
+        """Return number of waiting records and counts of records
+        by result in dict format"""
+        with self._lock:
+            status = dict(self._counts)
+            status.update(depth=self._depth, max_size=self.max_size)
+        return status
+
+    def close(self) -> None:
+        """Stop accepting records and wait until all accepted records
+        are written down"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._writer.close()
+
+    def _write_records(self, batch: List[dict]) -> Dict[int, Exception]:
+        """Write down batch of records, it runs in the background thread
+        of the buffered writer
+        Return errors of not written records by position.
+        """
+        start = time.perf_counter()
+        try:
+            return self._write_batch(batch)
+        finally:
+            BATCH_DURATION.observe(time.perf_counter() - start)
+            with self._lock:
+                self._counts["batches"] += 1
+
+    def _record_written(self, record: dict, future: Future) -> None:
+        """Count record as written or failed after write of its batch"""
+        error = future.exception()
+        if error is not None:
+            logging.error(f"write-behind {record.get('_id')}: {error!r}")
+        result = "written" if error is None else "failed"
+        with self._lock:
+            self._depth -= 1
+            self._counts[result] += 1
+        RECORDS.inc(result)